@@ -0,0 +1,305 @@
+"""
+中间产物存储模块
+
+这个模块按内容哈希保存处理过程中的中间产物（提取的音频、识别文本），代替按文件名保存的 extracted_audio/ 和 transcriptions/：
+- 键由源文件内容的 SHA-256、产物类型和生成参数（采样率、识别服务、模型等）共同决定，同名的不同文件不会冲突，
+  参数变化时也不会用到旧的产物
+- 文件按键的前两级前缀分目录保存（ab/cd/<键>.<扩展名>），旁边的 <键>.json 记录元数据（源文件哈希、参数、大小、创建时间）
+- 先写入存储目录下 .tmp/ 中的临时文件，完成后用 os.replace 原子地替换，多个进程同时写入同一个键也不会读到不完整的文件
+- 存储目录下的 SQLite 索引（index.db）记录每个产物的大小和最近访问时间，以及总大小和命中/未命中/淘汰计数，
+  写入时按索引判断总大小，只有超过上限时才删除最久未使用的产物，不需要遍历整个目录
+- 只有索引为空时（第一次使用或索引被删除）才遍历一次目录重建；每个进程启动时只检查 .tmp/，清理写入中断留下的临时文件
+"""
+
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from sqlite_util import SQLiteDatabase, resolve_path
+
+# 加载环境变量
+load_dotenv()
+
+# 相对路径按项目目录解析
+ARTIFACT_STORE_DIR = os.getenv("ARTIFACT_STORE_DIR", "artifacts")
+# 产物总大小上限（字节）
+ARTIFACT_STORE_MAX_BYTES = int(os.getenv("ARTIFACT_STORE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+
+# 临时文件所在的子目录；超过这个时间（秒）还没有完成的临时文件视为写入中断，启动时删除
+TEMP_DIR = ".tmp"
+STALE_TEMP_SECONDS = 3600
+# 索引数据库的文件名（在存储目录下）
+INDEX_NAME = "index.db"
+
+
+def artifact_key(source_hash, kind, **params):
+    """
+    生成产物的键
+
+    参数:
+        source_hash (str): 源文件内容的 SHA-256
+        kind (str): 产物类型，如 audio、transcript
+        **params: 生成参数（采样率、识别服务、模型等），任何一项不同都对应不同的键
+
+    返回:
+        str: 十六进制键
+    """
+    raw = json.dumps({"source": source_hash, "kind": kind, "params": params}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class ArtifactStore:
+    def __init__(self, root=ARTIFACT_STORE_DIR, max_bytes=ARTIFACT_STORE_MAX_BYTES):
+        """
+        创建中间产物存储
+
+        参数:
+            root (str): 存储目录，相对路径按项目目录解析
+            max_bytes (int): 产物总大小上限（字节）
+        """
+        self.root = resolve_path(root)
+        self.max_bytes = max_bytes
+        self.temp_dir = os.path.join(self.root, TEMP_DIR)
+        os.makedirs(self.temp_dir, exist_ok=True)
+        self._db = SQLiteDatabase(os.path.join(self.root, INDEX_NAME))
+        self._init_index()
+
+    def _init_index(self):
+        with self._db.immediate() as conn:
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS artifacts (
+                key TEXT PRIMARY KEY,
+                ext TEXT NOT NULL,
+                size_bytes INTEGER NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_artifacts_accessed_at ON artifacts(accessed_at)")
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS artifact_stats (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL DEFAULT 0
+            )
+            ''')
+            conn.executemany("INSERT OR IGNORE INTO artifact_stats (name, value) VALUES (?, 0)",
+                             [('hits',), ('misses',), ('evictions',), ('bytes',)])
+            empty = conn.execute("SELECT COUNT(*) AS count FROM artifacts").fetchone()['count'] == 0
+
+        self._remove_stale_temp()
+        if not empty:
+            return
+        entries = self._scan()
+        if entries:
+            # 第一次使用索引或索引被删除：按目录中已有的产物重建
+            with self._db.immediate() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO artifacts (key, ext, size_bytes, accessed_at) VALUES (?, ?, ?, ?)",
+                    entries)
+                conn.execute("UPDATE artifact_stats SET value = (SELECT COALESCE(SUM(size_bytes), 0) FROM artifacts) "
+                             "WHERE name = 'bytes'")
+            print(f"已重建中间产物索引: {len(entries)} 个产物")
+
+    def _remove_stale_temp(self):
+        """删除 .tmp/ 中写入中断留下的临时文件（正在写入的临时文件不会这么旧）"""
+        deadline = time.time() - STALE_TEMP_SECONDS
+        with os.scandir(self.temp_dir) as it:
+            for entry in it:
+                try:
+                    if entry.stat().st_mtime < deadline:
+                        _remove(entry.path)
+                except FileNotFoundError:
+                    continue
+
+    def _scan(self):
+        """遍历存储目录，返回 [(键, 扩展名, 大小, 修改时间)]"""
+        entries = []
+        for directory, subdirs, files in os.walk(self.root):
+            if directory == self.root:
+                # 存储目录下只有索引数据库和临时文件目录，产物都在前缀子目录中
+                subdirs[:] = [name for name in subdirs if name != TEMP_DIR]
+                continue
+            for name in files:
+                if name.endswith(".json"):
+                    continue
+                key, ext = os.path.splitext(name)
+                try:
+                    stat = os.stat(os.path.join(directory, name))
+                except FileNotFoundError:
+                    continue
+                if os.path.exists(os.path.join(directory, key + ".json")):
+                    entries.append((key, ext, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _incr(self, conn, name, amount=1):
+        conn.execute("UPDATE artifact_stats SET value = value + ? WHERE name = ?", (amount, name))
+
+    def _base(self, key):
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def _meta_path(self, key):
+        return self._base(key) + ".json"
+
+    def path_for(self, key, ext):
+        """返回产物文件的路径（不检查是否存在）"""
+        return self._base(key) + ext
+
+    def get(self, key):
+        """
+        查找产物，同时更新最近访问时间和命中/未命中计数
+
+        返回:
+            dict: 元数据，其中 path 为产物文件路径；不存在时返回 None
+        """
+        try:
+            with open(self._meta_path(key), encoding='utf-8') as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            meta = None
+        path = self._base(key) + meta.get("ext", "") if meta is not None else None
+        conn = self._db.connect()
+        if meta is None or not os.path.exists(path):
+            self._incr(conn, 'misses')
+            return None
+        conn.execute("UPDATE artifacts SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        self._incr(conn, 'hits')
+        return dict(meta, path=path)
+
+    def get_text(self, key):
+        """读取文本产物，不存在时返回 None"""
+        meta = self.get(key)
+        if meta is None:
+            return None
+        try:
+            with open(meta["path"], encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            # 刚好被回收
+            return None
+
+    @contextmanager
+    def writer(self, key, ext, **meta):
+        """
+        写入产物：返回一个临时文件路径，由调用方写入（例如作为 ffmpeg 的输出文件），正常退出时原子地提交；
+        调用方最终没有写入这个文件时不提交
+
+        参数:
+            key (str): 产物的键
+            ext (str): 文件扩展名（如 .wav）
+            **meta: 写入元数据的字段（source_hash、kind、params、backend 等）
+
+        返回:
+            str: 临时文件路径
+        """
+        temp_path = os.path.join(self.temp_dir, f"{uuid.uuid4().hex}{ext}")
+        try:
+            yield temp_path
+            if os.path.exists(temp_path):
+                self._commit(key, ext, temp_path, meta)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def put_text(self, key, text, **meta):
+        """
+        保存文本产物
+
+        返回:
+            str: 产物文件路径
+        """
+        with self.writer(key, ".txt", **meta) as temp_path:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+        return self.path_for(key, ".txt")
+
+    def _commit(self, key, ext, temp_path, meta):
+        base = self._base(key)
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        size = os.path.getsize(temp_path)
+        meta = dict(meta, key=key, ext=ext, size=size, created_at=time.time())
+        temp_meta = os.path.join(self.temp_dir, f"{uuid.uuid4().hex}.json")
+        with open(temp_meta, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        with self._db.immediate() as conn:
+            # 先替换数据文件再替换元数据：能读到元数据时数据文件一定已经完整
+            os.replace(temp_path, base + ext)
+            os.replace(temp_meta, base + ".json")
+            old = conn.execute("SELECT size_bytes FROM artifacts WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO artifacts (key, ext, size_bytes, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, ext, size, time.time()))
+            self._incr(conn, 'bytes', size - (old['size_bytes'] if old else 0))
+            self._evict(conn, keep=key)
+
+    def _evict(self, conn, keep=None):
+        """总大小超过上限时，按最近访问时间从旧到新删除产物（在写事务中调用）"""
+        total = conn.execute("SELECT value FROM artifact_stats WHERE name = 'bytes'").fetchone()['value']
+        if total <= self.max_bytes:
+            return 0
+        evicted = []
+        for row in conn.execute("SELECT key, ext, size_bytes FROM artifacts ORDER BY accessed_at ASC"):
+            if total <= self.max_bytes:
+                break
+            if row['key'] == keep:
+                continue
+            evicted.append(row['key'])
+            # 先删除元数据，之后的查找不会再返回这个产物
+            _remove(self._meta_path(row['key']))
+            _remove(self._base(row['key']) + row['ext'])
+            total -= row['size_bytes']
+        conn.executemany("DELETE FROM artifacts WHERE key = ?", [(key,) for key in evicted])
+        conn.execute("UPDATE artifact_stats SET value = ? WHERE name = 'bytes'", (total,))
+        self._incr(conn, 'evictions', len(evicted))
+        return len(evicted)
+
+    def gc(self, keep=None):
+        """
+        总大小超过上限时，按最近访问时间从旧到新删除产物（写入时会自动执行）
+
+        参数:
+            keep (str): 不删除的产物的键（刚写入、调用方马上要使用的产物）
+
+        返回:
+            int: 删除的产物数
+        """
+        with self._db.immediate() as conn:
+            return self._evict(conn, keep)
+
+    def stats(self):
+        """返回命中/未命中/淘汰次数、产物数和总大小（所有进程共同的计数）"""
+        conn = self._db.connect()
+        stats = {row['name']: row['value'] for row in conn.execute("SELECT name, value FROM artifact_stats")}
+        lookups = stats['hits'] + stats['misses']
+        return {
+            "entries": conn.execute("SELECT COUNT(*) AS count FROM artifacts").fetchone()['count'],
+            "bytes": stats['bytes'],
+            "max_bytes": self.max_bytes,
+            "hits": stats['hits'],
+            "misses": stats['misses'],
+            "hit_rate": round(stats['hits'] / lookups, 4) if lookups else 0,
+            "evictions": stats['evictions']
+        }
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """获取进程内共享的中间产物存储"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ArtifactStore()
+    return _store
@@ -0,0 +1,206 @@
+"""
+语音识别服务注册表模块
+
+这个模块登记了所有语音识别服务及其能力信息：名称、单次请求的最大音频长度、接受的音频格式和采样率、
+是否支持流式识别、建议的并发数，以及服务是否自己负责切分长音频。
+服务模块在第一次使用时才导入（importlib），检查服务是否可用时只查找依赖包而不导入，
+不会在启动时加载 vosk、whisper 等用不到的本地库。处理流程根据这些信息自动决定是否切分、并发多少。
+"""
+
+import os
+import importlib
+import importlib.util
+import threading
+from dotenv import load_dotenv
+from media_probe import probe, MediaProbeError
+
+# 加载环境变量
+load_dotenv()
+
+
+class ASRBackend:
+    def __init__(self, name, label, module, function, requires=(), kwargs=None, max_segment_seconds=None,
+                 formats=("wav",), sample_rate=None, streaming=False, max_concurrency=1,
+                 segments_internally=False, decodes=False):
+        """
+        登记一个语音识别服务
+
+        参数:
+            name (str): 服务名称（SPEECH_RECOGNITION_SERVICE 的取值）
+            label (str): 显示名称
+            module (str): 实现识别的模块名
+            function (str): 识别函数名，参数为音频文件路径，返回识别的文本
+            requires (tuple): 依赖的第三方包（用于在不导入的情况下判断服务是否可用）
+            kwargs (dict): 调用识别函数时附加的参数
+            max_segment_seconds (float): 单次请求的最大音频长度（秒），为 None 时不限制
+            formats (tuple): 可以直接识别的文件格式（扩展名），自己用 ffmpeg 解码的服务可以直接识别视频
+            sample_rate (int): 识别使用的采样率（单声道 16 位），为 None 时不限制
+            streaming (bool): 是否支持流式识别
+            max_concurrency (int): 建议的并发数（同时识别的片段数）
+            segments_internally (bool): 服务是否自己切分长音频并发识别
+            decodes (bool): 服务是否自己用 ffmpeg 解码（可以直接识别任意编码的文件），否则只接受符合要求的 PCM WAV
+        """
+        self.name = name
+        self.label = label
+        self.module = module
+        self.function = function
+        self.requires = tuple(requires)
+        self.kwargs = kwargs or {}
+        self.max_segment_seconds = max_segment_seconds
+        self.formats = tuple(formats)
+        self.sample_rate = sample_rate
+        self.streaming = streaming
+        self.max_concurrency = max_concurrency
+        self.segments_internally = segments_internally
+        self.decodes = decodes
+        self._fn = None
+        self._load_error = None
+        self._lock = threading.Lock()
+
+    def available(self):
+        """依赖包是否已安装（不导入）"""
+        if self._load_error is not None:
+            return False
+        return all(importlib.util.find_spec(package) is not None for package in self.requires)
+
+    def load(self):
+        """导入服务模块，返回识别函数"""
+        if self._fn is None:
+            with self._lock:
+                if self._fn is None:
+                    try:
+                        module = importlib.import_module(self.module)
+                    except ImportError as e:
+                        self._load_error = e
+                        raise
+                    self._fn = getattr(module, self.function)
+        return self._fn
+
+    def accepts(self, path, info=None):
+        """
+        是否可以直接识别这个文件，否则需要先转换为 WAV
+
+        自己解码的服务按扩展名判断；只接受 PCM WAV 的服务还要探测文件，
+        编码（16 位 PCM）、声道数（单声道）和采样率都符合要求才直接识别。
+
+        参数:
+            path (str): 文件路径
+            info (dict): media_probe.probe 的结果，为 None 时自动探测
+
+        返回:
+            bool: 是否可以直接识别
+        """
+        if os.path.splitext(path)[1].lower().lstrip(".") not in self.formats:
+            return False
+        if self.decodes:
+            return True
+        try:
+            info = info or probe(path)
+        except MediaProbeError:
+            return False
+        audio = info["audio"]
+        return (info["format"] == "wav" and audio is not None and audio["codec"] == "pcm_s16le"
+                and audio["channels"] == 1 and (self.sample_rate is None or audio["sample_rate"] == self.sample_rate))
+
+    def transcribe(self, audio_path):
+        """识别音频文件"""
+        return self.load()(audio_path, **self.kwargs)
+
+    def info(self):
+        """返回服务的能力信息"""
+        return {
+            "name": self.name,
+            "label": self.label,
+            "available": self.available(),
+            "loaded": self._fn is not None,
+            "max_segment_seconds": self.max_segment_seconds,
+            "formats": list(self.formats),
+            "sample_rate": self.sample_rate,
+            "streaming": self.streaming,
+            "max_concurrency": self.max_concurrency,
+            "segments_internally": self.segments_internally,
+            "decodes": self.decodes
+        }
+
+
+# 用 ffmpeg 解码（audio_stream 或 Whisper 自带的解码）的服务可以直接识别的格式
+MEDIA_FORMATS = ("wav", "mp3", "ogg", "m4a", "mp4", "avi", "mov", "mkv")
+
+BACKENDS = {}
+
+
+def register(backend):
+    """登记语音识别服务（同名时覆盖）"""
+    BACKENDS[backend.name] = backend
+    return backend
+
+
+def get_backend(name):
+    """按名称获取语音识别服务，不存在时返回 None"""
+    return BACKENDS.get(name)
+
+
+def available_backends():
+    """返回所有已登记服务的能力信息"""
+    return [backend.info() for backend in BACKENDS.values()]
+
+
+register(ASRBackend(
+    "xunfei_official", "科大讯飞官方WebSocket", "xunfei_official", "transcribe_with_xunfei_official",
+    requires=("websocket",), max_segment_seconds=60, formats=MEDIA_FORMATS, decodes=True, sample_rate=16000, streaming=True,
+    max_concurrency=int(os.getenv("XUNFEI_MAX_SESSIONS", "4")), segments_internally=True))
+register(ASRBackend(
+    "whisper_cli", "Whisper CLI", "whisper_cli", "transcribe_with_whisper_cli", requires=("whisper",),
+    kwargs={"model_size": "tiny", "language": "zh", "to_simplified": True},
+    formats=MEDIA_FORMATS, decodes=True))
+register(ASRBackend(
+    "whisper", "OpenAI Whisper离线", "whisper_transcribe", "transcribe_with_whisper",
+    requires=("whisper", "opencc"),
+    kwargs={"model_size": "small", "language": "Chinese", "to_simplified": True},
+    formats=MEDIA_FORMATS, decodes=True))
+register(ASRBackend(
+    "xunfei_ws", "科大讯飞WebSocket", "xunfei_websocket", "transcribe_with_xunfei_websocket",
+    requires=("websocket",), max_segment_seconds=60, formats=MEDIA_FORMATS, decodes=True, sample_rate=16000, streaming=True,
+    max_concurrency=int(os.getenv("XUNFEI_MAX_SESSIONS", "4")), segments_internally=True))
+register(ASRBackend(
+    "xunfei", "科大讯飞HTTP", "xunfei_speech", "transcribe_with_xunfei", requires=("requests",),
+    max_segment_seconds=60, sample_rate=16000, max_concurrency=4))
+register(ASRBackend(
+    "vosk", "Vosk离线", "vosk_speech", "transcribe_with_vosk", requires=("vosk", "numpy"),
+    formats=MEDIA_FORMATS, decodes=True, sample_rate=16000, streaming=True,
+    max_concurrency=int(os.getenv("VOSK_WORKERS") or os.cpu_count() or 1), segments_internally=True))
+register(ASRBackend(
+    "baidu", "百度", "baidu_speech", "transcribe_with_baidu", requires=("aip",), max_segment_seconds=60,
+    formats=MEDIA_FORMATS, decodes=True, sample_rate=16000, max_concurrency=int(os.getenv("BAIDU_MAX_WORKERS", "4")),
+    segments_internally=True))
+register(ASRBackend(
+    "google", "Google", "google_speech", "transcribe_with_google", requires=("speech_recognition",),
+    max_segment_seconds=50, formats=MEDIA_FORMATS, decodes=True, sample_rate=16000,
+    max_concurrency=int(os.getenv("GOOGLE_MAX_WORKERS", "4")), segments_internally=True))
+
+# 没有配置 SPEECH_RECOGNITION_SERVICE 时按这个顺序选择第一个可用的服务
+DEFAULT_PREFERENCE = ("xunfei_official", "whisper_cli", "whisper", "xunfei_ws", "xunfei", "vosk", "baidu")
+
+
+def default_backend_name():
+    """返回默认的语音识别服务名称"""
+    for name in DEFAULT_PREFERENCE:
+        if BACKENDS[name].available():
+            return name
+    return "baidu"
+
+
+def resolve_backend(name):
+    """
+    返回配置的语音识别服务；服务不存在或依赖未安装时使用 Google 语音识别作为备选
+
+    参数:
+        name (str): 服务名称
+
+    返回:
+        ASRBackend: 语音识别服务
+    """
+    backend = BACKENDS.get(name)
+    if backend is not None and backend.available():
+        return backend
+    return BACKENDS["google"]
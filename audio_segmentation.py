@@ -0,0 +1,185 @@
+"""
+音频切分模块
+
+这个模块把长 WAV 文件在静音处切分为多个片段，供语音识别服务并行处理。
+按窗口计算能量并估算语音/静音阈值（简单的能量 VAD），切分点选在目标长度附近最长一段静音的中点，
+尽量不在句子中间切断；片段之间可以保留少量重叠，拼接时去重。
+"""
+
+import wave
+import numpy as np
+
+# 计算能量的窗口长度（毫秒）
+ENERGY_WINDOW_MS = 30
+
+
+def frame_energies(audio_path, window_ms=ENERGY_WINDOW_MS):
+    """
+    计算 16 位 PCM WAV 文件每个窗口的均方根能量（多声道取平均）
+
+    参数:
+        audio_path (str): 音频文件路径
+        window_ms (int): 窗口长度（毫秒）
+
+    返回:
+        tuple: (每个窗口的能量 numpy 数组, 每个窗口的采样帧数, 采样率, 总帧数)
+
+    异常:
+        ValueError: 不是 16 位 PCM WAV
+    """
+    with wave.open(audio_path, "rb") as wf:
+        if wf.getsampwidth() != 2:
+            raise ValueError(f"只支持 16 位 PCM WAV（{wf.getsampwidth() * 8} 位）: {audio_path}")
+        rate = wf.getframerate()
+        channels = wf.getnchannels()
+        total_frames = wf.getnframes()
+        window_frames = max(1, rate * window_ms // 1000)
+
+        energies = []
+        # 每次读取整数个窗口，避免把整个文件读入内存
+        read_frames = window_frames * 1000
+        while True:
+            data = wf.readframes(read_frames)
+            if not data:
+                break
+            samples = np.frombuffer(data, dtype=np.int16).astype(np.float32)
+            if channels > 1:
+                samples = samples[:len(samples) // channels * channels].reshape(-1, channels).mean(axis=1)
+            usable = len(samples) // window_frames * window_frames
+            if usable:
+                windows = samples[:usable].reshape(-1, window_frames)
+                energies.append(np.sqrt((windows ** 2).mean(axis=1)))
+            if usable < len(samples):
+                tail = samples[usable:]
+                energies.append(np.array([np.sqrt((tail ** 2).mean())], dtype=np.float32))
+
+    energies = np.concatenate(energies) if energies else np.zeros(0, dtype=np.float32)
+    return energies, window_frames, rate, total_frames
+
+
+def speech_threshold(energies, ratio=0.1):
+    """
+    估算区分语音和静音的能量阈值：在背景噪声水平（第 10 百分位）和语音水平（第 90 百分位）之间按比例取值
+
+    参数:
+        energies: 每个窗口的能量
+        ratio (float): 阈值在噪声水平和语音水平之间的位置
+
+    返回:
+        float: 能量阈值
+    """
+    if len(energies) == 0:
+        return 0.0
+    floor = float(np.percentile(energies, 10))
+    peak = float(np.percentile(energies, 90))
+    return floor + (peak - floor) * ratio
+
+
+def _find_cut(energies, threshold, lo, hi):
+    """在 [lo, hi) 窗口区间内找切分点：优先选最长的一段静音（一样长时选靠后的）的中点，没有静音时选能量最低的窗口"""
+    region = energies[lo:hi]
+    silent = region < threshold
+    best_start, best_length = -1, 0
+    run_start = None
+    for i, is_silent in enumerate(np.append(silent, False)):
+        if is_silent and run_start is None:
+            run_start = i
+        elif not is_silent and run_start is not None:
+            if i - run_start >= best_length:
+                best_start, best_length = run_start, i - run_start
+            run_start = None
+    if best_length:
+        return lo + best_start + best_length // 2, True
+    return lo + int(np.argmin(region)), False
+
+
+def plan_segments(audio_path, target_seconds, overlap_seconds=0.0, min_segment_ratio=0.5):
+    """
+    对音频做能量 VAD 分析，在静音处切分，生成片段列表
+
+    每个片段的主体长度不超过 target_seconds，切分点选在
+    [target_seconds * min_segment_ratio, target_seconds] 区间内最长一段静音的中点；
+    片段两端再向相邻片段各延伸 overlap_seconds，避免切分点落在词中间时丢字（拼接时去重）。
+
+    参数:
+        audio_path (str): 16 位 PCM WAV 文件路径
+        target_seconds (float): 片段主体的最大长度（秒）
+        overlap_seconds (float): 相邻片段的重叠长度（秒）
+        min_segment_ratio (float): 切分点最早出现的位置（相对于目标长度的比例）
+
+    返回:
+        list: [{"index", "start_frame", "end_frame", "start", "end", "silence_cut"}, ...]，
+              start/end 单位为秒，silence_cut 表示片段结尾是否切在静音处
+    """
+    energies, window_frames, rate, total_frames = frame_energies(audio_path)
+    max_windows = max(1, int(target_seconds * rate / window_frames))
+    min_windows = max(1, int(max_windows * min_segment_ratio))
+    threshold = speech_threshold(energies)
+
+    cuts = []
+    start = 0
+    while len(energies) - start > max_windows:
+        cut, silence_cut = _find_cut(energies, threshold, start + min_windows, start + max_windows)
+        cuts.append((cut, silence_cut))
+        start = cut
+
+    overlap_frames = int(overlap_seconds * rate)
+    bounds = [0] + [cut * window_frames for cut, _ in cuts] + [total_frames]
+    segments = []
+    for i in range(len(bounds) - 1):
+        start_frame = max(0, bounds[i] - overlap_frames) if i else 0
+        end_frame = min(total_frames, bounds[i + 1] + overlap_frames)
+        segments.append({
+            "index": i,
+            "start_frame": start_frame,
+            "end_frame": end_frame,
+            "start": start_frame / rate,
+            "end": end_frame / rate,
+            "silence_cut": cuts[i][1] if i < len(cuts) else True
+        })
+    return segments
+
+
+def split_on_silence(audio_path, max_segment_seconds, min_segment_ratio=0.5):
+    """
+    把音频切分为首尾相接、不重叠的片段
+
+    参数:
+        audio_path (str): 16 位 PCM WAV 文件路径
+        max_segment_seconds (float): 片段最大长度（秒）
+        min_segment_ratio (float): 切分点最早出现的位置（相对于最大长度的比例）
+
+    返回:
+        list: [(起始帧, 结束帧), ...]，按时间顺序排列，首尾相接覆盖整个文件
+    """
+    segments = plan_segments(audio_path, max_segment_seconds, 0.0, min_segment_ratio)
+    return [(segment["start_frame"], segment["end_frame"]) for segment in segments]
+
+
+def write_segment(audio_path, start_frame, end_frame, output_path, chunk_frames=64000):
+    """
+    把 WAV 文件中的一段写入新的 WAV 文件（保持原采样格式）
+
+    参数:
+        audio_path (str): 源文件路径
+        start_frame (int): 起始帧
+        end_frame (int): 结束帧
+        output_path (str): 输出文件路径
+
+    返回:
+        str: 输出文件路径
+    """
+    with wave.open(audio_path, "rb") as src, wave.open(output_path, "wb") as dst:
+        dst.setnchannels(src.getnchannels())
+        dst.setsampwidth(src.getsampwidth())
+        dst.setframerate(src.getframerate())
+        src.setpos(start_frame)
+        remaining = end_frame - start_frame
+        while remaining > 0:
+            data = src.readframes(min(chunk_frames, remaining))
+            if not data:
+                break
+            dst.writeframes(data)
+            remaining -= min(chunk_frames, remaining)
+    return output_path
+
@@ -0,0 +1,266 @@
+"""
+音频数据访问模块
+
+这个模块用 mmap 把 WAV 文件映射到内存，PCM 数据以 memoryview 切片的形式交给识别服务，不把整个文件读成 bytes：
+- 只有实际访问到的页面才会读入，由操作系统按需换入换出，多个任务读同一个文件时共享页面缓存
+- 发送给 HTTP 接口的 base64 请求体按块边读边编码（Base64JSONBody），不生成整个文件的 base64 字符串
+- MemoryMeter 统计一个任务期间进程的内存峰值和增量（Linux 上先重置 VmHWM 再读取），多个任务同时运行时标出
+"""
+
+import mmap
+import json
+import base64
+import struct
+import threading
+
+try:
+    import resource
+except ImportError:
+    # Windows 没有 resource 模块，不统计内存峰值
+    resource = None
+
+# 请求体中由 base64 数据替换的占位值
+BASE64_PLACEHOLDER = "\x00base64\x00"
+
+
+class AudioSourceError(Exception):
+    """文件不是可以识别的 PCM WAV"""
+
+
+class AudioSource:
+    def __init__(self, path):
+        """
+        以只读方式映射 WAV 文件
+
+        参数:
+            path (str): 16 位 PCM WAV 文件路径
+
+        异常:
+            AudioSourceError: 文件为空或不是 16 位 PCM WAV
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise AudioSourceError(f"音频文件为空: {path}")
+        self.data = memoryview(self._map)
+        try:
+            self._parse_header()
+        except AudioSourceError:
+            self.close()
+            raise
+
+    def _parse_header(self):
+        if len(self.data) < 12 or self.data[:4] != b"RIFF" or self.data[8:12] != b"WAVE":
+            raise AudioSourceError(f"不是 WAV 文件: {self.path}")
+        fmt = None
+        offset = 12
+        while offset + 8 <= len(self.data):
+            chunk_id = self.data[offset:offset + 4].tobytes()
+            size = struct.unpack_from("<I", self.data, offset + 4)[0]
+            body = offset + 8
+            if chunk_id == b"fmt ":
+                fmt = struct.unpack_from("<HHIIHH", self.data, body)
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise AudioSourceError(f"WAV 文件缺少格式信息: {self.path}")
+                # 管道输出的 WAV 中数据长度可能没有写入，以文件实际长度为准
+                end = min(body + size, len(self.data))
+                self.format_tag, self.channels, self.rate, _, _, bits = fmt
+                # 1 为 PCM，0xFFFE 为扩展格式（多声道时 ffmpeg 输出这种格式）
+                if self.format_tag not in (1, 0xFFFE) or bits != 16:
+                    raise AudioSourceError(f"只支持 16 位 PCM WAV（格式 {self.format_tag}，{bits} 位）: {self.path}")
+                self.sample_width = 2
+                self.frame_bytes = self.channels * self.sample_width
+                end -= (end - body) % self.frame_bytes
+                self.pcm = self.data[body:end]
+                self.n_frames = len(self.pcm) // self.frame_bytes
+                return
+            offset = body + size + (size & 1)
+        raise AudioSourceError(f"WAV 文件中没有音频数据: {self.path}")
+
+    @property
+    def duration(self):
+        """时长（秒）"""
+        return self.n_frames / self.rate
+
+    def frames(self, start_frame, end_frame):
+        """返回 [start_frame, end_frame) 的 PCM 数据（memoryview，不复制）"""
+        return self.pcm[start_frame * self.frame_bytes:end_frame * self.frame_bytes]
+
+    def chunks(self, chunk_bytes, start_frame=0, end_frame=None):
+        """
+        按固定大小逐块返回 PCM 数据
+
+        参数:
+            chunk_bytes (int): 每块的字节数（按帧对齐），最后一块可能较短
+            start_frame (int): 起始帧
+            end_frame (int): 结束帧，为 None 时到文件末尾
+
+        返回:
+            generator: memoryview 切片
+        """
+        view = self.frames(start_frame, self.n_frames if end_frame is None else end_frame)
+        chunk_bytes = max(self.frame_bytes, chunk_bytes - chunk_bytes % self.frame_bytes)
+        for offset in range(0, len(view), chunk_bytes):
+            yield view[offset:offset + chunk_bytes]
+
+    def close(self):
+        """解除映射；仍有 memoryview 切片在使用时，映射在切片释放后由垃圾回收解除"""
+        self.pcm = None
+        self.data.release()
+        try:
+            self._map.close()
+        except BufferError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class Base64JSONBody:
+    def __init__(self, payload, data, chunk_bytes=3 * 64 * 1024):
+        """
+        流式生成 JSON 请求体：payload 中值为 BASE64_PLACEHOLDER 的字段替换为 data 的 base64 编码
+
+        请求体长度可以预先算出（requests 据此设置 Content-Length，不使用分块传输），
+        读取时每次只编码一块数据，内存占用与音频长度无关。
+
+        参数:
+            payload (dict): 请求参数，其中一个字段的值为 BASE64_PLACEHOLDER
+            data (bytes/memoryview): 需要编码的数据
+            chunk_bytes (int): 每次编码的字节数（按 3 字节对齐）
+        """
+        body = json.dumps(payload)
+        placeholder = json.dumps(BASE64_PLACEHOLDER)
+        if body.count(placeholder) != 1:
+            raise ValueError("请求参数中必须有且只有一个 BASE64_PLACEHOLDER")
+        prefix, suffix = body.split(placeholder)
+        self._prefix = (prefix + '"').encode('utf-8')
+        self._suffix = ('"' + suffix).encode('utf-8')
+        self._data = memoryview(data).cast("B")
+        self._chunk_bytes = max(3, chunk_bytes - chunk_bytes % 3)
+        self._length = len(self._prefix) + (len(self._data) + 2) // 3 * 4 + len(self._suffix)
+        self._parts = self._generate()
+        self._buffer = bytearray()
+
+    def _generate(self):
+        yield self._prefix
+        for offset in range(0, len(self._data), self._chunk_bytes):
+            yield base64.b64encode(self._data[offset:offset + self._chunk_bytes])
+        yield self._suffix
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=-1):
+        """读取请求体（与文件对象的 read 相同，读完后返回空 bytes）"""
+        while size < 0 or len(self._buffer) < size:
+            part = next(self._parts, None)
+            if part is None:
+                break
+            self._buffer += part
+        if size < 0:
+            size = len(self._buffer)
+        chunk = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return chunk
+
+
+def _read_status_kb(*fields):
+    """从 /proc/self/status 读取内存字段（KB），不是 Linux 时返回 None"""
+    try:
+        with open("/proc/self/status") as f:
+            values = dict(line.split(":", 1) for line in f if ":" in line)
+        return [int(values[field].split()[0]) for field in fields]
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _reset_peak():
+    """把进程的内存峰值（VmHWM）重置为当前占用，不支持时返回 False"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _lifetime_peak_kb():
+    if resource is None:
+        return None
+    # Linux 上 ru_maxrss 的单位是 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class MemoryMeter:
+    _active = set()
+    _lock = threading.Lock()
+
+    def __init__(self):
+        """
+        统计一个任务期间进程的内存峰值和增量（上下文管理器，退出后调用 result）
+
+        Linux 上开始时如果没有其他任务在统计，先通过 /proc/self/clear_refs 把峰值（VmHWM）重置为当前占用，
+        结束时读取的峰值就是这个任务期间的峰值。线程模式下多个任务同时进行时，峰值包含其他任务的占用，
+        结果中 shared 为 True；进程模式下每个工作进程同时只有一个任务，统计是准确的。
+        没有重置峰值时（其他任务在统计或不是 Linux）只能得到进程峰值在任务期间的增长，是任务占用的下限。
+        """
+        self.shared = False
+        self.reset = False
+        self._start = None
+        self._end = None
+
+    def __enter__(self):
+        with MemoryMeter._lock:
+            if MemoryMeter._active:
+                self.shared = True
+                for meter in MemoryMeter._active:
+                    meter.shared = True
+            else:
+                self.reset = _reset_peak()
+            MemoryMeter._active.add(self)
+        self._start = self._sample()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._end = self._sample()
+        with MemoryMeter._lock:
+            MemoryMeter._active.discard(self)
+
+    def _sample(self):
+        status = _read_status_kb("VmHWM", "VmRSS")
+        if status is not None:
+            return {"peak": status[0], "rss": status[1]}
+        return {"peak": _lifetime_peak_kb(), "rss": None}
+
+    def result(self):
+        """
+        返回统计结果（MB）
+
+        返回:
+            dict: {"peak_mb": 任务期间的峰值, "start_mb": 开始时的占用, "delta_mb": 峰值比开始时多出的部分,
+                   "method": "reset_peak"（重置后的峰值）或 "peak_growth"（只统计了进程峰值的增长）,
+                   "shared": 是否有其他任务同时在这个进程中运行}，无法统计的项为 None
+        """
+        def mb(kb):
+            return None if kb is None else round(kb / 1024, 1)
+
+        start, end = self._start or {}, self._end or {}
+        if self.reset:
+            baseline = start.get("rss")
+        else:
+            baseline = start.get("peak")
+        peak = end.get("peak")
+        return {
+            "peak_mb": mb(peak) if self.reset else None,
+            "start_mb": mb(start.get("rss")),
+            "delta_mb": mb(max(0, peak - baseline)) if peak is not None and baseline is not None else None,
+            "method": "reset_peak" if self.reset else "peak_growth",
+            "shared": self.shared
+        }
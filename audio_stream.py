@@ -0,0 +1,191 @@
+"""
+音频流解码模块
+
+这个模块用一个 ffmpeg 进程把任意音视频文件解码为 16kHz 16 位单声道 PCM，从标准输出按固定大小的帧读取，
+边解码边在静音处切分（与 audio_segmentation 相同的能量 VAD），切好的片段直接交给语音识别服务。
+不写中间 WAV 文件，内存中只保留当前片段的 PCM 数据和最近一段时间的能量值，占用与音视频的长度无关。
+"""
+
+import threading
+import subprocess
+from collections import deque
+import numpy as np
+from audio_segmentation import speech_threshold, _find_cut, ENERGY_WINDOW_MS
+from media_probe import FFMPEG_BINARY
+
+# 解码输出的采样率和每帧的字节数（1 秒）
+SAMPLE_RATE = 16000
+FRAME_BYTES = SAMPLE_RATE * 2
+
+# 估算语音/静音阈值时参考的能量历史长度（秒）
+THRESHOLD_HISTORY_SECONDS = 600
+
+
+class AudioStreamError(Exception):
+    """ffmpeg 解码失败"""
+
+
+def decode_pcm(media_path, frame_bytes=FRAME_BYTES, rate=SAMPLE_RATE):
+    """
+    用 ffmpeg 把音视频文件解码为 16 位单声道 PCM，按固定大小的帧逐帧返回
+
+    参数:
+        media_path (str): 音视频文件路径（ffmpeg 支持的任意格式）
+        frame_bytes (int): 每帧的字节数，最后一帧可能较短
+        rate (int): 输出采样率
+
+    返回:
+        generator: PCM 数据帧（bytes）
+
+    异常:
+        AudioStreamError: 找不到 ffmpeg 或解码失败
+    """
+    command = [FFMPEG_BINARY, '-nostdin', '-loglevel', 'error', '-i', media_path, '-vn',
+               '-f', 's16le', '-acodec', 'pcm_s16le', '-ac', '1', '-ar', str(rate), 'pipe:1']
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        raise AudioStreamError(f"找不到 ffmpeg（{FFMPEG_BINARY}），请安装 ffmpeg 或设置 FFMPEG_BINARY")
+
+    # 在后台线程中读取错误输出，避免管道写满时 ffmpeg 阻塞；只保留最后一部分
+    stderr_tail = deque(maxlen=16)
+    drain = threading.Thread(target=lambda: stderr_tail.extend(process.stderr), daemon=True)
+    drain.start()
+
+    try:
+        while True:
+            frame = process.stdout.read(frame_bytes)
+            if not frame:
+                break
+            yield frame
+        process.wait()
+        drain.join()
+        if process.returncode != 0:
+            message = " ".join(b"".join(stderr_tail).decode("utf-8", "replace").split())
+            raise AudioStreamError(f"ffmpeg 解码失败（返回码 {process.returncode}）: {message}")
+    finally:
+        # 调用方提前停止读取时结束 ffmpeg 进程
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+
+
+class StreamingSegmenter:
+    def __init__(self, target_seconds, overlap_seconds=0.0, min_segment_ratio=0.5, rate=SAMPLE_RATE,
+                 window_ms=ENERGY_WINDOW_MS, history_seconds=THRESHOLD_HISTORY_SECONDS):
+        """
+        边接收 PCM 数据边在静音处切分
+
+        片段的划分方式与 audio_segmentation.plan_segments 相同：主体长度不超过 target_seconds，
+        切分点选在 [target_seconds * min_segment_ratio, target_seconds] 区间内最长一段静音的中点，
+        两端各向相邻片段延伸 overlap_seconds。语音/静音阈值根据最近 history_seconds 秒的能量估算。
+
+        参数:
+            target_seconds (float): 片段主体的最大长度（秒）
+            overlap_seconds (float): 相邻片段的重叠长度（秒）
+            min_segment_ratio (float): 切分点最早出现的位置（相对于目标长度的比例）
+            rate (int): 采样率
+            window_ms (int): 计算能量的窗口长度（毫秒）
+            history_seconds (float): 估算阈值时参考的能量历史长度（秒）
+        """
+        self.rate = rate
+        self.window_frames = max(1, rate * window_ms // 1000)
+        self.max_windows = max(1, int(target_seconds * rate / self.window_frames))
+        self.min_windows = max(1, int(self.max_windows * min_segment_ratio))
+        self.overlap_frames = int(overlap_seconds * rate)
+        self.overlap_windows = -(-self.overlap_frames // self.window_frames)
+        self.history = deque(maxlen=max(1, int(history_seconds * 1000 / window_ms)))
+        # buffer 保存从 buffer_start 帧开始的 PCM 数据；energies 是从当前片段主体起点 body_start 开始的窗口能量
+        self.buffer = bytearray()
+        self.buffer_start = 0
+        self.body_start = 0
+        self.energies = []
+        self.index = 0
+
+    def feed(self, pcm):
+        """
+        接收一段 PCM 数据
+
+        返回:
+            list: 已经可以确定的片段
+        """
+        self.buffer += pcm
+        analyzed = self.body_start - self.buffer_start + len(self.energies) * self.window_frames
+        samples = np.frombuffer(bytes(self.buffer[analyzed * 2:]), dtype=np.int16)
+        usable = len(samples) // self.window_frames * self.window_frames
+        if usable:
+            windows = samples[:usable].astype(np.float32).reshape(-1, self.window_frames)
+            values = np.sqrt((windows ** 2).mean(axis=1)).tolist()
+            self.energies.extend(values)
+            self.history.extend(values)
+
+        segments = []
+        # 切分点之后还要有重叠部分的数据，才能确定片段的结尾
+        while len(self.energies) >= self.max_windows + self.overlap_windows:
+            segments.append(self._cut())
+        return segments
+
+    def finish(self):
+        """
+        数据结束，返回最后一个片段
+
+        返回:
+            list: 剩余的片段（没有数据时为空）
+        """
+        end_frame = self.buffer_start + len(self.buffer) // 2
+        if end_frame <= self.body_start:
+            return []
+        return [self._segment(end_frame, True)]
+
+    def _cut(self):
+        threshold = speech_threshold(np.asarray(self.history, dtype=np.float32))
+        cut, silence_cut = _find_cut(np.asarray(self.energies, dtype=np.float32), threshold,
+                                     self.min_windows, self.max_windows)
+        cut_frame = self.body_start + cut * self.window_frames
+        segment = self._segment(cut_frame + self.overlap_frames, silence_cut)
+
+        # 丢弃下一个片段用不到的数据
+        self.body_start = cut_frame
+        self.energies = self.energies[cut:]
+        new_start = max(0, cut_frame - self.overlap_frames)
+        del self.buffer[:(new_start - self.buffer_start) * 2]
+        self.buffer_start = new_start
+        return segment
+
+    def _segment(self, end_frame, silence_cut):
+        start_frame = self.buffer_start
+        segment = {
+            "index": self.index,
+            "start_frame": start_frame,
+            "end_frame": end_frame,
+            "start": start_frame / self.rate,
+            "end": end_frame / self.rate,
+            "silence_cut": silence_cut,
+            "pcm": bytes(self.buffer[:(end_frame - start_frame) * 2])
+        }
+        self.index += 1
+        return segment
+
+
+def stream_segments(media_path, target_seconds, overlap_seconds=0.0, min_segment_ratio=0.5):
+    """
+    解码音视频文件并在静音处切分，逐个返回片段
+
+    参数:
+        media_path (str): 音视频文件路径
+        target_seconds (float): 片段主体的最大长度（秒）
+        overlap_seconds (float): 相邻片段的重叠长度（秒）
+        min_segment_ratio (float): 切分点最早出现的位置（相对于目标长度的比例）
+
+    返回:
+        generator: {"index", "start_frame", "end_frame", "start", "end", "silence_cut", "pcm"}，
+                   pcm 为 16kHz 16 位单声道 PCM 数据
+
+    异常:
+        AudioStreamError: 找不到 ffmpeg 或解码失败
+    """
+    segmenter = StreamingSegmenter(target_seconds, overlap_seconds, min_segment_ratio)
+    for frame in decode_pcm(media_path):
+        yield from segmenter.feed(frame)
+    yield from segmenter.finish()
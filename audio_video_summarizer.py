@@ -1,61 +1,32 @@
 import os
-import tempfile
 import time
 import uuid
-from flask import Flask, request, render_template, jsonify, session, redirect, url_for
-import speech_recognition as sr
-from moviepy.editor import VideoFileClip
-import requests
+import threading
+import wave
+from flask import Flask, request, render_template, jsonify, session, redirect, url_for, Response, stream_with_context
 import json
 import urllib.request
 import socket
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from werkzeug.security import generate_password_hash, check_password_hash
 from dotenv import load_dotenv
-
-# 导入语音识别模块
-from baidu_speech import transcribe_with_baidu
-try:
-    from vosk_speech import transcribe_with_vosk
-    VOSK_AVAILABLE = True
-except ImportError:
-    VOSK_AVAILABLE = False
-    print("Vosk 未安装，将不能使用离线语音识别")
-
-try:
-    from xunfei_speech import transcribe_with_xunfei
-    XUNFEI_AVAILABLE = True
-except ImportError:
-    XUNFEI_AVAILABLE = False
-    print("科大讯飞HTTP模块导入失败")
-
-try:
-    from xunfei_websocket import transcribe_with_xunfei_websocket
-    XUNFEI_WS_AVAILABLE = True
-except ImportError:
-    XUNFEI_WS_AVAILABLE = False
-    print("科大讯飞WebSocket模块导入失败")
-
-try:
-    from xunfei_official import transcribe_with_xunfei_official
-    XUNFEI_OFFICIAL_AVAILABLE = True
-except ImportError:
-    XUNFEI_OFFICIAL_AVAILABLE = False
-    print("科大讯飞官方WebSocket模块导入失败")
-
-try:
-    from whisper_transcribe import transcribe_with_whisper
-    WHISPER_AVAILABLE = True
-except ImportError:
-    WHISPER_AVAILABLE = False
-    print("Whisper模块导入失败")
-
-try:
-    from whisper_cli import transcribe_with_whisper_cli
-    WHISPER_CLI_AVAILABLE = True
-except ImportError:
-    WHISPER_CLI_AVAILABLE = False
-    print("Whisper CLI模块导入失败")
+from task_queue import JobExecutor, publish_update
+from task_store import create_task_store
+from progress_stream import ProgressBroadcaster, task_snapshot
+from token_budget import estimate_tokens, estimate_messages_tokens, split_text, sample_text
+from deepseek_client import get_client, DEEPSEEK_MODEL
+from result_cache import ResultCache, make_cache_key, save_stream_with_hash
+from chunked_upload import ChunkedUploads, UploadError
+from chat_context import build_chat_prompt, build_history_summary_messages, CHAT_SUMMARY_MAX_TOKENS
+from media_probe import extract_audio_cached
+from artifact_store import get_store as get_artifact_store, artifact_key
+from audio_source import MemoryMeter
+from scratch_space import job_scratch, sweep_stale as sweep_stale_scratch, stats as scratch_stats
+
+# 语音识别服务在第一次使用时才导入
+from asr_registry import get_backend, resolve_backend, default_backend_name, available_backends
+from whisper_registry import get_registry as get_whisper_registry, preload_configured_models
 
 # Load environment variables from .env file
 load_dotenv()
@@ -79,7 +50,12 @@ if PROXY_URL:
 
 # 语音识别服务选择
 # 可选值: google, baidu, vosk, xunfei, xunfei_ws, xunfei_official, whisper, whisper_cli
-SPEECH_RECOGNITION_SERVICE = os.getenv("SPEECH_RECOGNITION_SERVICE", "xunfei_official" if XUNFEI_OFFICIAL_AVAILABLE else "whisper_cli" if WHISPER_CLI_AVAILABLE else "whisper" if WHISPER_AVAILABLE else "xunfei_ws" if XUNFEI_WS_AVAILABLE else "xunfei" if XUNFEI_AVAILABLE else "vosk" if VOSK_AVAILABLE else "baidu").lower()
+SPEECH_RECOGNITION_SERVICE = os.getenv("SPEECH_RECOGNITION_SERVICE", "").lower() or default_backend_name()
+
+# 分段识别：有单次请求时长限制、且自己不切分长音频的服务，超过时长上限的音频在静音处切分后并发识别
+# 相邻片段的重叠长度（秒）；同时识别的片段数默认使用服务登记的并发数，设置后覆盖
+ASR_SEGMENT_OVERLAP = float(os.getenv("ASR_SEGMENT_OVERLAP", "1"))
+ASR_SEGMENT_WORKERS = int(os.getenv("ASR_SEGMENT_WORKERS") or 0)
 
 app = Flask(__name__)
 
@@ -87,9 +63,28 @@ app = Flask(__name__)
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
 ALLOWED_AUDIO_EXTENSIONS = {'mp3', 'wav', 'ogg', 'm4a'}
 ALLOWED_VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv'}
-DEEPSEEK_API_URL = os.getenv("DEEPSEEK_API_URL", "https://api.deepseek.com/v1/chat/completions")
-# 直接在这里设置你的 API 密钥
-DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY", "sk-a74d9a6d8d204890a5ef7efc6a70ec46")
+
+# 内容分析模式
+# separate: 摘要、关键词框架、测试问题分三次调用生成
+# combined: 一次调用生成三项内容（JSON），解析失败时退回到 separate
+ANALYSIS_MODE = os.getenv("ANALYSIS_MODE", "separate").lower()
+
+# 长文本分块总结配置
+# 转录文本超过 SUMMARY_CHUNK_TOKENS 时分块并行总结（map），再合并为最终摘要（reduce）
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "6000"))
+SUMMARY_MAX_PARALLEL = int(os.getenv("SUMMARY_MAX_PARALLEL", "4"))
+# 提取关键词和生成测试问题时，提示词中原文部分的 token 预算
+ANALYSIS_CONTEXT_TOKENS = int(os.getenv("ANALYSIS_CONTEXT_TOKENS", "6000"))
+
+# 提示词版本，修改提示词后需要递增，使旧的缓存结果失效
+PROMPT_VERSION = "2"
+
+# DeepSeek 系统提示词
+SUMMARY_SYSTEM_PROMPT = "你是一个专业的内容总结助手。请对以下内容进行简洁、全面的总结归纳，提取关键信息和主要观点。"
+KEYWORDS_SYSTEM_PROMPT = "你是一个专业的内容分析助手，擅长提取关键词和分析内容框架。"
+QUESTIONS_SYSTEM_PROMPT = "你是一个专业的教育测试助手，擅长根据内容生成有针对性的测试问题。"
+CHUNK_SUMMARY_SYSTEM_PROMPT = "你是一个专业的内容总结助手。以下是一段较长内容中的一部分，请总结这一部分的关键信息和主要观点，保留重要细节。"
+REDUCE_SUMMARY_SYSTEM_PROMPT = "你是一个专业的内容总结助手。以下是一段较长内容按顺序分段得到的各部分总结，请将它们合并为一份简洁、全面的总结归纳，提取关键信息和主要观点。"
 
 # 设置密钥用于会话
 app.secret_key = os.getenv('SECRET_KEY', 'default_secret_key_for_development')
@@ -97,8 +92,35 @@ app.secret_key = os.getenv('SECRET_KEY', 'default_secret_key_for_development')
 # 数据库设置
 DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'users.db')
 
-# 处理进度跟踪
-processing_tasks = {}  # 格式: {task_id: {'status': '状态', 'progress': 百分比, 'message': '消息'}}
+# 后台运行时对象（任务存储、进度广播、任务执行器、结果缓存、分块上传）：
+# 不在导入时创建，第一次使用时创建，导入模块不会创建数据库文件或启动线程
+_runtime = {}
+_runtime_lock = threading.RLock()
+
+def _runtime_object(name, factory):
+    """返回进程内共享的运行时对象，第一次使用时调用 factory 创建"""
+    obj = _runtime.get(name)
+    if obj is None:
+        with _runtime_lock:
+            obj = _runtime.get(name)
+            if obj is None:
+                obj = _runtime[name] = factory()
+    return obj
+
+# 处理进度跟踪（默认保存在 SQLite 中，多个工作进程共享）
+# 任务状态格式: {'status': '状态', 'progress': 百分比, 'message': '消息', 'user_id': 用户ID}
+def get_task_store():
+    return _runtime_object('task_store', create_task_store)
+
+def get_progress_broadcaster():
+    return _runtime_object('progress_broadcaster', lambda: ProgressBroadcaster(get_task_store(), app.secret_key))
+
+def get_result_cache():
+    return _runtime_object('result_cache', ResultCache)
+
+def get_chunked_uploads():
+    # 分块上传中未完成的文件
+    return _runtime_object('chunked_uploads', lambda: ChunkedUploads(os.path.join(UPLOAD_FOLDER, 'partial')))
 
 # 创建数据库
 def init_db():
@@ -125,11 +147,17 @@ def init_db():
         summary TEXT,
         keywords_and_framework TEXT,
         test_questions TEXT,
+        cache_key TEXT,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         FOREIGN KEY (user_id) REFERENCES users(id)
     )
     ''')
 
+    # 兼容旧数据库：为使用历史表添加缓存键字段
+    cursor.execute("PRAGMA table_info(usage_history)")
+    if 'cache_key' not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE usage_history ADD COLUMN cache_key TEXT")
+
     # 创建对话记录表
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS chat_history (
@@ -145,111 +173,155 @@ def init_db():
     conn.commit()
     conn.close()
 
-# 初始化数据库
-init_db()
-
-# Ensure upload directory exists
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# 初始化数据库和运行环境：不在导入时执行，每个进程在处理第一个请求前执行一次
+_db_initialized = False
+_db_init_lock = threading.Lock()
+
+@app.before_request
+def ensure_db():
+    global _db_initialized
+    if not _db_initialized:
+        with _db_init_lock:
+            if not _db_initialized:
+                init_db()
+                # Ensure upload directory exists
+                os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+                # 删除上次运行异常退出时留下的临时目录
+                sweep_stale_scratch()
+                # 使用本地 Whisper 时预加载模型，第一个任务不用等待模型加载
+                if SPEECH_RECOGNITION_SERVICE == "whisper" and get_backend("whisper").available():
+                    preload_configured_models()
+                _db_initialized = True
 
 def allowed_file(filename, allowed_extensions):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
 
-def extract_audio_from_video(video_path):
-    """Extract audio from video file and save as temporary WAV file"""
-    temp_audio = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
-    video = VideoFileClip(video_path)
-    video.audio.write_audiofile(temp_audio.name, codec='pcm_s16le')
-    return temp_audio.name
-
-def transcribe_audio(audio_path):
-    """Convert audio to text using speech recognition"""
-
-    # 根据配置选择语音识别服务
-    if SPEECH_RECOGNITION_SERVICE == "xunfei_official" and XUNFEI_OFFICIAL_AVAILABLE:
-        print("使用科大讯飞官方WebSocket语音识别服务")
-        return transcribe_with_xunfei_official(audio_path)
-    elif SPEECH_RECOGNITION_SERVICE == "whisper_cli" and WHISPER_CLI_AVAILABLE:
-        print("使用Whisper CLI语音识别服务")
-        return transcribe_with_whisper_cli(audio_path, model_size="tiny", language="zh", to_simplified=True)
-    elif SPEECH_RECOGNITION_SERVICE == "whisper" and WHISPER_AVAILABLE:
-        print("使用OpenAI Whisper离线语音识别服务")
-        return transcribe_with_whisper(audio_path, model_size="small", language="Chinese", to_simplified=True)
-    elif SPEECH_RECOGNITION_SERVICE == "xunfei_ws" and XUNFEI_WS_AVAILABLE:
-        print("使用科大讯飞WebSocket语音识别服务")
-        return transcribe_with_xunfei_websocket(audio_path)
-    elif SPEECH_RECOGNITION_SERVICE == "xunfei" and XUNFEI_AVAILABLE:
-        print("使用科大讯飞HTTP语音识别服务")
-        return transcribe_with_xunfei(audio_path)
-    elif SPEECH_RECOGNITION_SERVICE == "baidu":
-        print("使用百度语音识别服务")
-        return transcribe_with_baidu(audio_path)
-    elif SPEECH_RECOGNITION_SERVICE == "vosk" and VOSK_AVAILABLE:
-        print("使用Vosk离线语音识别服务")
-        return transcribe_with_vosk(audio_path)
-
-    # 使用 Google 语音识别服务作为备选
-    print("使用Google语音识别服务")
-    recognizer = sr.Recognizer()
-
-    # 调整识别器参数，提高识别率
-    recognizer.energy_threshold = 300  # 能量阈值，越低越敏感
-    recognizer.dynamic_energy_threshold = True  # 动态能量阈值
-    recognizer.pause_threshold = 0.8  # 停顿阈值，越低越敏感
-
-    with sr.AudioFile(audio_path) as source:
-        # 调整音量
-        audio_data = recognizer.record(source)
-
-        # 尝试使用Google的语音识别服务
-        try:
-            # 尝试不同的语言设置
-            try:
-                text = recognizer.recognize_google(audio_data, language='zh-CN')
-                return text
-            except:
-                # 如果中文识别失败，尝试自动检测语言
-                text = recognizer.recognize_google(audio_data)
-                return text + "\n(注：使用了自动语言检测)"
-        except sr.UnknownValueError:
-            print("Google语音识别无法识别音频内容")
-            return "无法识别音频内容。请确保音频清晰并包含语音。"
-        except sr.RequestError as e:
-            print(f"无法连接到Google语音识别服务: {e}")
-            return "无法连接到语音识别服务。请检查网络连接，或稍后再试。\n\n可能的原因：\n1. 网络连接问题\n2. 服务器防火墙限制\n3. 区域限制\n4. API使用限制"
+# 上一次选择的语音识别服务，选择变化时才记录日志
+_selected_asr_backend = None
+
+def select_asr_backend():
+    """
+    根据配置选择语音识别服务
+
+    返回:
+        ASRBackend: 语音识别服务，配置的服务不可用时使用 Google 语音识别服务作为备选
+    """
+    global _selected_asr_backend
+    backend = resolve_backend(SPEECH_RECOGNITION_SERVICE)
+    if backend.name != _selected_asr_backend:
+        _selected_asr_backend = backend.name
+        app.logger.info("使用%s语音识别服务", backend.label)
+    return backend
+
+def _audio_duration(audio_path):
+    """返回 WAV 文件的时长（秒），不是 PCM WAV 时返回 None"""
+    try:
+        with wave.open(audio_path, "rb") as wf:
+            return wf.getnframes() / wf.getframerate()
+    except (wave.Error, EOFError, OSError):
+        return None
+
+def transcribe_audio(audio_path, backend=None, scratch=None):
+    """Convert audio to text using speech recognition (segment files go to the job's scratch directory)"""
+    backend = backend or select_asr_backend()
+
+    # 有单次请求时长限制的服务：长音频在静音处切分后并发识别，再按时间顺序拼接
+    duration = _audio_duration(audio_path)
+    limit = backend.max_segment_seconds
+    if limit and not backend.segments_internally and duration and duration > limit:
+        # 切分依赖 numpy，用到时才导入
+        from segmented_asr import transcribe_segments
+
+        start_time = time.time()
+        # 片段两端各有重叠，主体长度要扣掉重叠部分，保证每次请求不超过时长上限
+        result = transcribe_segments(audio_path, backend.transcribe, limit - 2 * ASR_SEGMENT_OVERLAP,
+                                     overlap_seconds=ASR_SEGMENT_OVERLAP,
+                                     max_workers=ASR_SEGMENT_WORKERS or backend.max_concurrency,
+                                     scratch=scratch)
+        print(f"分段识别完成: 音频 {duration:.0f} 秒，{len(result['segments'])} 个片段，耗时 {time.time() - start_time:.2f} 秒")
+        # 部分片段失败时返回其他片段的文本（失败的时间段带有标记），全部失败时返回错误提示
+        if result["error"] and not result["text"]:
+            return result["error"]
+        return result["text"] or "无法识别音频内容。请确保音频清晰并包含语音。"
+
+    return backend.transcribe(audio_path)
+
+def _scratch_bytes(backend):
+    """估算任务临时目录的最大写入量：需要切分成片段文件的服务，同时识别的片段文件总大小"""
+    if not backend.max_segment_seconds or backend.segments_internally:
+        return 0
+    workers = ASR_SEGMENT_WORKERS or backend.max_concurrency
+    return workers * int(backend.max_segment_seconds * (backend.sample_rate or 16000) * 2)
 
 def summarize_with_deepseek(text):
     """Use DeepSeek API to summarize the text"""
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {DEEPSEEK_API_KEY}"
-    }
+    # 长文本分块总结，避免超出上下文长度
+    if estimate_tokens(text) > SUMMARY_CHUNK_TOKENS:
+        return summarize_long_text(text)
 
-    payload = {
-        "model": "deepseek-chat",  # Replace with the appropriate model name
-        "messages": [
-            {"role": "system", "content": "你是一个专业的内容总结助手。请对以下内容进行简洁、全面的总结归纳，提取关键信息和主要观点。"},
-            {"role": "user", "content": text}
-        ],
-        "temperature": 0.7,
-        "max_tokens": 1000
-    }
+    messages = [
+        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+        {"role": "user", "content": text}
+    ]
 
     try:
-        response = requests.post(DEEPSEEK_API_URL, headers=headers, data=json.dumps(payload))
-        response.raise_for_status()
-        result = response.json()
-        return result["choices"][0]["message"]["content"]
+        # 同一份转录文本的分析结果可以复用：写入响应缓存，重新处理时不再调用接口
+        return get_client().complete(messages, temperature=0.7, max_tokens=1000, cacheable=True)
     except Exception as e:
         return f"调用DeepSeek API时出错: {str(e)}"
 
-def generate_keywords_and_framework(text, summary):
-    """Use DeepSeek API to generate keywords and framework"""
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {DEEPSEEK_API_KEY}"
-    }
+def summarize_long_text(text):
+    """
+    分块总结长文本（map-reduce）
+
+    先在句子和分段边界上把文本切成不超过 SUMMARY_CHUNK_TOKENS 的块，
+    以 SUMMARY_MAX_PARALLEL 的并发度分别总结，再把各块总结合并为最终摘要。
+    各块总结合并后仍然过长时，逐层继续合并。
+
+    参数:
+        text (str): 转录文本
+
+    返回:
+        str: 摘要
+    """
+    client = get_client()
+
+    def summarize_chunk(args):
+        index, total, chunk = args
+        messages = [
+            {"role": "system", "content": CHUNK_SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": f"（第{index}/{total}部分）\n{chunk}"}
+        ]
+        return client.complete(messages, temperature=0.7, max_tokens=800, cacheable=True)
+
+    try:
+        level = 0
+        # 最多合并 5 层，防止预算配置过小时无法收敛
+        while level < 5:
+            chunks = split_text(text, SUMMARY_CHUNK_TOKENS)
+            if len(chunks) <= 1:
+                break
+            level += 1
+            start_time = time.time()
+            with ThreadPoolExecutor(max_workers=SUMMARY_MAX_PARALLEL) as executor:
+                partials = list(executor.map(
+                    summarize_chunk,
+                    [(i, len(chunks), chunk) for i, chunk in enumerate(chunks, 1)]
+                ))
+            print(f"第 {level} 层分块总结完成: {len(chunks)} 块，耗时 {time.time() - start_time:.2f} 秒")
+            text = "\n\n".join(f"第{i}部分总结：\n{partial}" for i, partial in enumerate(partials, 1))
+
+        messages = [
+            {"role": "system", "content": REDUCE_SUMMARY_SYSTEM_PROMPT if level else SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": text}
+        ]
+        return client.complete(messages, temperature=0.7, max_tokens=1000, cacheable=True)
+    except Exception as e:
+        return f"调用DeepSeek API时出错: {str(e)}"
 
-    prompt = f"""
+def build_keywords_prompt(text, summary):
+    """构建提取关键词和内容框架的提示词"""
+    return f"""
 请根据以下内容，提取5-10个关键词，并分析内容的大致框架结构。
 不需要总结内容，只需要提取关键词和分析框架结构。
 
@@ -274,32 +346,9 @@ def generate_keywords_and_framework(text, summary):
 ...
 """
 
-    payload = {
-        "model": "deepseek-chat",
-        "messages": [
-            {"role": "system", "content": "你是一个专业的内容分析助手，擅长提取关键词和分析内容框架。"},
-            {"role": "user", "content": prompt}
-        ],
-        "temperature": 0.7,
-        "max_tokens": 1000
-    }
-
-    try:
-        response = requests.post(DEEPSEEK_API_URL, headers=headers, data=json.dumps(payload))
-        response.raise_for_status()
-        result = response.json()
-        return result["choices"][0]["message"]["content"]
-    except Exception as e:
-        return f"生成关键词和框架时出错: {str(e)}"
-
-def generate_test_questions(text, summary, keywords_and_framework):
-    """Generate test questions based on the content"""
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {DEEPSEEK_API_KEY}"
-    }
-
-    prompt = f"""
+def build_questions_prompt(text, summary, keywords_and_framework):
+    """构建生成测试问题的提示词"""
+    return f"""
 请根据以下内容，生成5个测试问题，用于测试用户对内容的理解。
 问题应该涵盖内容的主要概念和关键点，难度适中。
 
@@ -323,24 +372,162 @@ def generate_test_questions(text, summary, keywords_and_framework):
 5. 问题5
 """
 
-    payload = {
-        "model": "deepseek-chat",
-        "messages": [
-            {"role": "system", "content": "你是一个专业的教育测试助手，擅长根据内容生成有针对性的测试问题。"},
-            {"role": "user", "content": prompt}
-        ],
-        "temperature": 0.7,
-        "max_tokens": 1000
-    }
+def generate_keywords_and_framework(text, summary):
+    """Use DeepSeek API to generate keywords and framework"""
+    prompt = build_keywords_prompt(text, summary)
+
+    messages = [
+        {"role": "system", "content": KEYWORDS_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+    try:
+        return get_client().complete(messages, temperature=0.7, max_tokens=1000, cacheable=True)
+    except Exception as e:
+        return f"生成关键词和框架时出错: {str(e)}"
+
+def generate_test_questions(text, summary, keywords_and_framework):
+    """Generate test questions based on the content"""
+    prompt = build_questions_prompt(text, summary, keywords_and_framework)
+
+    messages = [
+        {"role": "system", "content": QUESTIONS_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
 
     try:
-        response = requests.post(DEEPSEEK_API_URL, headers=headers, data=json.dumps(payload))
-        response.raise_for_status()
-        result = response.json()
-        return result["choices"][0]["message"]["content"]
+        return get_client().complete(messages, temperature=0.7, max_tokens=1000, cacheable=True)
     except Exception as e:
         return f"生成测试问题时出错: {str(e)}"
 
+COMBINED_SYSTEM_PROMPT = "你是一个专业的内容分析助手，擅长总结内容、提取关键词、分析内容框架并生成测试问题。请只输出JSON。"
+
+def build_combined_prompt(text):
+    """构建一次性生成摘要、关键词框架和测试问题的提示词"""
+    return f"""
+请根据以下内容，一次性完成三项任务：
+1. 对内容进行简洁、全面的总结归纳，提取关键信息和主要观点
+2. 提取5-10个关键词，并分析内容的大致框架结构
+3. 生成5个测试问题，用于测试用户对内容的理解，问题应涵盖主要概念和关键点，难度适中
+
+注意：由于语音转文字可能存在错误，请不要从中提取专业名词或生僻词汇，也不要基于可能是转录错误的内容提问。
+请专注于内容中明确的主题和概念。
+
+原文内容：
+{text}
+
+请严格按以下JSON格式输出，不要输出其他内容：
+{{
+  "summary": "内容总结",
+  "keywords": ["关键词1", "关键词2"],
+  "framework": ["第一部分：...", "第二部分：..."],
+  "test_questions": ["问题1", "问题2", "问题3", "问题4", "问题5"]
+}}
+"""
+
+def parse_combined_analysis(content):
+    """
+    校验并解析一次性分析返回的JSON，转换为三个现有字段的格式
+
+    参数:
+        content (str): 模型返回的文本
+
+    返回:
+        tuple: (summary, keywords_and_framework, test_questions)，校验失败时返回 None
+    """
+    content = content.strip()
+    # 去掉可能存在的 ```json 代码块标记
+    if content.startswith("```"):
+        content = content.split("\n", 1)[1] if "\n" in content else ""
+        content = content.rsplit("```", 1)[0]
+
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return None
+
+    if not isinstance(data, dict):
+        return None
+    summary = data.get("summary")
+    keywords = data.get("keywords")
+    framework = data.get("framework")
+    questions = data.get("test_questions")
+    if not isinstance(summary, str) or not summary.strip():
+        return None
+    for items in (keywords, framework, questions):
+        if not isinstance(items, list) or not items or not all(isinstance(item, str) for item in items):
+            return None
+
+    keywords_and_framework = "## 关键词\n"
+    keywords_and_framework += "\n".join(f"- {keyword}" for keyword in keywords)
+    keywords_and_framework += "\n\n## 内容框架\n"
+    keywords_and_framework += "\n".join(f"{i}. {part}" for i, part in enumerate(framework, 1))
+    test_questions = "\n".join(f"{i}. {question}" for i, question in enumerate(questions, 1))
+    return summary.strip(), keywords_and_framework, test_questions
+
+def analyze_content_combined(text):
+    """
+    用一次DeepSeek调用同时生成摘要、关键词框架和测试问题
+
+    参数:
+        text (str): 转录文本
+
+    返回:
+        tuple: (summary, keywords_and_framework, test_questions, metrics)，
+               调用或解析失败时返回 None，由调用方退回到逐项生成
+    """
+    messages = [
+        {"role": "system", "content": COMBINED_SYSTEM_PROMPT},
+        {"role": "user", "content": build_combined_prompt(text)}
+    ]
+
+    start_time = time.time()
+    try:
+        result = get_client().chat_completion(
+            messages,
+            temperature=0.7,
+            max_tokens=3000,
+            cacheable=True,
+            response_format={"type": "json_object"}
+        )
+        content = result["choices"][0]["message"]["content"]
+    except Exception as e:
+        print(f"一次性内容分析调用失败，将逐项生成: {e}")
+        return None
+    latency = time.time() - start_time
+
+    parsed = parse_combined_analysis(content)
+    if parsed is None:
+        print("一次性内容分析结果解析失败，将逐项生成")
+        return None
+    summary, keywords_and_framework, test_questions = parsed
+
+    # 用本次结果代入逐项生成时的三个提示词，估算节省的输入 token
+    separate_prompt_tokens = estimate_messages_tokens([
+        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+        {"role": "user", "content": text},
+        {"role": "system", "content": KEYWORDS_SYSTEM_PROMPT},
+        {"role": "user", "content": build_keywords_prompt(text, summary)},
+        {"role": "system", "content": QUESTIONS_SYSTEM_PROMPT},
+        {"role": "user", "content": build_questions_prompt(text, summary, keywords_and_framework)}
+    ])
+    combined_prompt_tokens = estimate_messages_tokens(messages)
+    usage = result.get("usage", {})
+
+    metrics = {
+        "mode": "combined",
+        "latency_seconds": round(latency, 2),
+        "round_trips": 1,
+        "saved_round_trips": 2,
+        "prompt_tokens": usage.get("prompt_tokens", combined_prompt_tokens),
+        "completion_tokens": usage.get("completion_tokens"),
+        "estimated_separate_prompt_tokens": separate_prompt_tokens,
+        "estimated_saved_prompt_tokens": max(separate_prompt_tokens - combined_prompt_tokens, 0)
+    }
+    print(f"一次性内容分析完成，耗时 {latency:.2f} 秒，"
+          f"预计节省输入 token: {metrics['estimated_saved_prompt_tokens']}")
+    return summary, keywords_and_framework, test_questions, metrics
+
 # 用户认证相关函数
 def get_user(username):
     conn = sqlite3.connect(DB_PATH)
@@ -366,16 +553,17 @@ def create_user(username, password):
     return success
 
 # 历史记录相关函数
-def save_usage_history(user_id, filename, original_text, summary, keywords_and_framework, test_questions):
-    """保存使用历史到数据库"""
+def save_usage_history(user_id, filename, original_text, summary, keywords_and_framework, test_questions,
+                       cache_key=None):
+    """保存使用历史到数据库，cache_key 指向该结果对应的缓存条目"""
     conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     try:
         cursor.execute("""
         INSERT INTO usage_history
-        (user_id, filename, original_text, summary, keywords_and_framework, test_questions)
-        VALUES (?, ?, ?, ?, ?, ?)
-        """, (user_id, filename, original_text, summary, keywords_and_framework, test_questions))
+        (user_id, filename, original_text, summary, keywords_and_framework, test_questions, cache_key)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (user_id, filename, original_text, summary, keywords_and_framework, test_questions, cache_key))
         conn.commit()
         history_id = cursor.lastrowid
         success = True
@@ -489,12 +677,37 @@ def logout():
     session.pop('username', None)
     return redirect(url_for('login'))
 
+def _owned_task(task_id):
+    """返回当前登录用户自己的任务，不存在或属于其他用户时返回 None"""
+    task = get_task_store().get(task_id)
+    if task is None or task.get('user_id') != session.get('user_id'):
+        return None
+    return task
+
 # 处理进度API
 @app.route('/progress/<task_id>', methods=['GET'])
 def get_progress(task_id):
-    if task_id in processing_tasks:
-        return jsonify(processing_tasks[task_id])
-    return jsonify({'status': 'unknown', 'progress': 0, 'message': '任务不存在'})
+    if 'user_id' not in session:
+        return jsonify({'status': 'unknown', 'progress': 0, 'message': '请先登录', 'error': '请先登录'}), 401
+
+    task = _owned_task(task_id)
+    if task is None:
+        return jsonify({'status': 'unknown', 'progress': 0, 'message': '任务不存在', 'error': '任务不存在'}), 404
+    return jsonify(task_snapshot(task))
+
+# 处理进度推送（Server-Sent Events）：检查任务归属后返回带签名的推送地址，
+# 推送连接由 progress_stream 的事件循环服务，不占用 Web 服务线程
+@app.route('/progress/<task_id>/subscribe', methods=['GET'])
+def subscribe_progress(task_id):
+    if 'user_id' not in session:
+        return jsonify({"error": "请先登录"}), 401
+    if _owned_task(task_id) is None:
+        return jsonify({"error": "任务不存在"}), 404
+
+    broadcaster = get_progress_broadcaster()
+    if not broadcaster.start():
+        return jsonify({"error": "进度推送不可用，请改用轮询"}), 503, {'Retry-After': '5'}
+    return jsonify({"url": broadcaster.stream_url(task_id, request.host, request.scheme)})
 
 @app.route('/chat', methods=['POST'])
 def chat():
@@ -516,57 +729,32 @@ def chat():
 
     # 构建聊天历史
     chat_history = data.get('chat_history', [])
-
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {DEEPSEEK_API_KEY}"
-    }
-
-    prompt = f"""
-你是一个教育助手，正在与用户进行关于以下内容的对话。
-你的任务是帮助用户理解内容，回答他们的问题，并测试他们的理解。
-
-原文内容：
-{original_text}
-
-内容摘要：
-{summary}
-
-测试问题：
-{test_questions}
-
-请注意：
-1. 你只能基于上述内容回答问题，不要引入外部知识
-2. 如果用户问的问题超出了上述内容范围，请礼貌地告诉他们你只能回答与上述内容相关的问题
-3. 你可以使用测试问题来测试用户的理解，但也可以根据用户的问题生成新的相关问题
-4. 保持回答简洁、清晰，避免过长的解释
-
-聊天历史：
-"""
-
-    # 添加聊天历史
-    for message in chat_history:
-        role = "用户" if message['role'] == 'user' else "助手"
-        prompt += f"{role}: {message['content']}\n"
-
-    # 添加当前用户消息
-    prompt += f"用户: {user_message}\n助手: "
-
-    payload = {
-        "model": "deepseek-chat",
-        "messages": [
-            {"role": "system", "content": "你是一个专业的教育助手，帮助用户理解内容并测试他们的知识。"},
-            {"role": "user", "content": prompt}
-        ],
-        "temperature": 0.7,
-        "max_tokens": 1000
-    }
+    # 相同的对话直接返回缓存的回复；重新生成回复时传入 no_cache 跳过缓存
+    use_cache = not data.get('no_cache', False)
+
+    # 在 token 预算内组装上下文：最近几轮对话原样保留，更早的对话滚动合并为摘要，转录文本按相关度节选
+    prompt, prompt_stats = build_chat_prompt(original_text, summary, test_questions, chat_history, user_message,
+                                             summarize=summarize_chat_history)
+    print(f"聊天提示词大小: {prompt_stats['prompt_tokens']} tokens（预算 {prompt_stats['budget']}）")
+
+    messages = [
+        {"role": "system", "content": "你是一个专业的教育助手，帮助用户理解内容并测试他们的知识。"},
+        {"role": "user", "content": prompt}
+    ]
+
+    # 流式输出：逐段把回复推送给浏览器
+    if data.get('stream'):
+        return Response(
+            stream_with_context(_stream_chat_reply(messages, history_id, user_message, use_cache, prompt_stats)),
+            mimetype='text/event-stream',
+            headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no'  # 禁止 nginx 缓冲推送内容
+            }
+        )
 
     try:
-        response = requests.post(DEEPSEEK_API_URL, headers=headers, data=json.dumps(payload))
-        response.raise_for_status()
-        result = response.json()
-        ai_response = result["choices"][0]["message"]["content"]
+        ai_response = get_client().complete(messages, temperature=0.7, max_tokens=1000, cacheable=use_cache)
 
         # 如果有历史记录ID，保存聊天记录到数据库
         if history_id:
@@ -576,11 +764,50 @@ def chat():
             save_chat_message(history_id, 'assistant', ai_response)
 
         return jsonify({
-            "response": ai_response
+            "response": ai_response,
+            "prompt_tokens": prompt_stats['prompt_tokens']
         })
     except Exception as e:
         return jsonify({"error": f"AI回复出错: {str(e)}"}), 500
 
+def summarize_chat_history(previous_summary, messages):
+    """把一组更早的对话合并进上一版摘要（温度为 0 并写入响应缓存，同一段历史只生成一次）"""
+    return get_client().complete(build_history_summary_messages(previous_summary, messages),
+                                 temperature=0, max_tokens=CHAT_SUMMARY_MAX_TOKENS, cacheable=True)
+
+def _stream_chat_reply(messages, history_id, user_message, use_cache=True, prompt_stats=None):
+    """
+    以 SSE 格式逐段输出AI回复，输出完成后保存聊天记录
+
+    事件格式: {"delta": 文本片段}，结束时 {"done": true}，出错时 {"error": 错误信息}
+    """
+    start_time = time.time()
+    first_token_time = None
+    parts = []
+    try:
+        for delta in get_client().stream_completion(messages, temperature=0.7, max_tokens=1000,
+                                                     cacheable=use_cache):
+            if first_token_time is None:
+                first_token_time = time.time() - start_time
+                print(f"聊天回复首个 token 耗时: {first_token_time:.2f} 秒")
+            parts.append(delta)
+            yield f"data: {json.dumps({'delta': delta}, ensure_ascii=False)}\n\n"
+    except Exception as e:
+        yield f"data: {json.dumps({'error': f'AI回复出错: {str(e)}'}, ensure_ascii=False)}\n\n"
+        return
+
+    ai_response = "".join(parts)
+
+    # 如果有历史记录ID，保存聊天记录到数据库
+    if history_id:
+        save_chat_message(history_id, 'user', user_message)
+        save_chat_message(history_id, 'assistant', ai_response)
+
+    done = {'done': True, 'first_token_seconds': first_token_time}
+    if prompt_stats:
+        done['prompt_tokens'] = prompt_stats['prompt_tokens']
+    yield f"data: {json.dumps(done, ensure_ascii=False)}\n\n"
+
 # 首页路由
 @app.route('/')
 def home():
@@ -717,6 +944,73 @@ def clear_history():
 
     return redirect(url_for('profile'))
 
+# 后台任务状态更新
+def _apply_task_update(task_id, fields):
+    """把任务状态更新写入任务存储（已结束的任务不再接受中间进度）"""
+    get_task_store().update(task_id, fields)
+
+def update_task(task_id, **fields):
+    """更新任务进度，工作线程和工作进程中都可以调用"""
+    publish_update(task_id, fields)
+
+def _on_job_done(task_id, result, error):
+    """后台任务结束回调"""
+    if error is not None:
+        print(f"任务 {task_id} 处理出错: {error}")
+        _apply_task_update(task_id, {
+            'status': 'error',
+            'message': f'处理出错: {str(error)}'
+        })
+        return
+
+    get_task_store().set_result(task_id, result)
+    _apply_task_update(task_id, {
+        'status': 'completed',
+        'stage': 'done',
+        'progress': 100,
+        'message': '处理完成',
+        'partial': {}
+    })
+
+def _create_job_executor():
+    executor = JobExecutor(on_update=_apply_task_update)
+    app.logger.info("后台任务执行器已启动: %s x %s", executor.mode, executor.max_workers)
+    return executor
+
+def get_job_executor():
+    return _runtime_object('job_executor', _create_job_executor)
+
+# 识别失败或 DeepSeek 调用失败时返回的提示文字，这类结果不写入缓存
+RESULT_ERROR_MARKERS = ('出错', '失败', '未配置', '无法识别', '无法连接', '不支持')
+
+def _is_valid_text(value):
+    """判断识别或分析的文本是否有效（失败时返回的是简短的错误提示）"""
+    value = value or ''
+    if not value.strip():
+        return False
+    return not (len(value) < 300 and any(marker in value for marker in RESULT_ERROR_MARKERS))
+
+def _is_complete_transcript(text):
+    """判断识别文本是否有效且完整（部分片段识别失败时文本中带有失败标记）"""
+    # segmented_asr 依赖 numpy，用到时才导入
+    from segmented_asr import has_failed_segments
+    return _is_valid_text(text) and not has_failed_segments(text)
+
+def _is_cacheable(result):
+    """判断处理结果是否可以写入缓存（识别文本不完整时也不缓存，下次重新识别）"""
+    return _is_complete_transcript(result.get('original_text')) and all(
+        _is_valid_text(result.get(field)) for field in ('summary', 'keywords_and_framework', 'test_questions'))
+
+def _on_upload_job_done(file_path, task_id, result, error):
+    """后台任务结束回调：记录结果，删除上传的文件（提取的音频和识别文本已保存在中间产物存储中）"""
+    try:
+        _on_job_done(task_id, result, error)
+    finally:
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+
 # 文件上传处理
 @app.route('/upload', methods=['POST'])
 def upload_file():
@@ -730,121 +1024,293 @@ def upload_file():
     if file.filename == '':
         return jsonify({"error": "未选择文件"}), 400
 
+    if not (allowed_file(file.filename, ALLOWED_AUDIO_EXTENSIONS) or
+            allowed_file(file.filename, ALLOWED_VIDEO_EXTENSIONS)):
+        return jsonify({"error": "不支持的文件类型"}), 400
+
     # 创建任务ID
     task_id = str(uuid.uuid4())
-    processing_tasks[task_id] = {
-        'status': 'starting',
-        'progress': 0,
-        'message': '正在准备处理...'
-    }
 
-    # 返回任务ID，前端将使用此ID查询进度
-    return jsonify({"task_id": task_id})
-
-@app.route('/process/<task_id>', methods=['GET'])
-def process_file(task_id):
-    if 'user_id' not in session:
-        return jsonify({"error": "请先登录"}), 401
+    # 以任务ID命名保存上传文件，避免同名文件互相覆盖
+    extension = file.filename.rsplit('.', 1)[1].lower()
+    file_path = os.path.join(UPLOAD_FOLDER, f"{task_id}.{extension}")
+    # 分块写入磁盘的同时计算文件哈希，用于结果缓存
+    media_hash, _ = save_stream_with_hash(file.stream, file_path)
 
-    if task_id not in processing_tasks:
-        return jsonify({"error": "任务不存在"}), 404
-
-    # 获取上传的文件信息
-    file_info = request.args.get('file')
-    if not file_info:
-        return jsonify({"error": "缺少文件信息"}), 400
+    _submit_processing_job(task_id, session.get('user_id'), file.filename, file_path, media_hash)
 
-    try:
-        # 开始处理
-        processing_tasks[task_id]['status'] = 'processing'
-        processing_tasks[task_id]['progress'] = 5
-        processing_tasks[task_id]['message'] = '正在处理文件...'
+    # 返回任务ID，前端将使用此ID查询进度和结果
+    return jsonify({"task_id": task_id})
 
-        # 检查文件类型并处理
-        if allowed_file(file_info, ALLOWED_AUDIO_EXTENSIONS):
-            # 处理音频文件
-            processing_tasks[task_id]['progress'] = 10
-            processing_tasks[task_id]['message'] = '正在处理音频文件...'
+def _submit_processing_job(task_id, user_id, filename, file_path, media_hash):
+    """创建任务并加入后台任务队列，任务结束（成功或出错）后删除上传的文件"""
+    get_task_store().create(task_id, {
+        'status': 'queued',
+        'stage': 'queued',
+        'progress': 0,
+        'message': '已加入处理队列，等待处理...',
+        'user_id': user_id
+    })
+    get_job_executor().submit(
+        task_id,
+        run_processing_job,
+        task_id,
+        user_id,
+        filename,
+        file_path,
+        media_hash,
+        on_done=lambda task_id, result, error: _on_upload_job_done(file_path, task_id, result, error)
+    )
 
-            audio_path = os.path.join(UPLOAD_FOLDER, file_info)
+# 分块上传：创建上传会话 → 按偏移量逐块 PUT → 完成后直接加入处理队列；连接中断后查询偏移量继续上传
+def _upload_error(error):
+    return jsonify(dict(error.details, error=str(error))), error.status
 
-            # 转换为WAV格式（如果需要）
-            if not audio_path.endswith('.wav'):
-                processing_tasks[task_id]['progress'] = 15
-                processing_tasks[task_id]['message'] = '正在转换音频格式...'
+@app.route('/upload/init', methods=['POST'])
+def upload_init():
+    if 'user_id' not in session:
+        return jsonify({"error": "请先登录"}), 401
 
-                temp_audio = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
-                os.system(f"ffmpeg -i {audio_path} {temp_audio.name}")
-                audio_path = temp_audio.name
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename') or ''
+    if not (allowed_file(filename, ALLOWED_AUDIO_EXTENSIONS) or allowed_file(filename, ALLOWED_VIDEO_EXTENSIONS)):
+        return jsonify({"error": "不支持的文件类型"}), 400
+    try:
+        return jsonify(get_chunked_uploads().create(session['user_id'], filename, data.get('size'), data.get('sha256')))
+    except UploadError as e:
+        return _upload_error(e)
 
-        elif allowed_file(file_info, ALLOWED_VIDEO_EXTENSIONS):
-            # 处理视频文件
-            processing_tasks[task_id]['progress'] = 10
-            processing_tasks[task_id]['message'] = '正在处理视频文件...'
+@app.route('/upload/<upload_id>', methods=['GET', 'PUT'])
+def upload_chunk(upload_id):
+    if 'user_id' not in session:
+        return jsonify({"error": "请先登录"}), 401
 
-            video_path = os.path.join(UPLOAD_FOLDER, file_info)
+    try:
+        if request.method == 'GET':
+            return jsonify(get_chunked_uploads().status(upload_id, session['user_id']))
+        offset = request.args.get('offset', type=int)
+        if offset is None:
+            return jsonify({"error": "缺少 offset 参数"}), 400
+        # 直接从请求流分段写入磁盘
+        return jsonify(get_chunked_uploads().write(upload_id, session['user_id'], offset, request.stream,
+                                             request.content_length))
+    except UploadError as e:
+        return _upload_error(e)
+
+@app.route('/upload/<upload_id>/complete', methods=['POST'])
+def upload_complete(upload_id):
+    if 'user_id' not in session:
+        return jsonify({"error": "请先登录"}), 401
 
-            # 提取音频
-            processing_tasks[task_id]['progress'] = 15
-            processing_tasks[task_id]['message'] = '正在从视频中提取音频...'
+    task_id = str(uuid.uuid4())
+    try:
+        meta, file_path, media_hash = get_chunked_uploads().complete(
+            upload_id, session['user_id'], task_id,
+            lambda meta: os.path.join(UPLOAD_FOLDER, f"{task_id}.{meta['filename'].rsplit('.', 1)[1].lower()}"))
+    except UploadError as e:
+        if e.details.get('task_id'):
+            # 重复的完成请求（例如响应丢失后重试）返回同一个任务
+            return jsonify({"task_id": e.details['task_id']})
+        return _upload_error(e)
+
+    _submit_processing_job(task_id, session['user_id'], meta['filename'], file_path, media_hash)
+    return jsonify({"task_id": task_id})
 
-            audio_path = extract_audio_from_video(video_path)
+def run_processing_job(task_id, user_id, filename, file_path, media_hash):
+    """
+    在后台执行完整的处理流程：解码、语音识别、内容分析、保存结果
+
+    相同内容的文件（按哈希）在语音识别服务、模型和提示词都不变时直接使用缓存结果。
+
+    参数:
+        task_id (str): 任务ID
+        user_id (int): 用户ID
+        filename (str): 用户上传时的原始文件名
+        file_path (str): 上传文件在服务器上的保存路径
+        media_hash (str): 上传文件内容的 SHA-256
+
+    返回:
+        dict: 处理结果
+    """
+    # 开始处理
+    update_task(task_id, status='processing', stage='decode', progress=5, message='正在处理文件...',
+                started_at=time.time())
+    partial = {}
+
+    # 查询结果缓存
+    prompt_version = f"{PROMPT_VERSION}-{ANALYSIS_MODE}"
+    cache_key = make_cache_key(media_hash, SPEECH_RECOGNITION_SERVICE, DEEPSEEK_MODEL, prompt_version)
+    cached = get_result_cache().get(cache_key)
+    if cached is not None:
+        print(f"任务 {task_id} 命中结果缓存: {cache_key}")
+        update_task(task_id, stage='save', progress=98, message='已找到相同文件的处理结果，正在保存...')
+        success, history_id = save_usage_history(
+            user_id,
+            filename,
+            cached['original_text'],
+            cached['summary'],
+            cached['keywords_and_framework'],
+            cached['test_questions'],
+            cache_key=cache_key
+        )
+        return dict(cached, history_id=history_id, cache_hit=True)
+
+    # 检查文件类型并处理
+    backend = select_asr_backend()
+    if not (allowed_file(filename, ALLOWED_AUDIO_EXTENSIONS) or allowed_file(filename, ALLOWED_VIDEO_EXTENSIONS)):
+        raise ValueError('不支持的文件类型')
+
+    # 同一内容的文件用同一个语音识别服务识别过时，直接使用保存的识别文本，跳过解码和识别
+    artifacts = get_artifact_store()
+    transcript_params = dict(backend.kwargs, backend=backend.name)
+    transcript_key = artifact_key(media_hash, "transcript", **transcript_params)
+    text = artifacts.get_text(transcript_key)
+    # 统计解码和识别阶段的内存峰值（线程模式下同时运行的任务共享进程，结果中 shared 为 True）
+    with MemoryMeter() as memory:
+        if text is not None:
+            print(f"任务 {task_id} 使用已保存的识别文本: {transcript_key}")
+            extraction_metrics = {"mode": "cached", "bytes": 0, "seconds": 0.0}
+            update_task(task_id, extraction_metrics=extraction_metrics)
         else:
-            processing_tasks[task_id]['status'] = 'error'
-            processing_tasks[task_id]['message'] = '不支持的文件类型'
-            return jsonify({"error": "不支持的文件类型"}), 400
-
-        # 转录音频
-        processing_tasks[task_id]['progress'] = 30
-        processing_tasks[task_id]['message'] = '正在进行语音识别...'
-        text = transcribe_audio(audio_path)
+            if backend.accepts(file_path):
+                # 服务自己用 ffmpeg 把音视频解码为 PCM 流，不需要先提取或转换音频
+                update_task(task_id, progress=10, message='正在处理音视频文件...')
+                audio_path = file_path
+                extraction_metrics = {"mode": "stream", "bytes": 0, "seconds": 0.0}
+            else:
+                # 按服务需要的格式一次提取音频（已经符合要求时直接使用或只复制音频流），
+                # 提取结果按文件内容保存，同一个文件再次处理时不用重新解码
+                update_task(task_id, progress=15, message='正在提取音频...')
+                extraction = extract_audio_cached(file_path, sample_rate=backend.sample_rate,
+                                                  source_hash=media_hash)
+                audio_path = extraction["path"]
+                extraction_metrics = {key: extraction[key] for key in ("mode", "bytes", "seconds", "duration")}
+            update_task(task_id, extraction_metrics=extraction_metrics)
+
+            # 转录音频；切分的片段文件写在任务的临时目录中，任务结束（成功或出错）时删除。
+            # 临时空间不足时在这里等待其他任务释放
+            update_task(task_id, stage='asr', progress=30, message='正在进行语音识别...')
+            with job_scratch(task_id, reserve_bytes=_scratch_bytes(backend)) as scratch:
+                text = transcribe_audio(audio_path, backend, scratch)
+            if _is_complete_transcript(text):
+                artifacts.put_text(transcript_key, text, source_hash=media_hash, kind="transcript",
+                                   backend=backend.name, params=transcript_params)
+
+    memory_metrics = memory.result()
+    update_task(task_id, memory_metrics=memory_metrics)
+    partial['original_text'] = text
+
+    # 长文本：摘要分块生成，关键词和测试问题只使用原文的均匀抽样片段和摘要
+    long_text = estimate_tokens(text) > SUMMARY_CHUNK_TOKENS
+    analysis_text = sample_text(text, ANALYSIS_CONTEXT_TOKENS) if long_text else text
+
+    analysis = None
+    if ANALYSIS_MODE == "combined" and not long_text:
+        # 一次调用生成摘要、关键词框架和测试问题
+        update_task(task_id, stage='analysis', progress=70, message='正在生成摘要、关键词和测试问题...',
+                    partial=dict(partial))
+        analysis = analyze_content_combined(text)
+
+    if analysis is not None:
+        summary, keywords_and_framework, test_questions, analysis_metrics = analysis
+    else:
+        analysis_start = time.time()
 
         # 生成摘要
-        processing_tasks[task_id]['progress'] = 70
-        processing_tasks[task_id]['message'] = '正在生成内容摘要...'
+        update_task(task_id, stage='summary', progress=70, message='正在生成内容摘要...', partial=dict(partial))
         summary = summarize_with_deepseek(text)
+        partial['summary'] = summary
 
         # 生成关键词和框架
-        processing_tasks[task_id]['progress'] = 85
-        processing_tasks[task_id]['message'] = '正在提取关键词和分析框架...'
-        keywords_and_framework = generate_keywords_and_framework(text, summary)
+        update_task(task_id, stage='keywords', progress=85, message='正在提取关键词和分析框架...',
+                    partial=dict(partial))
+        keywords_and_framework = generate_keywords_and_framework(analysis_text, summary)
+        partial['keywords_and_framework'] = keywords_and_framework
 
         # 生成测试问题
-        processing_tasks[task_id]['progress'] = 95
-        processing_tasks[task_id]['message'] = '正在生成测试问题...'
-        test_questions = generate_test_questions(text, summary, keywords_and_framework)
+        update_task(task_id, stage='questions', progress=95, message='正在生成测试问题...', partial=dict(partial))
+        test_questions = generate_test_questions(analysis_text, summary, keywords_and_framework)
+
+        analysis_metrics = {
+            "mode": "separate",
+            "latency_seconds": round(time.time() - analysis_start, 2),
+            "round_trips": 3,
+            "long_text": long_text
+        }
+
+    # 保存到数据库
+    update_task(task_id, stage='save', progress=98, message='正在保存处理结果...',
+                analysis_metrics=analysis_metrics)
+    result = {
+        "original_text": text,
+        "summary": summary,
+        "keywords_and_framework": keywords_and_framework,
+        "test_questions": test_questions
+    }
+    if _is_cacheable(result):
+        get_result_cache().put(cache_key, media_hash, SPEECH_RECOGNITION_SERVICE, DEEPSEEK_MODEL, prompt_version, result)
+    else:
+        cache_key = None
+
+    success, history_id = save_usage_history(
+        user_id,
+        filename,
+        text,
+        summary,
+        keywords_and_framework,
+        test_questions,
+        cache_key=cache_key
+    )
 
-        # 保存到数据库
-        processing_tasks[task_id]['progress'] = 98
-        processing_tasks[task_id]['message'] = '正在保存处理结果...'
+    return dict(result, history_id=history_id, cache_hit=False, analysis_metrics=analysis_metrics,
+                extraction_metrics=extraction_metrics, memory_metrics=memory_metrics)
 
-        user_id = session.get('user_id')
-        success, history_id = save_usage_history(
-            user_id,
-            file_info,
-            text,
-            summary,
-            keywords_and_framework,
-            test_questions
-        )
+# 结果缓存统计
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    if 'user_id' not in session:
+        return jsonify({"error": "请先登录"}), 401
+    return jsonify({
+        "result_cache": get_result_cache().stats(),
+        "artifact_store": get_artifact_store().stats(),
+        "scratch": scratch_stats(),
+        "llm_cache": get_client().cache.stats() if get_client().cache is not None else None
+    })
 
-        # 处理完成
-        processing_tasks[task_id]['status'] = 'completed'
-        processing_tasks[task_id]['progress'] = 100
-        processing_tasks[task_id]['message'] = '处理完成'
+# Whisper 模型状态API
+@app.route('/asr/whisper/models', methods=['GET'])
+def whisper_model_stats():
+    if 'user_id' not in session:
+        return jsonify({"error": "请先登录"}), 401
+    if not get_backend("whisper").available():
+        return jsonify({"error": "Whisper模块不可用"}), 404
+    return jsonify({"models": get_whisper_registry().stats()})
 
-        return jsonify({
-            "original_text": text,
-            "summary": summary,
-            "keywords_and_framework": keywords_and_framework,
-            "test_questions": test_questions,
-            "history_id": history_id
-        })
+# 语音识别服务列表API（能力信息和是否可用）
+@app.route('/asr/backends', methods=['GET'])
+def asr_backends():
+    if 'user_id' not in session:
+        return jsonify({"error": "请先登录"}), 401
+    return jsonify({"current": select_asr_backend().name, "backends": available_backends()})
 
-    except Exception as e:
-        processing_tasks[task_id]['status'] = 'error'
-        processing_tasks[task_id]['message'] = f'处理出错: {str(e)}'
-        return jsonify({"error": str(e)}), 500
+# 处理结果API
+@app.route('/result/<task_id>', methods=['GET'])
+@app.route('/process/<task_id>', methods=['GET'])
+def get_result(task_id):
+    if 'user_id' not in session:
+        return jsonify({"error": "请先登录"}), 401
+
+    task = get_task_store().get(task_id)
+    if task is None or task.get('user_id') != session.get('user_id'):
+        return jsonify({"error": "任务不存在"}), 404
+
+    if task['status'] == 'completed':
+        return jsonify(get_task_store().get_result(task_id))
+    if task['status'] == 'error':
+        return jsonify({"error": task['message']}), 500
+
+    # 任务尚未完成，返回当前进度
+    return jsonify(task_snapshot(task)), 202
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -2,12 +2,17 @@
 百度语音识别模块
 
 这个模块提供了使用百度语音识别 API 进行语音转文字的功能。
+短语音识别接口单次最长 60 秒，音视频由 ffmpeg 解码为 PCM 流，边解码边在静音处切分，通过共享的 AipSpeech 客户端并发识别，
+请求频率由按服务商共享的限流器控制；识别结果按时间顺序合并，失败的片段单独重试。
 """
 
 import os
-import json
+import threading
 from aip import AipSpeech
 from dotenv import load_dotenv
+from audio_stream import stream_segments, AudioStreamError
+from segmented_asr import transcribe_pcm_stream
+from rate_limiter import get_limiter
 
 # 加载环境变量
 load_dotenv()
@@ -17,45 +22,62 @@ BAIDU_APP_ID = os.getenv("BAIDU_APP_ID", "")
 BAIDU_API_KEY = os.getenv("BAIDU_API_KEY", "")
 BAIDU_SECRET_KEY = os.getenv("BAIDU_SECRET_KEY", "")
 
-def transcribe_with_baidu(audio_path, language='zh'):
+# 单个片段的最大长度（秒），接口限制为 60 秒
+BAIDU_CHUNK_SECONDS = float(os.getenv("BAIDU_CHUNK_SECONDS", "55"))
+# 同时识别的片段数和每秒请求数上限
+BAIDU_MAX_WORKERS = int(os.getenv("BAIDU_MAX_WORKERS", "4"))
+BAIDU_QPS = float(os.getenv("BAIDU_QPS", "5"))
+# 片段识别失败时的重试次数
+BAIDU_RETRIES = int(os.getenv("BAIDU_RETRIES", "2"))
+
+# 相邻片段的重叠长度（秒）
+CHUNK_OVERLAP = 0.5
+# 音频中没有可识别的语音
+ERR_NO_SPEECH = 3301
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """获取共享的 AipSpeech 客户端（复用访问令牌）"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = AipSpeech(BAIDU_APP_ID, BAIDU_API_KEY, BAIDU_SECRET_KEY)
+    return _client
+
+
+def recognize_pcm(pcm, rate=16000):
     """
-    使用百度语音识别服务进行语音识别
+    识别一段不超过 60 秒的 PCM 音频
 
     参数:
-        audio_path (str): 音频文件路径
-        language (str): 语言代码，默认为中文
+        pcm (bytes): 16 位单声道 PCM 数据
+        rate (int): 采样率
 
     返回:
-        str: 识别的文本
+        str: 识别的文本，失败时返回错误提示
     """
-    if not all([BAIDU_APP_ID, BAIDU_API_KEY, BAIDU_SECRET_KEY]):
-        return "未配置百度语音识别 API 密钥。请在 .env 文件中设置 BAIDU_APP_ID, BAIDU_API_KEY 和 BAIDU_SECRET_KEY。"
-
-    # 创建 AipSpeech 客户端
-    client = AipSpeech(BAIDU_APP_ID, BAIDU_API_KEY, BAIDU_SECRET_KEY)
-
-    # 读取音频文件
-    try:
-        with open(audio_path, 'rb') as f:
-            audio_data = f.read()
-    except Exception as e:
-        return f"读取音频文件失败: {e}"
-
     # 设置语音识别参数
     options = {
         'dev_pid': 1537,  # 普通话(支持简单的英文识别)
-        'format': 'wav',  # 音频格式
-        'rate': 16000,    # 采样率
+        'format': 'pcm',  # 音频格式
+        'rate': rate,     # 采样率
         'channel': 1,     # 声道数
     }
 
-    # 发送请求
+    get_limiter("baidu", BAIDU_QPS).acquire()
     try:
-        result = client.asr(audio_data, options.get('format'), options.get('rate'), options)
+        result = get_client().asr(pcm, options.get('format'), options.get('rate'), options)
 
         if result.get("err_no") == 0:
             # 识别成功
-            return result.get("result")[0]
+            return "".join(result.get("result") or [])
+        elif result.get("err_no") == ERR_NO_SPEECH:
+            # 静音片段
+            return ""
         else:
             # 识别失败
             error_msg = result.get('err_msg', '未知错误')
@@ -64,3 +86,31 @@ def transcribe_with_baidu(audio_path, language='zh'):
     except Exception as e:
         print(f"调用百度语音识别 API 时出错: {e}")
         return f"调用百度语音识别 API 时出错: {e}"
+
+
+def transcribe_with_baidu(audio_path, language='zh'):
+    """
+    使用百度语音识别服务进行语音识别
+
+    参数:
+        audio_path (str): 音视频文件路径（ffmpeg 支持的任意格式）
+        language (str): 语言代码，默认为中文
+
+    返回:
+        str: 识别的文本
+    """
+    if not all([BAIDU_APP_ID, BAIDU_API_KEY, BAIDU_SECRET_KEY]):
+        return "未配置百度语音识别 API 密钥。请在 .env 文件中设置 BAIDU_APP_ID, BAIDU_API_KEY 和 BAIDU_SECRET_KEY。"
+
+    try:
+        # 片段两端各有重叠，主体长度要扣掉重叠部分，保证每次请求不超过时长上限
+        segments = stream_segments(audio_path, BAIDU_CHUNK_SECONDS - 2 * CHUNK_OVERLAP, CHUNK_OVERLAP)
+        result = transcribe_pcm_stream(segments, recognize_pcm, overlap_seconds=CHUNK_OVERLAP,
+                                       max_workers=BAIDU_MAX_WORKERS, retries=BAIDU_RETRIES)
+    except AudioStreamError as e:
+        return f"读取音频文件失败: {e}"
+
+    # 部分片段失败时返回其他片段的文本（失败的时间段带有标记），全部失败时返回错误提示
+    if result["error"] and not result["text"]:
+        return result["error"]
+    return result["text"] or "无法识别音频内容。请确保音频清晰并包含语音。"
@@ -0,0 +1,239 @@
+"""
+对话上下文构建模块
+
+这个模块为 /chat 构建有 token 预算的提示词，避免每轮对话都重发完整的转录文本和全部聊天历史：
+- 最近几轮对话原样保留
+- 更早的对话每满 CHAT_SUMMARY_BLOCK_MESSAGES 条滚动合并进摘要：由上一版摘要和新的一组消息生成新摘要，
+  同一段历史的摘要请求内容相同，由 DeepSeek 响应缓存复用，每轮对话最多新增一次摘要调用
+- 还没有凑满一组的更早消息截断后保留（每条只保留开头部分），超出预算时丢弃最早的
+- 转录文本按与当前问题的相关度选取片段，放不下的部分被丢弃
+token 数在本地估算；生成摘要的函数由调用方传入，这个模块本身不调用远程接口。
+"""
+
+import os
+from dotenv import load_dotenv
+from token_budget import estimate_tokens, split_text
+
+# 加载环境变量
+load_dotenv()
+
+# 对话提示词的 token 预算
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "6000"))
+# 原样保留的最近对话轮数（一问一答算两条）
+CHAT_RECENT_MESSAGES = int(os.getenv("CHAT_RECENT_MESSAGES", "6"))
+# 更早的对话中每条消息截断后保留的字符数
+CHAT_TRUNCATED_MESSAGE_CHARS = int(os.getenv("CHAT_TRUNCATED_MESSAGE_CHARS", "60"))
+# 更早的对话每满多少条合并进一次摘要（为 0 时不生成摘要，只截断），摘要的最大 token 数
+CHAT_SUMMARY_BLOCK_MESSAGES = int(os.getenv("CHAT_SUMMARY_BLOCK_MESSAGES", "6"))
+CHAT_SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "400"))
+# 转录文本切分的片段大小（token）
+CHAT_TRANSCRIPT_CHUNK_TOKENS = int(os.getenv("CHAT_TRANSCRIPT_CHUNK_TOKENS", "300"))
+
+CHAT_INSTRUCTIONS = """你是一个教育助手，正在与用户进行关于以下内容的对话。
+你的任务是帮助用户理解内容，回答他们的问题，并测试他们的理解。
+"""
+
+CHAT_RULES = """请注意：
+1. 你只能基于上述内容回答问题，不要引入外部知识
+2. 如果用户问的问题超出了上述内容范围，请礼貌地告诉他们你只能回答与上述内容相关的问题
+3. 你可以使用测试问题来测试用户的理解，但也可以根据用户的问题生成新的相关问题
+4. 保持回答简洁、清晰，避免过长的解释
+"""
+
+CHAT_SUMMARY_SYSTEM_PROMPT = ("你是一个对话记录整理助手。请把已有的对话摘要和新的对话合并为一份简洁的摘要，"
+                              "保留用户问过的问题、助手给出的关键结论和还没有解决的问题，不要添加对话中没有的内容。")
+
+
+def _trim_to_tokens(text, max_tokens):
+    """按 token 预算截断文本（在句子边界上截断）"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    chunks = split_text(text, max(1, max_tokens))
+    return chunks[0] + "……" if chunks else ""
+
+
+def _bigrams(text):
+    """字符二元组集合，用于估算片段与问题的相关度（对中文不需要分词）"""
+    text = "".join(text.split())
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def _format_message(message):
+    role = "用户" if message.get('role') == 'user' else "助手"
+    return f"{role}: {message.get('content') or ''}\n"
+
+
+def build_history_summary_messages(previous_summary, messages):
+    """
+    构建滚动摘要的请求消息
+
+    参数:
+        previous_summary (str): 上一版摘要（第一组消息时为空）
+        messages (list): 需要合并进摘要的一组消息
+
+    返回:
+        list: DeepSeek 消息列表
+    """
+    content = f"已有的对话摘要：\n{previous_summary}\n\n" if previous_summary else ""
+    content += "新的对话：\n" + "".join(_format_message(m) for m in messages)
+    return [
+        {"role": "system", "content": CHAT_SUMMARY_SYSTEM_PROMPT},
+        {"role": "user", "content": content}
+    ]
+
+
+def summarize_history(older, summarize, block=CHAT_SUMMARY_BLOCK_MESSAGES):
+    """
+    把更早的对话按组滚动合并为摘要
+
+    分组从第一条消息开始，每组 block 条，一段历史的分组不随对话变长而改变，
+    已经生成过的各版摘要请求内容不变，由响应缓存直接返回。生成摘要失败时停止合并，剩下的消息由调用方截断保留。
+
+    参数:
+        older (list): 更早的消息（按时间顺序）
+        summarize (callable): 生成摘要的函数，签名为 summarize(previous_summary, messages)，返回新摘要
+        block (int): 每组的消息数
+
+    返回:
+        tuple: (摘要, 已合并进摘要的消息数)
+    """
+    summary = ""
+    folded = 0
+    while block > 0 and len(older) - folded >= block:
+        try:
+            summary = (summarize(summary, older[folded:folded + block]) or "").strip()
+        except Exception as e:
+            print(f"生成对话摘要时出错，更早的对话改为截断保留: {e}")
+            break
+        folded += block
+    return summary, folded
+
+
+def select_transcript(original_text, query, max_tokens):
+    """
+    从转录文本中选取与问题最相关的片段，按原文顺序拼接，不超过 token 预算
+
+    参数:
+        original_text (str): 转录文本
+        query (str): 当前问题（可包含最近的对话）
+        max_tokens (int): token 预算
+
+    返回:
+        tuple: (选取的文本, 选取的片段数, 总片段数)
+    """
+    if max_tokens <= 0 or not original_text:
+        return "", 0, 0
+    if estimate_tokens(original_text) <= max_tokens:
+        return original_text, 1, 1
+
+    chunks = split_text(original_text, CHAT_TRANSCRIPT_CHUNK_TOKENS)
+    query_bigrams = _bigrams(query)
+    scored = sorted(
+        range(len(chunks)),
+        key=lambda i: (-len(query_bigrams & _bigrams(chunks[i])), i)
+    )
+
+    selected = []
+    used = 0
+    for i in scored:
+        tokens = estimate_tokens(chunks[i])
+        if used + tokens > max_tokens:
+            continue
+        selected.append(i)
+        used += tokens
+
+    selected.sort()
+    parts = []
+    for n, i in enumerate(selected):
+        # 不相邻的片段之间用省略号隔开
+        if n and i != selected[n - 1] + 1:
+            parts.append("……")
+        parts.append(chunks[i])
+    return "".join(parts), len(selected), len(chunks)
+
+
+def build_chat_prompt(original_text, summary, test_questions, chat_history, user_message,
+                      budget=CHAT_CONTEXT_TOKENS, summarize=None):
+    """
+    构建有 token 预算的对话提示词
+
+    参数:
+        original_text (str): 转录文本
+        summary (str): 内容摘要
+        test_questions (str): 测试问题
+        chat_history (list): 聊天历史 [{"role": ..., "content": ...}, ...]
+        user_message (str): 当前用户消息
+        budget (int): token 预算
+        summarize (callable): 生成对话摘要的函数（见 summarize_history），为 None 时更早的对话只截断保留
+
+    返回:
+        tuple: (提示词, 统计信息)
+    """
+    chat_history = list(chat_history or [])
+    # 前端会把当前消息也放进历史，避免重复
+    if chat_history and chat_history[-1].get('role') == 'user' and chat_history[-1].get('content') == user_message:
+        chat_history.pop()
+
+    current = f"用户: {user_message}\n助手: "
+    summary = _trim_to_tokens(summary or "", budget // 4)
+    test_questions = _trim_to_tokens(test_questions or "", budget // 10)
+    fixed_tokens = (estimate_tokens(CHAT_INSTRUCTIONS) + estimate_tokens(CHAT_RULES) + estimate_tokens(summary)
+                    + estimate_tokens(test_questions) + estimate_tokens(current) + 20)
+
+    # 最近的对话原样保留（预算不足时减少条数）
+    recent = chat_history[-CHAT_RECENT_MESSAGES:] if CHAT_RECENT_MESSAGES > 0 else []
+    older = chat_history[:len(chat_history) - len(recent)]
+    recent_budget = budget * 3 // 10
+    while recent and sum(estimate_tokens(_format_message(m)) for m in recent) > recent_budget:
+        older.append(recent.pop(0))
+    recent_text = "".join(_format_message(m) for m in recent)
+
+    # 更早的对话滚动合并进摘要，还没有凑满一组的消息截断为每条的开头部分，超出预算时丢弃最早的
+    history_budget = budget // 10
+    history_summary, folded = summarize_history(older, summarize) if summarize is not None else ("", 0)
+    history_summary = _trim_to_tokens(history_summary, history_budget)
+    summary_tokens = estimate_tokens(history_summary)
+    truncated_lines = []
+    truncated_budget = history_budget - summary_tokens
+    truncated_tokens = 0
+    for message in reversed(older[folded:]):
+        content = (message.get('content') or '').replace("\n", " ")
+        if len(content) > CHAT_TRUNCATED_MESSAGE_CHARS:
+            content = content[:CHAT_TRUNCATED_MESSAGE_CHARS] + "……"
+        line = _format_message({'role': message.get('role'), 'content': content})
+        tokens = estimate_tokens(line)
+        if truncated_tokens + tokens > truncated_budget:
+            break
+        truncated_lines.insert(0, line)
+        truncated_tokens += tokens
+    truncated_text = "".join(truncated_lines)
+
+    # 剩余预算用于转录文本，优先选取与当前问题和最近对话相关的片段
+    transcript_budget = budget - fixed_tokens - estimate_tokens(recent_text) - summary_tokens - truncated_tokens
+    query = user_message + " " + " ".join(m.get('content') or '' for m in recent[-2:])
+    transcript, used_chunks, total_chunks = select_transcript(original_text or "", query, transcript_budget)
+
+    prompt = CHAT_INSTRUCTIONS
+    prompt += f"\n原文内容{'（节选）' if used_chunks < total_chunks else ''}：\n{transcript}\n"
+    prompt += f"\n内容摘要：\n{summary}\n"
+    prompt += f"\n测试问题：\n{test_questions}\n\n"
+    prompt += CHAT_RULES
+    if history_summary:
+        prompt += f"\n更早的聊天记录摘要：\n{history_summary}\n"
+    if truncated_text:
+        prompt += f"\n更早的聊天记录（每条只保留开头）：\n{truncated_text}"
+    prompt += "\n聊天历史：\n"
+    prompt += recent_text
+    prompt += current
+
+    stats = {
+        "prompt_tokens": estimate_tokens(prompt),
+        "budget": budget,
+        "recent_messages": len(recent),
+        "summarized_messages": folded,
+        "truncated_messages": len(truncated_lines),
+        "dropped_messages": len(older) - folded - len(truncated_lines),
+        "transcript_chunks": used_chunks,
+        "transcript_total_chunks": total_chunks
+    }
+    return prompt, stats
@@ -0,0 +1,341 @@
+"""
+分块上传模块
+
+这个模块实现可以断点续传的分块上传：客户端先创建上传会话，再按偏移量逐块 PUT 文件内容，全部收到后完成上传。
+- 每一块直接从请求流分段写入磁盘上的临时文件（uploads/partial/<上传ID>.part），不在内存中缓存整块
+- 写入的同时增量计算 SHA-256；服务重启、换了工作进程或临时文件被其他进程写过后，从临时文件已有的内容重新计算一次再继续
+- 检查偏移量和追加写入期间对临时文件加文件锁（fcntl.flock），多个工作进程同时收到同一块时只有一个能写入
+- 会话信息保存在旁边的 <上传ID>.json 中，连接中断后客户端查询已收到的字节数，从这个偏移量继续上传
+- 偏移量与已收到的字节数不一致的请求返回冲突，由客户端按服务端的偏移量重传；超过有效期的会话由后台线程定期删除
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import hashlib
+import threading
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:
+    # Windows 没有 fcntl 模块，只在进程内互斥（仅适用于单进程部署）
+    fcntl = None
+
+# 加载环境变量
+load_dotenv()
+
+# 单个文件的大小上限（字节）、每块的建议大小和上限（字节）、未完成会话的有效期（秒）
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(4 * 1024 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(8 * 1024 * 1024)))
+UPLOAD_CHUNK_MAX_BYTES = int(os.getenv("UPLOAD_CHUNK_MAX_BYTES", str(64 * 1024 * 1024)))
+UPLOAD_SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL", "86400"))
+# 删除过期会话的间隔（秒）
+UPLOAD_SWEEP_INTERVAL = int(os.getenv("UPLOAD_SWEEP_INTERVAL", "3600"))
+
+# 从请求流读取并写入磁盘的块大小（字节）
+WRITE_BLOCK_BYTES = 1024 * 1024
+
+UPLOAD_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400, **details):
+        """
+        上传请求错误
+
+        参数:
+            message (str): 错误提示
+            status (int): HTTP 状态码
+            **details: 返回给客户端的其他字段（如当前偏移量）
+        """
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+
+class ChunkedUploads:
+    def __init__(self, directory, max_bytes=UPLOAD_MAX_BYTES, ttl=UPLOAD_SESSION_TTL,
+                 sweep_interval=UPLOAD_SWEEP_INTERVAL):
+        """
+        创建分块上传管理器
+
+        参数:
+            directory (str): 保存未完成上传的目录
+            max_bytes (int): 单个文件的大小上限（字节）
+            ttl (int): 未完成会话的有效期（秒）
+            sweep_interval (int): 后台删除过期会话的间隔（秒），为 0 时不启动后台线程
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+        # 每个上传会话的锁和增量哈希状态 {上传ID: (已计算到的偏移量, sha256 对象, 本进程写入后临时文件的修改时间)}
+        self._locks = {}
+        self._hashers = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        if sweep_interval > 0:
+            threading.Thread(target=self._sweep_loop, args=(sweep_interval,), daemon=True).start()
+
+    def _sweep_loop(self, interval):
+        """定期删除过期会话"""
+        while not self._stopped.wait(interval):
+            try:
+                removed = self.sweep()
+                if removed:
+                    print(f"已删除 {removed} 个过期的上传会话")
+            except OSError as e:
+                print(f"删除过期上传会话失败: {e}")
+
+    def stop(self):
+        """停止后台清理线程"""
+        self._stopped.set()
+
+    def _paths(self, upload_id):
+        if not UPLOAD_ID_PATTERN.match(upload_id or ""):
+            raise UploadError("上传不存在", 404)
+        base = os.path.join(self.directory, upload_id)
+        return base + ".part", base + ".json"
+
+    def _session_lock(self, upload_id):
+        with self._lock:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    @contextmanager
+    def _locked_part(self, upload_id):
+        """
+        打开并锁定上传的临时文件，在进程内和多个工作进程之间互斥
+
+        返回:
+            int: 临时文件的描述符（追加模式），临时文件不存在（上传已完成或已删除）时为 None
+        """
+        part_path, _ = self._paths(upload_id)
+        with self._session_lock(upload_id):
+            try:
+                fd = os.open(part_path, os.O_WRONLY | os.O_APPEND)
+            except FileNotFoundError:
+                fd = None
+            try:
+                if fd is not None and fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                yield fd
+            finally:
+                # 关闭文件时释放文件锁
+                if fd is not None:
+                    os.close(fd)
+
+    def _load(self, upload_id, user_id):
+        part_path, meta_path = self._paths(upload_id)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            raise UploadError("上传不存在或已过期", 404)
+        if meta["user_id"] != user_id:
+            raise UploadError("上传不存在或已过期", 404)
+        return meta, part_path, meta_path
+
+    def _save(self, meta_path, meta):
+        meta["updated_at"] = time.time()
+        temp_path = f"{meta_path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(temp_path, meta_path)
+
+    def create(self, user_id, filename, size, sha256=None):
+        """
+        创建上传会话
+
+        参数:
+            user_id (int): 用户ID
+            filename (str): 原始文件名
+            size (int): 文件大小（字节）
+            sha256 (str): 客户端计算的文件哈希（可选，完成时校验）
+
+        返回:
+            dict: 会话状态
+        """
+        if not isinstance(size, int) or size <= 0:
+            raise UploadError("文件大小无效")
+        if size > self.max_bytes:
+            raise UploadError(f"文件过大，最大支持 {self.max_bytes / 1024 / 1024:.0f} MB", 413)
+
+        upload_id = uuid.uuid4().hex
+        part_path, meta_path = self._paths(upload_id)
+        open(part_path, 'wb').close()
+        meta = {
+            "upload_id": upload_id,
+            "user_id": user_id,
+            "filename": filename,
+            "size": size,
+            "sha256": sha256.lower() if sha256 else None,
+            "created_at": time.time(),
+            "task_id": None
+        }
+        self._save(meta_path, meta)
+        with self._lock:
+            self._hashers[upload_id] = (0, hashlib.sha256(), os.stat(part_path).st_mtime_ns)
+        return self._status(meta, 0)
+
+    def _status(self, meta, received):
+        return {
+            "upload_id": meta["upload_id"],
+            "filename": meta["filename"],
+            "size": meta["size"],
+            "offset": received,
+            "chunk_size": UPLOAD_CHUNK_BYTES,
+            "completed": meta["task_id"] is not None,
+            "task_id": meta["task_id"]
+        }
+
+    def status(self, upload_id, user_id):
+        """返回会话状态，其中 offset 为已收到的字节数（客户端从这里继续上传）"""
+        meta, part_path, _ = self._load(upload_id, user_id)
+        received = meta["size"] if meta["task_id"] else os.path.getsize(part_path)
+        return self._status(meta, received)
+
+    def write(self, upload_id, user_id, offset, stream, length):
+        """
+        从请求流写入一块数据
+
+        参数:
+            upload_id (str): 上传ID
+            user_id (int): 用户ID
+            offset (int): 这一块在文件中的起始位置，必须等于已收到的字节数
+            stream: 请求体数据流
+            length (int): 这一块的字节数（Content-Length）
+
+        返回:
+            dict: 会话状态
+        """
+        if length is None or length <= 0:
+            raise UploadError("缺少数据或 Content-Length", 411)
+        if length > UPLOAD_CHUNK_MAX_BYTES:
+            raise UploadError(f"单块数据不能超过 {UPLOAD_CHUNK_MAX_BYTES / 1024 / 1024:.0f} MB", 413)
+
+        with self._locked_part(upload_id) as fd:
+            # 在文件锁内读取会话信息：等待期间上传可能已被其他进程完成
+            meta, part_path, meta_path = self._load(upload_id, user_id)
+            if meta["task_id"]:
+                raise UploadError("上传已完成", 409, offset=meta["size"])
+            if fd is None:
+                raise UploadError("上传不存在或已过期", 404)
+            received = os.fstat(fd).st_size
+            if offset != received:
+                raise UploadError("偏移量与已收到的数据不一致", 409, offset=received)
+            if received + length > meta["size"]:
+                raise UploadError("数据超出了文件大小", 400, offset=received)
+
+            hashed, sha256 = self._hasher(upload_id, part_path, fd)
+            try:
+                with os.fdopen(fd, 'ab', closefd=False) as f:
+                    remaining = length
+                    while remaining:
+                        block = stream.read(min(WRITE_BLOCK_BYTES, remaining))
+                        if not block:
+                            break
+                        f.write(block)
+                        sha256.update(block)
+                        remaining -= len(block)
+                        hashed += len(block)
+            except Exception:
+                # 写入中断时哈希状态可能与文件不一致，下次从文件重新计算
+                with self._lock:
+                    self._hashers.pop(upload_id, None)
+                raise
+            with self._lock:
+                self._hashers[upload_id] = (hashed, sha256, os.fstat(fd).st_mtime_ns)
+            self._save(meta_path, meta)
+            # 连接提前断开时已写入的部分保留，客户端查询偏移量后继续
+            return self._status(meta, hashed)
+
+    def _hasher(self, upload_id, part_path, fd):
+        """返回 (已计算到的偏移量, sha256 对象)，调用方需持有临时文件的锁"""
+        stat = os.fstat(fd)
+        with self._lock:
+            state = self._hashers.get(upload_id)
+        # 大小和修改时间都与本进程上次写入后一致，说明之后没有其他进程写过
+        if state is not None and (state[0], state[2]) == (stat.st_size, stat.st_mtime_ns):
+            return state[0], state[1]
+        # 重启后、在其他工作进程中继续上传或其他进程写过：从已收到的内容重新计算
+        sha256 = hashlib.sha256()
+        with open(part_path, 'rb') as f:
+            for block in iter(lambda: f.read(WRITE_BLOCK_BYTES), b''):
+                sha256.update(block)
+        return stat.st_size, sha256
+
+    def complete(self, upload_id, user_id, task_id, destination):
+        """
+        完成上传：校验大小和哈希，把文件移动到 destination，并记录对应的任务ID
+
+        参数:
+            upload_id (str): 上传ID
+            user_id (int): 用户ID
+            task_id (str): 处理这个文件的任务ID（重复完成请求时返回同一个任务）
+            destination (callable): 参数为会话信息，返回文件最终的保存路径
+
+        返回:
+            tuple: (会话信息, 保存路径, 文件的 SHA-256)
+        """
+        with self._locked_part(upload_id) as fd:
+            meta, part_path, meta_path = self._load(upload_id, user_id)
+            if meta["task_id"]:
+                raise UploadError("上传已完成", 409, task_id=meta["task_id"])
+            if fd is None:
+                raise UploadError("上传不存在或已过期", 404)
+            received = os.fstat(fd).st_size
+            if received != meta["size"]:
+                raise UploadError("文件尚未上传完整", 409, offset=received)
+
+            _, sha256 = self._hasher(upload_id, part_path, fd)
+            media_hash = sha256.hexdigest()
+            if meta["sha256"] and meta["sha256"] != media_hash:
+                # 内容损坏，删除后重新上传
+                self.discard(upload_id)
+                raise UploadError("文件校验失败，请重新上传", 422)
+
+            file_path = destination(meta)
+            os.replace(part_path, file_path)
+            meta["task_id"] = task_id
+            self._save(meta_path, meta)
+            # 会话信息保留到过期（重复的完成请求返回同一个任务），内存中的状态不再需要
+            with self._lock:
+                self._hashers.pop(upload_id, None)
+                self._locks.pop(upload_id, None)
+            return meta, file_path, media_hash
+
+    def discard(self, upload_id):
+        """删除上传会话和已收到的数据"""
+        for path in self._paths(upload_id):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self._hashers.pop(upload_id, None)
+            self._locks.pop(upload_id, None)
+
+    def sweep(self):
+        """
+        删除超过有效期没有更新的会话
+
+        返回:
+            int: 删除的会话数
+        """
+        now = time.time()
+        removed = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            upload_id = name[:-len(".json")]
+            try:
+                if now - os.path.getmtime(os.path.join(self.directory, name)) > self.ttl:
+                    self.discard(upload_id)
+                    removed += 1
+            except (FileNotFoundError, UploadError):
+                continue
+        return removed
@@ -0,0 +1,235 @@
+"""
+DeepSeek API 客户端模块
+
+这个模块提供了所有 DeepSeek 调用共用的客户端：基于连接池的 requests.Session（保持长连接，
+避免每次调用都重新建立 TLS 连接），带连接/读取超时，在 429 和 5xx 错误时按指数退避加随机抖动重试，
+并用全局信号量限制同时进行中的请求数量。
+输出确定的请求（温度为 0，或调用方传入 cacheable=True）会先查询 llm_cache 中的响应缓存，其他请求每次重新生成。
+"""
+
+import os
+import json
+import time
+import random
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from llm_cache import LLMCache, LLM_CACHE_ENABLED, make_prompt_key
+
+# 加载环境变量
+load_dotenv()
+
+DEEPSEEK_API_URL = os.getenv("DEEPSEEK_API_URL", "https://api.deepseek.com/v1/chat/completions")
+DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY", "sk-a74d9a6d8d204890a5ef7efc6a70ec46")
+DEEPSEEK_MODEL = os.getenv("DEEPSEEK_MODEL", "deepseek-chat")
+
+# 连接池大小
+DEEPSEEK_POOL_SIZE = int(os.getenv("DEEPSEEK_POOL_SIZE", "10"))
+# 连接超时和读取超时（秒）
+DEEPSEEK_CONNECT_TIMEOUT = float(os.getenv("DEEPSEEK_CONNECT_TIMEOUT", "10"))
+DEEPSEEK_READ_TIMEOUT = float(os.getenv("DEEPSEEK_READ_TIMEOUT", "120"))
+# 最大重试次数和退避基数（秒）
+DEEPSEEK_MAX_RETRIES = int(os.getenv("DEEPSEEK_MAX_RETRIES", "3"))
+DEEPSEEK_BACKOFF_BASE = float(os.getenv("DEEPSEEK_BACKOFF_BASE", "1"))
+DEEPSEEK_BACKOFF_MAX = float(os.getenv("DEEPSEEK_BACKOFF_MAX", "30"))
+# 全局同时进行中的请求数量上限
+DEEPSEEK_MAX_INFLIGHT = int(os.getenv("DEEPSEEK_MAX_INFLIGHT", "8"))
+
+# 需要重试的 HTTP 状态码
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class DeepSeekClient:
+    def __init__(self, api_url=DEEPSEEK_API_URL, api_key=DEEPSEEK_API_KEY, pool_size=DEEPSEEK_POOL_SIZE,
+                 connect_timeout=DEEPSEEK_CONNECT_TIMEOUT, read_timeout=DEEPSEEK_READ_TIMEOUT,
+                 max_retries=DEEPSEEK_MAX_RETRIES, max_inflight=DEEPSEEK_MAX_INFLIGHT, cache=None):
+        """
+        创建 DeepSeek 客户端
+
+        参数:
+            api_url (str): 接口地址
+            api_key (str): API 密钥
+            pool_size (int): 连接池大小
+            connect_timeout (float): 连接超时（秒）
+            read_timeout (float): 读取超时（秒）
+            max_retries (int): 最大重试次数
+            max_inflight (int): 同时进行中的请求数量上限
+            cache (LLMCache): 响应缓存，为 None 时不使用缓存
+        """
+        self.api_url = api_url
+        self.api_key = api_key
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.cache = cache
+        self._inflight = threading.BoundedSemaphore(max_inflight)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}"
+        })
+
+    def _backoff(self, attempt, response=None):
+        """计算第 attempt 次重试前的等待时间（指数退避 + 随机抖动），优先使用 Retry-After"""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), DEEPSEEK_BACKOFF_MAX)
+        delay = min(DEEPSEEK_BACKOFF_BASE * (2 ** attempt), DEEPSEEK_BACKOFF_MAX)
+        return random.uniform(0, delay)
+
+    def _post(self, payload, stream=False):
+        """发送请求，在连接错误、超时、429 和 5xx 时重试"""
+        body = json.dumps(payload)
+        attempt = 0
+        while True:
+            response = None
+            try:
+                response = self.session.post(self.api_url, data=body, timeout=self.timeout, stream=stream)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    response.raise_for_status()
+                    return response
+                error = requests.HTTPError(f"{response.status_code} Error: {response.reason}", response=response)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+
+            if attempt >= self.max_retries:
+                if response is not None:
+                    response.raise_for_status()
+                raise error
+
+            delay = self._backoff(attempt, response)
+            print(f"DeepSeek 请求失败（{error}），{delay:.1f} 秒后进行第 {attempt + 1} 次重试")
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def _use_cache(self, temperature, cacheable):
+        """是否使用响应缓存：温度大于 0 的输出每次不同，除非调用方声明可以复用，否则不缓存"""
+        if self.cache is None:
+            return False
+        return cacheable if cacheable is not None else float(temperature) == 0
+
+    def chat_completion(self, messages, model=DEEPSEEK_MODEL, temperature=0.7, max_tokens=1000, cacheable=None,
+                        **kwargs):
+        """
+        调用聊天补全接口
+
+        参数:
+            messages (list): 消息列表
+            model (str): 模型名称
+            temperature (float): 温度
+            max_tokens (int): 最大输出 token 数
+            cacheable (bool): 是否使用响应缓存，为 None 时只缓存温度为 0 的请求
+            **kwargs: 其他请求参数（如 response_format）
+
+        返回:
+            dict: 接口返回的 JSON
+        """
+        cache_key = None
+        if self._use_cache(temperature, cacheable):
+            cache_key = make_prompt_key(model, messages, temperature, max_tokens, **kwargs)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        payload = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            **kwargs
+        }
+        with self._inflight:
+            response = self._post(payload)
+            result = response.json()
+
+        if cache_key is not None:
+            self.cache.put(cache_key, result)
+        return result
+
+    def complete(self, messages, **kwargs):
+        """调用聊天补全接口，只返回回复文本"""
+        result = self.chat_completion(messages, **kwargs)
+        return result["choices"][0]["message"]["content"]
+
+    def stream_completion(self, messages, model=DEEPSEEK_MODEL, temperature=0.7, max_tokens=1000, cacheable=None,
+                          **kwargs):
+        """
+        以流式方式调用聊天补全接口（stream: true），逐段返回生成的文本
+
+        只有在收到第一个字节之前的失败会被重试；整个流式输出期间占用一个并发名额。
+        命中响应缓存时一次性返回缓存的完整回复；完整输出结束后写入缓存。
+
+        参数:
+            messages (list): 消息列表
+            model (str): 模型名称
+            temperature (float): 温度
+            max_tokens (int): 最大输出 token 数
+            cacheable (bool): 是否使用响应缓存，为 None 时只缓存温度为 0 的请求
+
+        返回:
+            generator: 逐段生成的文本
+        """
+        cache_key = None
+        if self._use_cache(temperature, cacheable):
+            cache_key = make_prompt_key(model, messages, temperature, max_tokens, **kwargs)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                yield cached["choices"][0]["message"]["content"]
+                return
+
+        parts = []
+        payload = {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True,
+            **kwargs
+        }
+        with self._inflight:
+            response = self._post(payload, stream=True)
+            # text/event-stream 响应没有声明字符集时 requests 按 ISO-8859-1 解码，推送内容是 UTF-8
+            if not response.encoding or response.encoding.lower() == "iso-8859-1":
+                response.encoding = "utf-8"
+            try:
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    if not chunk.get("choices"):
+                        continue
+                    delta = chunk["choices"][0].get("delta", {}).get("content")
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+            finally:
+                response.close()
+
+        if cache_key is not None and parts:
+            self.cache.put(cache_key, {"choices": [{"message": {"role": "assistant", "content": "".join(parts)}}]})
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """获取进程内共享的 DeepSeek 客户端（工作进程 fork 后重新创建，不共享连接）"""
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client_pid != os.getpid():
+                _client = DeepSeekClient(cache=LLMCache() if LLM_CACHE_ENABLED else None)
+                _client_pid = os.getpid()
+    return _client
@@ -1,26 +1,16 @@
 import os
-import subprocess
-import tempfile
+from media_probe import extract_audio_cached
 
 def extract_audio_from_video(video_path):
-    """Extract audio from video file and save as temporary WAV file"""
+    """Extract audio from video file and save as 16kHz mono WAV file"""
     print(f"从视频中提取音频: {video_path}")
 
-    # 创建输出目录
-    output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'extracted_audio')
-    os.makedirs(output_dir, exist_ok=True)
+    # 使用ffmpeg一次转换为16kHz, 单声道, 16位PCM WAV（已经符合要求的音频流只复制），
+    # 按文件内容保存在中间产物存储中，同一个文件再次提取时直接返回
+    stats = extract_audio_cached(video_path)
 
-    # 生成输出文件名
-    base_name = os.path.splitext(os.path.basename(video_path))[0]
-    output_path = os.path.join(output_dir, f"{base_name}.wav")
-
-    # 使用ffmpeg直接转换为16kHz, 单声道, 16位PCM WAV
-    cmd = f"ffmpeg -i {video_path} -ar 16000 -ac 1 -acodec pcm_s16le {output_path}"
-    print(f"执行命令: {cmd}")
-    subprocess.run(cmd, shell=True, check=True)
-
-    print(f"音频已保存到: {output_path}")
-    return output_path
+    print(f"音频已保存到: {stats['path']}")
+    return stats["path"]
 
 def main():
     # 视频文件路径
@@ -0,0 +1,81 @@
+"""
+Google 语音识别模块
+
+这个模块提供了使用 Google 语音识别服务（SpeechRecognition 库）进行语音转文字的功能，作为其他服务不可用时的备选。
+免费接口单次请求的音频长度有限，音视频由 ffmpeg 解码为 PCM 流，边解码边在静音处切分并发识别，
+请求频率由按服务商共享的限流器控制；识别结果按时间顺序合并，失败的片段单独重试。
+"""
+
+import os
+import speech_recognition as sr
+from dotenv import load_dotenv
+from audio_stream import stream_segments, AudioStreamError
+from segmented_asr import transcribe_pcm_stream
+from rate_limiter import get_limiter
+
+# 加载环境变量
+load_dotenv()
+
+# 单个片段的最大长度（秒）
+GOOGLE_CHUNK_SECONDS = float(os.getenv("GOOGLE_CHUNK_SECONDS", "50"))
+# 同时识别的片段数和每秒请求数上限
+GOOGLE_MAX_WORKERS = int(os.getenv("GOOGLE_MAX_WORKERS", "4"))
+GOOGLE_QPS = float(os.getenv("GOOGLE_QPS", "5"))
+# 片段识别失败时的重试次数
+GOOGLE_RETRIES = int(os.getenv("GOOGLE_RETRIES", "2"))
+
+# 相邻片段的重叠长度（秒）
+CHUNK_OVERLAP = 0.5
+
+# 识别器只保存参数，可以在线程之间共享
+recognizer = sr.Recognizer()
+
+
+def recognize_pcm(pcm, rate=16000):
+    """
+    识别一段 PCM 音频
+
+    参数:
+        pcm (bytes): 16 位单声道 PCM 数据
+        rate (int): 采样率
+
+    返回:
+        str: 识别的文本，没有识别到内容时返回空字符串，失败时返回错误提示
+    """
+    audio_data = sr.AudioData(pcm, rate, 2)
+    get_limiter("google", GOOGLE_QPS).acquire()
+    try:
+        return recognizer.recognize_google(audio_data, language='zh-CN')
+    except sr.UnknownValueError:
+        # 静音或无法识别的片段
+        return ""
+    except sr.RequestError as e:
+        print(f"无法连接到Google语音识别服务: {e}")
+        return f"无法连接到Google语音识别服务: {e}"
+
+
+def transcribe_with_google(audio_path):
+    """
+    使用 Google 语音识别服务进行语音识别
+
+    参数:
+        audio_path (str): 音视频文件路径（ffmpeg 支持的任意格式）
+
+    返回:
+        str: 识别的文本
+    """
+    try:
+        segments = stream_segments(audio_path, GOOGLE_CHUNK_SECONDS - 2 * CHUNK_OVERLAP, CHUNK_OVERLAP)
+        result = transcribe_pcm_stream(segments, recognize_pcm, overlap_seconds=CHUNK_OVERLAP,
+                                       max_workers=GOOGLE_MAX_WORKERS, retries=GOOGLE_RETRIES)
+    except AudioStreamError as e:
+        print(f"读取音频文件失败: {e}")
+        return f"读取音频文件失败: {e}"
+
+    # 部分片段失败时返回其他片段的文本（失败的时间段带有标记）
+    if result["error"] and not result["text"]:
+        return "无法连接到语音识别服务。请检查网络连接，或稍后再试。\n\n可能的原因：\n1. 网络连接问题\n2. 服务器防火墙限制\n3. 区域限制\n4. API使用限制"
+    if not result["text"]:
+        print("Google语音识别无法识别音频内容")
+        return "无法识别音频内容。请确保音频清晰并包含语音。"
+    return result["text"]
@@ -0,0 +1,175 @@
+"""
+DeepSeek 响应缓存模块
+
+这个模块按请求内容缓存 DeepSeek 的返回结果。缓存键是 (模型, 消息, 温度, 最大 token 数, 其他请求参数)
+规范化后的哈希，相同的提示词直接返回缓存结果。温度为 0 的请求和调用方声明结果可以复用的请求使用缓存：
+摘要、关键词框架、测试问题和对话回复都声明可以复用，重新生成对话回复时（/chat 的 no_cache）跳过缓存。
+缓存分两级：进程内的 LRU 和 SQLite 表，SQLite 中的条目有过期时间和总大小上限。
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+from sqlite_util import SQLiteDatabase
+
+# 加载环境变量
+load_dotenv()
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+# 相对路径按项目目录解析
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "cache.db")
+# SQLite 中条目的有效期（秒）和总大小上限（字节）
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# 进程内 LRU 的条目数上限
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256"))
+
+
+def make_prompt_key(model, messages, temperature, max_tokens, **kwargs):
+    """
+    生成请求的缓存键
+
+    参数:
+        model (str): 模型名称
+        messages (list): 消息列表
+        temperature (float): 温度
+        max_tokens (int): 最大输出 token 数
+        **kwargs: 其他请求参数
+
+    返回:
+        str: 十六进制哈希值
+    """
+    normalized = {
+        "model": model,
+        "messages": [{"role": m.get("role"), "content": (m.get("content") or "").strip()} for m in messages],
+        "temperature": float(temperature),
+        "max_tokens": int(max_tokens),
+        "extra": kwargs
+    }
+    raw = json.dumps(normalized, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, path=LLM_CACHE_PATH, ttl=LLM_CACHE_TTL, max_bytes=LLM_CACHE_MAX_BYTES,
+                 memory_entries=LLM_CACHE_MEMORY_ENTRIES):
+        """
+        创建 DeepSeek 响应缓存
+
+        参数:
+            path (str): SQLite 数据库路径，相对路径按项目目录解析
+            ttl (int): 条目有效期（秒）
+            max_bytes (int): SQLite 中缓存总大小上限（字节）
+            memory_entries (int): 进程内 LRU 的条目数上限
+        """
+        self._db = SQLiteDatabase(path)
+        self.path = self._db.path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()  # {key: (过期时间, 响应)}
+        self._memory_lock = threading.Lock()
+        self._counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+        self._counters_lock = threading.Lock()
+        self._init_schema()
+
+    def _init_schema(self):
+        conn = self._db.connect()
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            prompt_key TEXT PRIMARY KEY,
+            response TEXT NOT NULL,
+            size_bytes INTEGER NOT NULL,
+            expires_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        )
+        ''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_expires_at ON llm_cache(expires_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache(last_access)")
+
+    def _count(self, name):
+        with self._counters_lock:
+            self._counters[name] += 1
+
+    def _remember(self, key, expires_at, response):
+        """写入进程内 LRU"""
+        with self._memory_lock:
+            self._memory[key] = (expires_at, response)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        """
+        查询缓存
+
+        返回:
+            dict: 缓存的响应 JSON，未命中或已过期时返回 None
+        """
+        now = time.time()
+        with self._memory_lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self._count('memory_hits')
+                    return entry[1]
+                del self._memory[key]
+
+        conn = self._db.connect()
+        row = conn.execute("SELECT response, expires_at FROM llm_cache WHERE prompt_key = ?", (key,)).fetchone()
+        if row is None or row['expires_at'] <= now:
+            if row is not None:
+                conn.execute("DELETE FROM llm_cache WHERE prompt_key = ?", (key,))
+            self._count('misses')
+            return None
+
+        conn.execute("UPDATE llm_cache SET last_access = ? WHERE prompt_key = ?", (now, key))
+        response = json.loads(row['response'])
+        self._remember(key, row['expires_at'], response)
+        self._count('disk_hits')
+        return response
+
+    def put(self, key, response):
+        """写入缓存，并清理过期条目和超出大小上限的条目"""
+        now = time.time()
+        expires_at = now + self.ttl
+        data = json.dumps(response, ensure_ascii=False)
+        self._remember(key, expires_at, response)
+
+        with self._db.immediate() as conn:
+            conn.execute('''
+            INSERT OR REPLACE INTO llm_cache (prompt_key, response, size_bytes, expires_at, last_access)
+            VALUES (?, ?, ?, ?, ?)
+            ''', (key, data, len(data.encode('utf-8')), expires_at, now))
+            conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+            self._evict(conn)
+
+    def _evict(self, conn):
+        """按最近访问时间从旧到新淘汰条目，直到总大小不超过上限"""
+        total = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) AS total FROM llm_cache").fetchone()['total']
+        if total <= self.max_bytes:
+            return
+        evicted_keys = []
+        for row in conn.execute("SELECT prompt_key, size_bytes FROM llm_cache ORDER BY last_access ASC"):
+            if total <= self.max_bytes:
+                break
+            evicted_keys.append(row['prompt_key'])
+            total -= row['size_bytes']
+        conn.executemany("DELETE FROM llm_cache WHERE prompt_key = ?", [(key,) for key in evicted_keys])
+
+    def stats(self):
+        """返回本进程的命中/未命中计数，以及 SQLite 中的条目数和总大小"""
+        row = self._db.connect().execute(
+            "SELECT COUNT(*) AS entries, COALESCE(SUM(size_bytes), 0) AS bytes FROM llm_cache").fetchone()
+        with self._counters_lock:
+            stats = dict(self._counters)
+        stats['entries'] = row['entries']
+        stats['bytes'] = row['bytes']
+        stats['memory_entries'] = len(self._memory)
+        stats['max_bytes'] = self.max_bytes
+        return stats
@@ -0,0 +1,205 @@
+"""
+音视频探测与音频提取模块
+
+这个模块先用 ffprobe 读取音视频文件的格式和音频流参数（没有 ffprobe 时解析 ffmpeg -i 的输出），
+再按语音识别服务需要的格式（16 位 PCM WAV、指定采样率、单声道）一次解码提取音频：
+- 已经是目标格式的 WAV 文件直接使用，不写任何文件
+- 音频流已经是目标编码、只是封装格式不同时，只复制音频流（-c:a copy），不重新解码
+- 其他情况由一个 ffmpeg 进程直接解码、重采样并写出 WAV
+每次提取都返回写入的字节数和解码耗时，便于按任务统计。
+提取的音频可以按源文件内容哈希保存在 artifact_store 中，同一个文件再次处理时不用重新解码。
+"""
+
+import os
+import re
+import json
+import time
+import subprocess
+from dotenv import load_dotenv
+from artifact_store import get_store, artifact_key
+from result_cache import hash_file
+
+# 加载环境变量
+load_dotenv()
+
+# ffmpeg / ffprobe 可执行文件
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+FFPROBE_BINARY = os.getenv("FFPROBE_BINARY", "ffprobe")
+
+# ffmpeg 输出中的声道布局
+CHANNEL_LAYOUTS = {"mono": 1, "stereo": 2, "2.1": 3, "quad": 4, "4.0": 4, "5.0": 5, "5.1": 6, "6.1": 7, "7.1": 8}
+
+
+class MediaProbeError(Exception):
+    """探测或提取失败"""
+
+
+def probe(media_path):
+    """
+    探测音视频文件
+
+    参数:
+        media_path (str): 音视频文件路径
+
+    返回:
+        dict: {"format": 封装格式, "duration": 时长（秒，未知时为 None）, "size": 文件大小, "has_video": 是否有视频流,
+               "audio": {"codec", "sample_rate", "channels"}（第一个音频流，没有音频时为 None）}
+
+    异常:
+        MediaProbeError: 文件无法识别
+    """
+    command = [FFPROBE_BINARY, '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', media_path]
+    try:
+        completed = subprocess.run(command, capture_output=True, text=True)
+    except FileNotFoundError:
+        # 只有 ffmpeg（例如 imageio-ffmpeg 自带的可执行文件）时解析 ffmpeg -i 的输出
+        return _probe_with_ffmpeg(media_path)
+    if completed.returncode != 0:
+        raise MediaProbeError(f"无法识别文件 {media_path}: {' '.join(completed.stderr.split())}")
+
+    data = json.loads(completed.stdout or "{}")
+    streams = data.get("streams", [])
+    audio = next((stream for stream in streams if stream.get("codec_type") == "audio"), None)
+    duration = data.get("format", {}).get("duration")
+    return {
+        "format": data.get("format", {}).get("format_name", ""),
+        "duration": float(duration) if duration else None,
+        "size": os.path.getsize(media_path),
+        "has_video": any(stream.get("codec_type") == "video" for stream in streams),
+        "audio": {
+            "codec": audio.get("codec_name"),
+            "sample_rate": int(audio["sample_rate"]) if audio.get("sample_rate") else None,
+            "channels": audio.get("channels")
+        } if audio else None
+    }
+
+
+def _probe_with_ffmpeg(media_path):
+    try:
+        completed = subprocess.run([FFMPEG_BINARY, '-hide_banner', '-nostdin', '-i', media_path],
+                                   capture_output=True, text=True)
+    except FileNotFoundError:
+        raise MediaProbeError(f"找不到 ffprobe 和 ffmpeg（{FFMPEG_BINARY}），请安装 ffmpeg 或设置 FFMPEG_BINARY")
+    output = completed.stderr
+
+    # 没有指定输出文件时 ffmpeg 总是返回错误，这里只看输入信息是否解析成功
+    container = re.search(r"^Input #0, (.+?), from ", output, re.MULTILINE)
+    if not container:
+        raise MediaProbeError(f"无法识别文件 {media_path}: {' '.join(output.split()[-20:])}")
+
+    duration = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", output)
+    audio = re.search(r"Stream #0:\d+.*?: Audio: (\w+).*?, (\d+) Hz, ([^,]+)", output)
+    channels = None
+    if audio:
+        layout = audio.group(3).strip()
+        channels = CHANNEL_LAYOUTS.get(layout.split("(")[0])
+        if channels is None and layout.split()[0].isdigit():
+            channels = int(layout.split()[0])
+    return {
+        "format": container.group(1),
+        "duration": (int(duration.group(1)) * 3600 + int(duration.group(2)) * 60 + float(duration.group(3))
+                     if duration else None),
+        "size": os.path.getsize(media_path),
+        "has_video": re.search(r"Stream #0:\d+.*?: Video: ", output) is not None,
+        "audio": {
+            "codec": audio.group(1),
+            "sample_rate": int(audio.group(2)),
+            "channels": channels
+        } if audio else None
+    }
+
+
+def extract_audio(media_path, output_path, sample_rate=16000, channels=1, info=None):
+    """
+    把音视频文件中的第一个音频流提取为 16 位 PCM WAV，只解码一次
+
+    参数:
+        media_path (str): 音视频文件路径
+        output_path (str): 输出 WAV 文件路径（不需要写文件时不会创建）
+        sample_rate (int): 目标采样率，为 None 时保持原采样率
+        channels (int): 目标声道数
+        info (dict): probe 的结果，为 None 时自动探测
+
+    返回:
+        dict: {"path": 可以直接使用的 WAV 文件路径（可能就是输入文件）, "mode": "none"/"copy"/"decode",
+               "bytes": 写入的字节数, "seconds": 提取耗时, "duration": 音频时长}
+
+    异常:
+        MediaProbeError: 文件中没有音频或提取失败
+    """
+    info = info or probe(media_path)
+    audio = info["audio"]
+    if audio is None:
+        raise MediaProbeError("文件中没有音频")
+
+    matches = (audio["codec"] == "pcm_s16le" and audio["channels"] == channels
+               and (sample_rate is None or audio["sample_rate"] == sample_rate))
+    if matches and info["format"] == "wav":
+        return {"path": media_path, "mode": "none", "bytes": 0, "seconds": 0.0, "duration": info["duration"]}
+
+    if matches:
+        # 编码已经符合要求，只换封装格式
+        mode = "copy"
+        codec_args = ['-c:a', 'copy']
+    else:
+        mode = "decode"
+        codec_args = ['-ac', str(channels), '-c:a', 'pcm_s16le']
+        if sample_rate:
+            codec_args += ['-ar', str(sample_rate)]
+
+    command = [FFMPEG_BINARY, '-nostdin', '-y', '-loglevel', 'error', '-i', media_path,
+               '-map', '0:a:0', '-vn', *codec_args, '-f', 'wav', output_path]
+    start_time = time.time()
+    try:
+        completed = subprocess.run(command, capture_output=True, text=True)
+    except FileNotFoundError:
+        raise MediaProbeError(f"找不到 ffmpeg（{FFMPEG_BINARY}），请安装 ffmpeg 或设置 FFMPEG_BINARY")
+    if completed.returncode != 0:
+        raise MediaProbeError(f"提取音频失败: {' '.join(completed.stderr.split())}")
+
+    stats = {
+        "path": output_path,
+        "mode": mode,
+        "bytes": os.path.getsize(output_path),
+        "seconds": round(time.time() - start_time, 3),
+        "duration": info["duration"]
+    }
+    print(f"音频提取完成（{mode}）: 写入 {stats['bytes'] / 1024 / 1024:.1f} MB，耗时 {stats['seconds']:.2f} 秒")
+    return stats
+
+
+def extract_audio_cached(media_path, sample_rate=16000, channels=1, source_hash=None):
+    """
+    提取音频并保存到中间产物存储；同一内容、同样参数的音频已经提取过时直接返回
+
+    参数:
+        media_path (str): 音视频文件路径
+        sample_rate (int): 目标采样率，为 None 时保持原采样率
+        channels (int): 目标声道数
+        source_hash (str): 源文件内容的 SHA-256，为 None 时计算
+
+    返回:
+        dict: 与 extract_audio 相同，另有 cached 表示是否直接使用了已提取的音频
+
+    异常:
+        MediaProbeError: 文件中没有音频或提取失败
+    """
+    source_hash = source_hash or hash_file(media_path)
+    params = {"sample_rate": sample_rate, "channels": channels, "codec": "pcm_s16le"}
+    key = artifact_key(source_hash, "audio", **params)
+    store = get_store()
+
+    cached = store.get(key)
+    if cached is not None:
+        print(f"使用已提取的音频: {cached['path']}")
+        return {"path": cached["path"], "mode": "cached", "bytes": 0, "seconds": 0.0,
+                "duration": cached.get("duration"), "cached": True}
+
+    info = probe(media_path)
+    with store.writer(key, ".wav", source_hash=source_hash, kind="audio", params=params,
+                      duration=info["duration"]) as temp_path:
+        stats = extract_audio(media_path, temp_path, sample_rate, channels, info)
+        if stats["path"] != temp_path:
+            # 源文件已经符合要求，不需要另存一份
+            return dict(stats, cached=False)
+    return dict(stats, path=store.path_for(key, ".wav"), cached=False)
@@ -0,0 +1,387 @@
+"""
+任务进度推送模块
+
+这个模块为任务进度提供 Server-Sent Events 推送，推送连接不占用 Web 服务线程：
+- 所有推送连接由一个后台线程中的 asyncio 事件循环服务（单独监听 PROGRESS_STREAM_PORT），
+  上百个同时上传的浏览器只对应上百个协程，不需要上百个服务线程
+- 事件循环按固定间隔批量检查被订阅任务的版本号，只有任务状态发生变化时才推送，
+  订阅者只会收到变化的内容（阶段、进度、预计剩余时间和新的阶段性结果）
+- 预计剩余时间随时钟变化，不参与是否变化的比较；没有变化时按心跳间隔发送注释行，防止代理断开空闲连接
+- Web 接口检查任务归属后签发带签名的推送地址（/progress/<task_id>/stream?token=...），推送服务只校验签名
+- Linux 上多个 Web 工作进程用 SO_REUSEPORT 监听同一个端口，所有进程读取同一份任务存储
+"""
+
+import os
+import re
+import json
+import time
+import errno
+import socket
+import asyncio
+import threading
+from urllib.parse import urlsplit, parse_qs
+from dotenv import load_dotenv
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+
+# 加载环境变量
+load_dotenv()
+
+# 检查任务状态的间隔（秒）
+PROGRESS_POLL_INTERVAL = float(os.getenv("PROGRESS_POLL_INTERVAL", "0.5"))
+# 没有变化时发送心跳的间隔（秒），防止代理断开空闲连接
+PROGRESS_HEARTBEAT_INTERVAL = float(os.getenv("PROGRESS_HEARTBEAT_INTERVAL", "15"))
+# 每个进程同时打开的推送连接数上限
+PROGRESS_MAX_STREAMS = int(os.getenv("PROGRESS_MAX_STREAMS", "1000"))
+# 推送服务监听的地址和端口（端口为 0 时不提供推送，前端改用轮询）
+PROGRESS_STREAM_HOST = os.getenv("PROGRESS_STREAM_HOST", "0.0.0.0")
+PROGRESS_STREAM_PORT = int(os.getenv("PROGRESS_STREAM_PORT", "5003"))
+# 浏览器访问推送服务的地址（经过反向代理或使用 HTTPS 时设置），留空时使用页面的主机名和 PROGRESS_STREAM_PORT
+PROGRESS_STREAM_URL = os.getenv("PROGRESS_STREAM_URL", "")
+# 推送地址中签名的有效期（秒），连接断开后浏览器在有效期内可以用同一个地址重连
+PROGRESS_STREAM_TOKEN_MAX_AGE = int(os.getenv("PROGRESS_STREAM_TOKEN_MAX_AGE", "3600"))
+
+# 任务的结束状态
+FINISHED_STATUSES = ('completed', 'error', 'unknown')
+
+# 推送服务只处理这一个路径
+STREAM_PATH_PATTERN = re.compile(r"^/progress/([^/]+)/stream$")
+# 读取请求头的超时（秒）和长度上限（字节）
+REQUEST_TIMEOUT = 10
+REQUEST_MAX_BYTES = 8192
+# 客户端接收过慢、发送缓冲超过这个大小（字节）时断开连接
+WRITE_BUFFER_LIMIT = 256 * 1024
+# 端口绑定失败后，至少间隔这么久（秒）才重试
+BIND_RETRY_INTERVAL = 5
+
+STREAM_HEADERS = (
+    "HTTP/1.1 200 OK\r\n"
+    "Content-Type: text/event-stream; charset=utf-8\r\n"
+    "Cache-Control: no-cache\r\n"
+    "Connection: close\r\n"
+    "X-Accel-Buffering: no\r\n"  # 禁止 nginx 缓冲推送内容
+    "Access-Control-Allow-Origin: *\r\n"  # 推送服务和页面不同端口；地址中的签名就是凭据，不需要 Cookie
+    "\r\n"
+).encode()
+
+HTTP_REASONS = {403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed", 503: "Service Unavailable"}
+
+
+def estimate_eta(task, now=None):
+    """
+    根据已用时间和当前进度估算剩余时间
+
+    返回:
+        int: 预计剩余秒数，无法估算时返回 None
+    """
+    started_at = task.get('started_at')
+    progress = task.get('progress') or 0
+    if not started_at or progress <= 0 or progress >= 100:
+        return None
+    elapsed = (now or time.time()) - started_at
+    return int(elapsed * (100 - progress) / progress)
+
+
+def task_snapshot(task):
+    """生成推送给前端的任务状态（不含阶段性结果）"""
+    return {
+        'status': task.get('status'),
+        'stage': task.get('stage'),
+        'progress': task.get('progress', 0),
+        'message': task.get('message', ''),
+        'eta': estimate_eta(task)
+    }
+
+
+def _comparable(snapshot):
+    """用于判断状态是否变化的部分：预计剩余时间随时钟变化，不参与比较"""
+    return {key: value for key, value in snapshot.items() if key != 'eta'}
+
+
+def _sse_event(data):
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class _Stream:
+    def __init__(self, task_id, writer, now):
+        """一个推送连接：记录已经推送过的状态和阶段性结果"""
+        self.task_id = task_id
+        self.writer = writer
+        self.last_snapshot = None
+        self.sent_partial = {}
+        self.last_write = now
+        self.closed = False
+
+    def write(self, text, now):
+        if self.closed:
+            return
+        self.writer.write(text.encode('utf-8'))
+        self.last_write = now
+        # 不等待客户端接收（不阻塞事件循环），接收过慢的客户端直接断开，由浏览器改用轮询
+        if self.writer.transport.get_write_buffer_size() > WRITE_BUFFER_LIMIT:
+            self.close()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.writer.close()
+
+
+class ProgressBroadcaster:
+    def __init__(self, store, secret, interval=PROGRESS_POLL_INTERVAL, heartbeat=PROGRESS_HEARTBEAT_INTERVAL,
+                 max_streams=PROGRESS_MAX_STREAMS, host=PROGRESS_STREAM_HOST, port=PROGRESS_STREAM_PORT,
+                 public_url=PROGRESS_STREAM_URL, token_max_age=PROGRESS_STREAM_TOKEN_MAX_AGE):
+        """
+        创建进度推送服务（第一次调用 start 时在后台线程中启动）
+
+        参数:
+            store (TaskStore): 任务存储
+            secret (str): 签名推送地址的密钥
+            interval (float): 检查任务状态的间隔（秒）
+            heartbeat (float): 心跳间隔（秒）
+            max_streams (int): 同时打开的推送连接数上限
+            host (str): 监听地址
+            port (int): 监听端口，为 0 时不提供推送
+            public_url (str): 浏览器访问推送服务的地址，为空时使用页面的主机名和 port
+            token_max_age (int): 推送地址中签名的有效期（秒）
+        """
+        self.store = store
+        self.interval = interval
+        self.heartbeat = heartbeat
+        self.max_streams = max_streams
+        self.host = host
+        self.port = port
+        self.public_url = public_url.rstrip('/')
+        self.token_max_age = token_max_age
+        self._serializer = URLSafeTimedSerializer(secret, salt="progress-stream")
+        # 以下状态只在事件循环线程中访问
+        self._streams = {}  # {task_id: set(_Stream)}
+        self._versions = {}  # {task_id: 最近一次看到的版本号}
+        self._count = 0
+        # 启动状态
+        self._lock = threading.Lock()
+        self._loop = None
+        self._poller = None
+        self._server = None
+        self._served_elsewhere = False
+        self._last_bind_attempt = None
+
+    # ---- Web 工作线程中调用 ----
+
+    def start(self):
+        """
+        启动推送服务（已启动时直接返回）
+
+        返回:
+            bool: 推送服务是否可用（本进程在监听，或端口已由其他工作进程监听）
+        """
+        if self.port <= 0:
+            return False
+        with self._lock:
+            if self._server is not None or self._served_elsewhere:
+                return True
+            now = time.monotonic()
+            if self._last_bind_attempt is not None and now - self._last_bind_attempt < BIND_RETRY_INTERVAL:
+                return False
+            self._last_bind_attempt = now
+
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, daemon=True, name="clipmind-progress").start()
+                self._poller = asyncio.run_coroutine_threadsafe(self._poll(), self._loop)
+            try:
+                self._server = asyncio.run_coroutine_threadsafe(self._listen(), self._loop).result(REQUEST_TIMEOUT)
+            except OSError as e:
+                if e.errno == errno.EADDRINUSE and not hasattr(socket, "SO_REUSEPORT"):
+                    # 不支持端口复用的系统上只有一个工作进程能监听，由它为所有进程提供推送
+                    self._served_elsewhere = True
+                    print(f"进度推送端口 {self.port} 已由其他进程监听")
+                    return True
+                print(f"进度推送服务启动失败，前端改用轮询: {e}")
+                return False
+            print(f"进度推送服务已启动: {self.host}:{self.port}")
+            return True
+
+    def stop(self):
+        """停止推送服务，关闭所有推送连接"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+            server, self._server = self._server, None
+        if loop is None:
+            return
+
+        async def close():
+            self._poller.cancel()
+            if server is not None:
+                server.close()
+            for streams in list(self._streams.values()):
+                for stream in list(streams):
+                    stream.close()
+
+        asyncio.run_coroutine_threadsafe(close(), loop).result(REQUEST_TIMEOUT)
+        loop.call_soon_threadsafe(loop.stop)
+
+    @property
+    def listening_port(self):
+        """本进程实际监听的端口，没有监听时为 None"""
+        server = self._server
+        return server.sockets[0].getsockname()[1] if server is not None and server.sockets else None
+
+    def stream_token(self, task_id):
+        """签发任务的推送凭据（调用方负责检查任务归属）"""
+        return self._serializer.dumps(task_id)
+
+    def verify_token(self, task_id, token):
+        """校验推送凭据是否属于这个任务且没有过期"""
+        try:
+            return self._serializer.loads(token, max_age=self.token_max_age) == task_id
+        except BadSignature:
+            return False
+
+    def stream_url(self, task_id, request_host, scheme="http"):
+        """
+        返回浏览器打开推送连接的地址
+
+        参数:
+            task_id (str): 任务ID
+            request_host (str): 页面请求的 Host（PROGRESS_STREAM_URL 为空时使用其中的主机名）
+            scheme (str): 页面请求的协议
+
+        返回:
+            str: 带签名的推送地址
+        """
+        base = self.public_url
+        if not base:
+            hostname = urlsplit(f"//{request_host}").hostname or "localhost"
+            if ":" in hostname:
+                hostname = f"[{hostname}]"
+            base = f"{scheme}://{hostname}:{self.listening_port or self.port}"
+        return f"{base}/progress/{task_id}/stream?token={self.stream_token(task_id)}"
+
+    # ---- 以下在事件循环线程中运行 ----
+
+    async def _listen(self):
+        options = {"reuse_port": True} if hasattr(socket, "SO_REUSEPORT") else {}
+        return await asyncio.start_server(self._handle, self.host, self.port, limit=REQUEST_MAX_BYTES, **options)
+
+    async def _handle(self, reader, writer):
+        """处理一个推送连接：校验请求，推送当前状态，之后由 _poll 推送变化，直到任务结束或客户端断开"""
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), REQUEST_TIMEOUT)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.close()
+            return
+
+        status, task_id = self._route(head)
+        if status == 200 and self._count >= self.max_streams:
+            status = 503
+        if status != 200:
+            reason = HTTP_REASONS[status]
+            writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Length: 0\r\nConnection: close\r\n"
+                         f"Access-Control-Allow-Origin: *\r\n\r\n".encode())
+            writer.close()
+            return
+
+        now = asyncio.get_running_loop().time()
+        stream = _Stream(task_id, writer, now)
+        writer.write(STREAM_HEADERS)
+        self._streams.setdefault(task_id, set()).add(stream)
+        self._count += 1
+        try:
+            self._push(stream, self._get_task(task_id), now)
+            # 客户端不会再发送数据，读到结束说明连接已断开
+            while not stream.closed:
+                if not await reader.read(1024):
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            stream.close()
+            self._drop(stream)
+
+    def _route(self, head):
+        """解析请求行，返回 (状态码, 任务ID)"""
+        try:
+            method, target, _ = head.split(b"\r\n", 1)[0].decode('latin-1').split(" ", 2)
+        except ValueError:
+            return 404, None
+        url = urlsplit(target)
+        match = STREAM_PATH_PATTERN.match(url.path)
+        if match is None:
+            return 404, None
+        if method != "GET":
+            return 405, None
+        task_id = match.group(1)
+        token = parse_qs(url.query).get("token", [""])[0]
+        if not self.verify_token(task_id, token):
+            return 403, None
+        return 200, task_id
+
+    def _drop(self, stream):
+        streams = self._streams.get(stream.task_id)
+        if streams is None or stream not in streams:
+            return
+        streams.discard(stream)
+        self._count -= 1
+        if not streams:
+            del self._streams[stream.task_id]
+            self._versions.pop(stream.task_id, None)
+
+    def _get_task(self, task_id):
+        # SQLite WAL 的读取不会被写入阻塞，直接在事件循环线程中查询
+        return self.store.get(task_id)
+
+    def _push(self, stream, task, now):
+        """把任务状态中变化的部分推送给一个连接，任务结束或不存在时关闭连接"""
+        if task is None:
+            stream.write(_sse_event({'status': 'unknown', 'progress': 0, 'message': '任务不存在'}), now)
+            stream.close()
+            return
+
+        snapshot = task_snapshot(task)
+        comparable = _comparable(snapshot)
+        # 只推送新增或变化的阶段性结果
+        partial = {key: value for key, value in (task.get('partial') or {}).items()
+                   if stream.sent_partial.get(key) != value}
+        if comparable != stream.last_snapshot or partial:
+            event = dict(snapshot)
+            if partial:
+                event['partial'] = partial
+                stream.sent_partial.update(partial)
+            stream.write(_sse_event(event), now)
+            stream.last_snapshot = comparable
+
+        if snapshot['status'] in FINISHED_STATUSES:
+            stream.close()
+
+    async def _poll(self):
+        """批量检查所有被订阅任务的版本号，推送变化，给空闲连接发送心跳"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.interval)
+            if not self._streams:
+                continue
+
+            task_ids = list(self._streams)
+            try:
+                versions = self.store.get_versions(task_ids)
+            except Exception as e:
+                print(f"检查任务进度时出错: {e}")
+                continue
+
+            now = loop.time()
+            for task_id in task_ids:
+                version = versions.get(task_id)
+                if version is None or version != self._versions.get(task_id):
+                    try:
+                        task = self._get_task(task_id)
+                    except Exception as e:
+                        print(f"读取任务进度时出错: {e}")
+                        continue
+                    self._versions[task_id] = version
+                    for stream in list(self._streams.get(task_id, ())):
+                        self._push(stream, task, now)
+
+                for stream in list(self._streams.get(task_id, ())):
+                    if now - stream.last_write >= self.heartbeat:
+                        stream.write(": keepalive\n\n", now)
+
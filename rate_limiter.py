@@ -0,0 +1,64 @@
+"""
+请求频率限制模块
+
+这个模块提供了按服务商共享的令牌桶限流器，限制对云端语音识别接口的每秒请求数（QPS）。
+同一个服务商的所有线程共用一个限流器，超过限制的请求会等待，而不是被服务端拒绝后再重试。
+"""
+
+import time
+import threading
+
+
+class RateLimiter:
+    def __init__(self, qps, burst=None):
+        """
+        创建令牌桶限流器
+
+        参数:
+            qps (float): 每秒允许的请求数，小于等于 0 时不限制
+            burst (int): 令牌桶容量（允许的突发请求数），默认等于 qps
+        """
+        self.qps = qps
+        self.capacity = max(1.0, float(burst if burst is not None else qps))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """获取一个令牌，没有令牌时等待；返回等待的秒数"""
+        if self.qps <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.qps)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.qps
+            time.sleep(delay)
+            waited += delay
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider, qps, burst=None):
+    """
+    获取服务商共享的限流器（第一次获取时按给定的 qps 创建）
+
+    参数:
+        provider (str): 服务商名称，如 baidu、google
+        qps (float): 每秒允许的请求数
+        burst (int): 允许的突发请求数
+
+    返回:
+        RateLimiter: 限流器
+    """
+    with _limiters_lock:
+        if provider not in _limiters:
+            _limiters[provider] = RateLimiter(qps, burst)
+        return _limiters[provider]
@@ -0,0 +1,190 @@
+"""
+处理结果缓存模块
+
+这个模块按上传文件内容的 SHA-256 缓存完整的处理结果（转录文本、摘要、关键词框架、测试问题）。
+缓存键由文件哈希、语音识别服务、DeepSeek 模型和提示词版本共同决定，
+任何一项变化都不会命中旧结果。缓存总大小超过上限时，按最近访问时间淘汰最久未使用的条目。
+"""
+
+import os
+import time
+import hashlib
+from dotenv import load_dotenv
+from sqlite_util import SQLiteDatabase
+
+# 加载环境变量
+load_dotenv()
+
+# 相对路径按项目目录解析
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "cache.db")
+# 缓存总大小上限（字节）
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# 缓存的结果字段
+RESULT_FIELDS = ('original_text', 'summary', 'keywords_and_framework', 'test_questions')
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """
+    计算文件内容的 SHA-256
+
+    参数:
+        path (str): 文件路径
+        chunk_size (int): 每次读取的字节数
+
+    返回:
+        str: 十六进制哈希值
+    """
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def save_stream_with_hash(stream, path, chunk_size=1024 * 1024):
+    """
+    把上传的数据流分块写入文件，同时计算 SHA-256，不在内存中缓存整个文件
+
+    参数:
+        stream: 可读的文件对象（如 request.files['file'].stream）
+        path (str): 保存路径
+        chunk_size (int): 每次读取的字节数
+
+    返回:
+        tuple: (十六进制哈希值, 写入的字节数)
+    """
+    sha256 = hashlib.sha256()
+    size = 0
+    with open(path, 'wb') as f:
+        for chunk in iter(lambda: stream.read(chunk_size), b''):
+            sha256.update(chunk)
+            f.write(chunk)
+            size += len(chunk)
+    return sha256.hexdigest(), size
+
+
+def make_cache_key(media_hash, asr_backend, model, prompt_version):
+    """由文件哈希、语音识别服务、模型和提示词版本生成缓存键"""
+    raw = "|".join([media_hash, asr_backend, model, str(prompt_version)])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, path=RESULT_CACHE_PATH, max_bytes=RESULT_CACHE_MAX_BYTES):
+        """
+        创建处理结果缓存
+
+        参数:
+            path (str): SQLite 数据库路径，相对路径按项目目录解析
+            max_bytes (int): 缓存总大小上限（字节）
+        """
+        self._db = SQLiteDatabase(path)
+        self.path = self._db.path
+        self.max_bytes = max_bytes
+        self._init_schema()
+
+    def _init_schema(self):
+        conn = self._db.connect()
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS result_cache (
+            cache_key TEXT PRIMARY KEY,
+            media_hash TEXT NOT NULL,
+            asr_backend TEXT NOT NULL,
+            model TEXT NOT NULL,
+            prompt_version TEXT NOT NULL,
+            original_text TEXT,
+            summary TEXT,
+            keywords_and_framework TEXT,
+            test_questions TEXT,
+            size_bytes INTEGER NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        )
+        ''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_result_cache_last_access ON result_cache(last_access)")
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS result_cache_stats (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+        ''')
+        conn.executemany("INSERT OR IGNORE INTO result_cache_stats (name, value) VALUES (?, 0)",
+                         [('hits',), ('misses',), ('evictions',), ('bytes',)])
+
+    def _incr(self, conn, name, amount=1):
+        conn.execute("UPDATE result_cache_stats SET value = value + ? WHERE name = ?", (amount, name))
+
+    def get(self, cache_key):
+        """
+        查询缓存，同时更新命中/未命中计数
+
+        返回:
+            dict: 缓存的结果字段，未命中时返回 None
+        """
+        conn = self._db.connect()
+        row = conn.execute("SELECT * FROM result_cache WHERE cache_key = ?", (cache_key,)).fetchone()
+        if row is None:
+            self._incr(conn, 'misses')
+            return None
+
+        conn.execute("UPDATE result_cache SET hits = hits + 1, last_access = ? WHERE cache_key = ?",
+                     (time.time(), cache_key))
+        self._incr(conn, 'hits')
+        return {field: row[field] for field in RESULT_FIELDS}
+
+    def put(self, cache_key, media_hash, asr_backend, model, prompt_version, result):
+        """
+        写入缓存，超过大小上限时淘汰最久未使用的条目
+
+        参数:
+            cache_key (str): 缓存键
+            media_hash (str): 文件哈希
+            asr_backend (str): 语音识别服务
+            model (str): DeepSeek 模型
+            prompt_version (str): 提示词版本
+            result (dict): 处理结果，包含 RESULT_FIELDS 中的字段
+        """
+        size = sum(len((result.get(field) or '').encode('utf-8')) for field in RESULT_FIELDS)
+        now = time.time()
+        with self._db.immediate() as conn:
+            old = conn.execute("SELECT size_bytes FROM result_cache WHERE cache_key = ?", (cache_key,)).fetchone()
+            conn.execute('''
+            INSERT OR REPLACE INTO result_cache
+            (cache_key, media_hash, asr_backend, model, prompt_version,
+             original_text, summary, keywords_and_framework, test_questions,
+             size_bytes, created_at, last_access)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (cache_key, media_hash, asr_backend, model, str(prompt_version),
+                  result.get('original_text'), result.get('summary'),
+                  result.get('keywords_and_framework'), result.get('test_questions'),
+                  size, now, now))
+            self._incr(conn, 'bytes', size - (old['size_bytes'] if old else 0))
+            self._evict(conn)
+
+    def _evict(self, conn):
+        """按最近访问时间从旧到新淘汰条目，直到总大小不超过上限"""
+        total = conn.execute("SELECT value FROM result_cache_stats WHERE name = 'bytes'").fetchone()['value']
+        if total <= self.max_bytes:
+            return
+        rows = conn.execute("SELECT cache_key, size_bytes FROM result_cache ORDER BY last_access ASC")
+        evicted_keys = []
+        for row in rows:
+            if total <= self.max_bytes:
+                break
+            evicted_keys.append(row['cache_key'])
+            total -= row['size_bytes']
+        conn.executemany("DELETE FROM result_cache WHERE cache_key = ?", [(key,) for key in evicted_keys])
+        conn.execute("UPDATE result_cache_stats SET value = ? WHERE name = 'bytes'", (total,))
+        self._incr(conn, 'evictions', len(evicted_keys))
+
+    def stats(self):
+        """返回命中/未命中/淘汰次数、条目数和总大小"""
+        conn = self._db.connect()
+        stats = {row['name']: row['value'] for row in conn.execute("SELECT name, value FROM result_cache_stats")}
+        stats['entries'] = conn.execute("SELECT COUNT(*) AS count FROM result_cache").fetchone()['count']
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0
+        stats['max_bytes'] = self.max_bytes
+        return stats
@@ -15,6 +15,7 @@ CREATE TABLE IF NOT EXISTS usage_history (
     summary TEXT,
     keywords_and_framework TEXT,
     test_questions TEXT,
+    cache_key TEXT,  -- 对应的结果缓存条目（cache.db 中 result_cache 表）
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id)
 );
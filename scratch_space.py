@@ -0,0 +1,231 @@
+"""
+临时工作目录模块
+
+这个模块为每个任务分配一个独立的临时目录（分段识别写出的片段 WAV 等），目录随任务结束删除：
+- 任务正常完成、出错或被中断时都会删除（上下文管理器的 finally），进程退出时删除仍在使用的目录，
+  启动时删除已经退出的进程留下的目录
+- 任务开始前按预计写入的字节数向全局配额申请空间，配额不足或磁盘剩余空间不足时等待其他任务释放（准入背压），
+  等待超时则任务失败，不会把磁盘写满、影响上传文件的写入
+- 可以配置一个内存文件系统目录（如 /dev/shm），写入量小的任务在内存配额足够时放在这里，不占用磁盘 I/O
+配额按进程统计（PROCESSING_EXECUTOR=process 时每个工作进程各自统计）。
+"""
+
+import os
+import uuid
+import time
+import shutil
+import atexit
+import tempfile
+import threading
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+# 磁盘上的临时目录、全局配额（字节）和需要保留的最小剩余空间（字节）
+SCRATCH_DIR = os.getenv("SCRATCH_DIR") or tempfile.gettempdir()
+SCRATCH_QUOTA_BYTES = int(os.getenv("SCRATCH_QUOTA_BYTES", str(2 * 1024 * 1024 * 1024)))
+SCRATCH_MIN_FREE_BYTES = int(os.getenv("SCRATCH_MIN_FREE_BYTES", str(1024 * 1024 * 1024)))
+# 内存文件系统中的临时目录（留空不使用）和配额（字节）
+SCRATCH_MEMORY_DIR = os.getenv("SCRATCH_MEMORY_DIR", "")
+SCRATCH_MEMORY_QUOTA_BYTES = int(os.getenv("SCRATCH_MEMORY_QUOTA_BYTES", str(256 * 1024 * 1024)))
+# 等待配额的最长时间（秒）
+SCRATCH_ADMISSION_TIMEOUT = float(os.getenv("SCRATCH_ADMISSION_TIMEOUT", "600"))
+
+# 任务目录都放在配置目录下的这个子目录中，清理时不会碰到其他程序的文件
+SCRATCH_SUBDIR = "clipmind-scratch"
+
+
+class ScratchQuotaError(Exception):
+    """等待临时空间超时"""
+
+
+class ScratchPool:
+    def __init__(self, root, quota_bytes, min_free_bytes=0):
+        """
+        一个位置上的临时空间配额
+
+        参数:
+            root (str): 临时目录的根目录
+            quota_bytes (int): 所有任务预留空间的总和上限（字节）
+            min_free_bytes (int): 文件系统需要保留的最小剩余空间（字节）
+        """
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.min_free_bytes = min_free_bytes
+        self.reserved = 0
+        self.active = 0
+        self._condition = threading.Condition()
+
+    def _fits(self, nbytes):
+        # 单个任务的预留超过配额时，在没有其他任务占用空间时放行，避免永远等待
+        if self.reserved and self.reserved + nbytes > self.quota_bytes:
+            return False
+        if self.min_free_bytes and nbytes:
+            os.makedirs(self.root, exist_ok=True)
+            if shutil.disk_usage(self.root).free - nbytes < self.min_free_bytes:
+                return False
+        return True
+
+    def reserve(self, nbytes, timeout=None):
+        """
+        预留空间，空间不足时等待
+
+        参数:
+            nbytes (int): 预留的字节数
+            timeout (float): 最长等待时间（秒），为 0 时不等待，为 None 时一直等待
+
+        返回:
+            bool: 是否预留成功
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while not self._fits(nbytes):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                # 磁盘剩余空间可能被其他进程释放，定期重新检查
+                self._condition.wait(1.0 if remaining is None else min(remaining, 1.0))
+            self.reserved += nbytes
+            self.active += 1
+            return True
+
+    def release(self, nbytes):
+        """释放预留的空间"""
+        with self._condition:
+            self.reserved -= nbytes
+            self.active -= 1
+            self._condition.notify_all()
+
+    def stats(self):
+        return {"root": self.root, "quota_bytes": self.quota_bytes, "reserved_bytes": self.reserved,
+                "active": self.active}
+
+
+class ScratchDir:
+    def __init__(self, path, pool, reserved_bytes):
+        """任务的临时目录（第一次使用时创建）"""
+        self._path = path
+        self.pool = pool
+        self.reserved_bytes = reserved_bytes
+
+    @property
+    def path(self):
+        os.makedirs(self._path, exist_ok=True)
+        return self._path
+
+    def file(self, name):
+        """返回目录中的文件路径"""
+        return os.path.join(self.path, name)
+
+    def usage(self):
+        """目录中文件的总大小（字节）"""
+        total = 0
+        for directory, _, files in os.walk(self._path):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(directory, name))
+                except FileNotFoundError:
+                    pass
+        return total
+
+    def cleanup(self):
+        shutil.rmtree(self._path, ignore_errors=True)
+
+
+disk_pool = ScratchPool(os.path.join(SCRATCH_DIR, SCRATCH_SUBDIR), SCRATCH_QUOTA_BYTES, SCRATCH_MIN_FREE_BYTES)
+memory_pool = (ScratchPool(os.path.join(SCRATCH_MEMORY_DIR, SCRATCH_SUBDIR), SCRATCH_MEMORY_QUOTA_BYTES)
+               if SCRATCH_MEMORY_DIR else None)
+
+_active_dirs = set()
+_active_lock = threading.Lock()
+
+
+@contextmanager
+def job_scratch(job_id, reserve_bytes=0, timeout=SCRATCH_ADMISSION_TIMEOUT):
+    """
+    为任务分配临时目录，退出时（无论成功、出错还是中断）删除目录并释放预留的空间
+
+    参数:
+        job_id (str): 任务ID或用途，用作目录名前缀
+        reserve_bytes (int): 预计写入的最大字节数
+        timeout (float): 等待配额的最长时间（秒）
+
+    返回:
+        ScratchDir: 临时目录
+
+    异常:
+        ScratchQuotaError: 等待配额超时
+    """
+    pool = None
+    # 写入量小的任务优先使用内存文件系统，内存配额不足时不等待，直接使用磁盘
+    if memory_pool is not None and 0 < reserve_bytes <= memory_pool.quota_bytes:
+        if memory_pool.reserve(reserve_bytes, timeout=0):
+            pool = memory_pool
+    if pool is None:
+        if not disk_pool.reserve(reserve_bytes, timeout=timeout):
+            raise ScratchQuotaError(
+                f"临时空间不足：等待 {timeout:g} 秒后仍无法预留 {reserve_bytes / 1024 / 1024:.1f} MB")
+        pool = disk_pool
+
+    # 目录名中带有进程号，启动时据此删除已退出进程留下的目录
+    scratch = ScratchDir(os.path.join(pool.root, f"{job_id}-{os.getpid()}-{uuid.uuid4().hex[:8]}"),
+                         pool, reserve_bytes)
+    with _active_lock:
+        _active_dirs.add(scratch)
+    try:
+        yield scratch
+    finally:
+        scratch.cleanup()
+        with _active_lock:
+            _active_dirs.discard(scratch)
+        pool.release(reserve_bytes)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def sweep_stale():
+    """
+    删除已经退出的进程留下的临时目录
+
+    返回:
+        int: 删除的目录数
+    """
+    removed = 0
+    for pool in filter(None, (disk_pool, memory_pool)):
+        try:
+            names = os.listdir(pool.root)
+        except FileNotFoundError:
+            continue
+        for name in names:
+            parts = name.rsplit("-", 2)
+            if len(parts) != 3 or not parts[1].isdigit():
+                continue
+            pid = int(parts[1])
+            if pid != os.getpid() and not _pid_alive(pid):
+                shutil.rmtree(os.path.join(pool.root, name), ignore_errors=True)
+                removed += 1
+    if removed:
+        print(f"已删除 {removed} 个遗留的临时目录")
+    return removed
+
+
+def stats():
+    """返回磁盘和内存临时空间的预留情况"""
+    return {"disk": disk_pool.stats(), "memory": memory_pool.stats() if memory_pool is not None else None}
+
+
+@atexit.register
+def _cleanup_active():
+    with _active_lock:
+        for scratch in list(_active_dirs):
+            scratch.cleanup()
@@ -0,0 +1,292 @@
+"""
+分段并行语音识别模块
+
+这个模块把长音频按 audio_segmentation 生成的片段列表切分，
+用线程池并发调用任意一个语音识别函数（输入片段的文件路径或 PCM 数据，返回文本），失败的片段单独重试，
+也可以边解码边识别（audio_stream 产生的片段流，同时在内存中的片段数有上限），再按时间顺序拼接结果：相邻片段重叠部分识别出的重复文字会被去掉，每段结果带有起止时间。
+个别片段重试后仍然失败时保留其他片段的文本，失败的时间段在文本中用“[mm:ss-mm:ss 识别失败]”标出，同时返回错误提示。
+"""
+
+import os
+import re
+import time
+import wave
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from audio_segmentation import plan_segments, write_segment
+from scratch_space import job_scratch
+from audio_source import AudioSource
+
+# 识别结果中表示“没有识别到内容”的提示（静音片段），按空文本处理
+EMPTY_RESULT_MARKERS = ('无法识别',)
+# 表示识别失败的提示
+ERROR_RESULT_MARKERS = ('出错', '失败', '未配置', '无法连接', '不支持')
+# 每秒重叠音频最多对应的重复字符数（用于限制去重时的搜索范围）
+OVERLAP_CHARS_PER_SECOND = 8
+# 识别失败的片段在文本中的标记
+FAILED_SEGMENT_PATTERN = re.compile(r"\[\d+:\d{2}-\d+:\d{2} 识别失败\]")
+
+
+def classify_result(text):
+    """判断识别结果是正常文本、空结果还是错误提示"""
+    text = (text or "").strip()
+    if not text or (len(text) < 300 and any(marker in text for marker in EMPTY_RESULT_MARKERS)):
+        return "empty"
+    if len(text) < 300 and any(marker in text for marker in ERROR_RESULT_MARKERS):
+        return "error"
+    return "ok"
+
+
+def _is_cjk(char):
+    return '㐀' <= char <= '鿿' or '豈' <= char <= '﫿'
+
+
+def merge_overlap(previous, current, max_chars):
+    """
+    去掉 current 开头与 previous 结尾重复的部分（相邻片段重叠区域被识别了两次）
+
+    参数:
+        previous (str): 前一段的文本
+        current (str): 当前段的文本
+        max_chars (int): 最多比较的字符数
+
+    返回:
+        str: 去掉重复部分后的当前段文本
+    """
+    # 比较时忽略空白和标点差异
+    def normalize(text):
+        return [(i, c) for i, c in enumerate(text) if c.isalnum()]
+
+    tail = normalize(previous)[-max_chars:]
+    head = normalize(current)[:max_chars]
+    tail_chars = "".join(c for _, c in tail).lower()
+    head_chars = "".join(c for _, c in head).lower()
+    for length in range(min(len(tail_chars), len(head_chars)), 1, -1):
+        if tail_chars[-length:] == head_chars[:length]:
+            cut = head[length - 1][0] + 1
+            return current[cut:].lstrip(" ，,。.、")
+    return current
+
+
+def _format_time(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes:02d}:{seconds:02d}"
+
+
+def failed_segment_marker(start, end):
+    """识别失败的时间段在文本中的标记"""
+    return f"[{_format_time(start)}-{_format_time(end)} 识别失败]"
+
+
+def has_failed_segments(text):
+    """文本中是否有识别失败的片段（这样的文本不完整，不应写入缓存）"""
+    return FAILED_SEGMENT_PATTERN.search(text or "") is not None
+
+
+def join_texts(texts):
+    """拼接各段文本：中文之间直接相连，其他文字之间用空格隔开"""
+    result = ""
+    for text in texts:
+        text = text.strip()
+        if not text:
+            continue
+        if result and not (_is_cjk(result[-1]) or _is_cjk(text[0])):
+            result += " "
+        result += text
+    return result
+
+
+def stitch_segments(segments, texts, overlap_seconds, errors=None):
+    """
+    按时间顺序拼接各片段的识别结果，去掉重叠部分的重复文字
+
+    参数:
+        segments (list): plan_segments 返回的片段列表
+        texts (list): 与片段一一对应的识别文本
+        overlap_seconds (float): 相邻片段的重叠长度（秒）
+        errors (list): 与片段一一对应的错误提示（识别成功的片段为 None），为 None 时都成功
+
+    返回:
+        dict: {"text": 拼接后的文本（失败的时间段为失败标记）,
+               "segments": [{"start", "end", "text", "error"（只有失败的片段有）}, ...],
+               "error": 第一个失败片段的错误提示，都成功时为 None}
+    """
+    stitched = []
+    parts = []
+    max_chars = max(2, int(overlap_seconds * 2 * OVERLAP_CHARS_PER_SECOND))
+    previous = ""
+    for segment, text, error in zip(segments, texts, errors or [None] * len(segments)):
+        item = {"start": round(segment["start"], 3), "end": round(segment["end"], 3), "text": text}
+        if error:
+            item.update(text="", error=error)
+            parts.append(failed_segment_marker(segment["start"], segment["end"]))
+            # 失败片段两边的文本之间没有重复部分
+            previous = ""
+        else:
+            if previous and text and overlap_seconds > 0:
+                item["text"] = merge_overlap(previous, text, max_chars)
+            parts.append(item["text"])
+            if item["text"]:
+                previous = item["text"]
+        stitched.append(item)
+
+    failed = [item["error"] for item in stitched if "error" in item]
+    if len(failed) == len(stitched):
+        # 全部失败时没有可用的文本
+        return {"text": "", "segments": stitched, "error": failed[0]}
+    return {"text": join_texts(parts), "segments": stitched, "error": failed[0] if failed else None}
+
+
+def _recognize_with_retry(segment, recognize, retries):
+    """识别一个片段，失败时重试；返回 (文本, 错误提示)"""
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(attempt)
+        text = recognize(segment)
+        kind = classify_result(text)
+        if kind != "error":
+            return "" if kind == "empty" else text.strip(), None
+        print(f"片段 {segment['index']} 识别失败（第 {attempt + 1} 次）: {text}")
+    return "", text
+
+
+def _run_segments(segments, recognize, max_workers, retries):
+    """并发识别各片段，失败的片段单独重试；返回与片段一一对应的 (文本, 错误提示)"""
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        return list(executor.map(lambda segment: _recognize_with_retry(segment, recognize, retries), segments))
+
+
+def _collect(segments, results, overlap_seconds):
+    """拼接识别结果；有片段失败时保留其他片段的文本，并返回第一个错误提示"""
+    result = stitch_segments(segments, [text for text, _ in results], overlap_seconds,
+                             [error for _, error in results])
+    if result["error"]:
+        failed = sum(1 for item in result["segments"] if "error" in item)
+        print(f"{len(segments)} 个片段中有 {failed} 个识别失败: {result['error']}")
+    return result
+
+
+def transcribe_segments(audio_path, transcribe_fn, segment_seconds, overlap_seconds=1.0, max_workers=4,
+                        retries=1, scratch=None):
+    """
+    分段并行识别音频，每个片段写成一个临时 WAV 文件交给识别函数，识别完立即删除
+
+    参数:
+        audio_path (str): 16 位 PCM WAV 文件路径
+        transcribe_fn (callable): 识别函数，参数为音频文件路径，返回识别的文本
+        segment_seconds (float): 片段主体的最大长度（秒）
+        overlap_seconds (float): 相邻片段的重叠长度（秒）
+        max_workers (int): 同时识别的片段数
+        retries (int): 片段识别失败时的重试次数
+        scratch (ScratchDir): 写片段文件的任务临时目录，为 None 时按同时存在的片段大小申请一个
+
+    返回:
+        dict: {"text": 拼接后的文本（失败的时间段为失败标记，全部失败时为空）,
+               "segments": [{"start", "end", "text", "error"}, ...], "error": 第一个错误提示或 None}
+    """
+    segments = plan_segments(audio_path, segment_seconds, overlap_seconds)
+    print(f"音频切分为 {len(segments)} 个片段，使用 {min(max_workers, len(segments))} 个线程并行识别")
+
+    if scratch is None:
+        with wave.open(audio_path, "rb") as wf:
+            frame_bytes = wf.getsampwidth() * wf.getnchannels()
+        largest = max(segment["end_frame"] - segment["start_frame"] for segment in segments) * frame_bytes
+        context = job_scratch("asr_segments", reserve_bytes=min(max_workers, len(segments)) * largest)
+    else:
+        context = nullcontext(scratch)
+
+    with context as work_dir:
+        def recognize(segment):
+            path = write_segment(audio_path, segment["start_frame"], segment["end_frame"],
+                                 work_dir.file(f"{segment['index']:05d}.wav"))
+            try:
+                return transcribe_fn(path)
+            finally:
+                os.remove(path)
+
+        results = _run_segments(segments, recognize, max_workers, retries)
+    return _collect(segments, results, overlap_seconds)
+
+
+def transcribe_pcm_segments(audio_path, recognize_fn, segment_seconds, overlap_seconds=1.0, max_workers=4,
+                            retries=1):
+    """
+    分段并行识别音频，文件映射到内存，每个片段的 PCM 数据以 memoryview 切片交给识别函数（不复制、不写临时文件）
+
+    参数:
+        audio_path (str): 16 位 PCM WAV 文件路径
+        recognize_fn (callable): 识别函数，参数为 (PCM 数据 memoryview, 采样率)，返回识别的文本
+        segment_seconds (float): 片段主体的最大长度（秒），不超过这个长度的音频不切分
+        overlap_seconds (float): 相邻片段的重叠长度（秒）
+        max_workers (int): 同时识别的片段数
+        retries (int): 片段识别失败时的重试次数
+
+    返回:
+        dict: {"text": 拼接后的文本（失败的时间段为失败标记，全部失败时为空）,
+               "segments": [{"start", "end", "text", "error"}, ...], "error": 第一个错误提示或 None}
+    """
+    with AudioSource(audio_path) as source:
+        rate = source.rate
+        total_frames = source.n_frames
+        if total_frames / rate <= segment_seconds + 2 * overlap_seconds:
+            segments = [{"index": 0, "start_frame": 0, "end_frame": total_frames, "start": 0.0,
+                         "end": total_frames / rate}]
+        else:
+            segments = plan_segments(audio_path, segment_seconds, overlap_seconds)
+            print(f"音频切分为 {len(segments)} 个片段，使用 {min(max_workers, len(segments))} 个线程并行识别")
+
+        def recognize(segment):
+            return recognize_fn(source.frames(segment["start_frame"], segment["end_frame"]), rate)
+
+        results = _run_segments(segments, recognize, max_workers, retries)
+    return _collect(segments, results, overlap_seconds)
+
+
+def transcribe_pcm_stream(segments, recognize_fn, overlap_seconds=1.0, max_workers=4, retries=1, rate=16000):
+    """
+    边解码边识别：片段按时间顺序陆续产生，产生一个就提交识别，不等整个文件解码完
+
+    识别中和排队等待的片段最多 max_workers * 2 个，片段太多时暂停读取下一个片段（背压），
+    片段识别完成后释放它的 PCM 数据，内存占用与音频长度无关。
+
+    参数:
+        segments (iterable): 片段 {"index", "start", "end", "pcm", ...}，例如 audio_stream.stream_segments 的返回值
+        recognize_fn (callable): 识别函数，参数为 (PCM 数据, 采样率)，返回识别的文本
+        overlap_seconds (float): 相邻片段的重叠长度（秒）
+        max_workers (int): 同时识别的片段数
+        retries (int): 片段识别失败时的重试次数
+        rate (int): 采样率
+
+    返回:
+        dict: {"text": 拼接后的文本（失败的时间段为失败标记，全部失败时为空）,
+               "segments": [{"start", "end", "text", "error"}, ...], "error": 第一个错误提示或 None}
+    """
+    slots = threading.Semaphore(max(1, max_workers) * 2)
+    metas = []
+    futures = []
+
+    def recognize(segment, pcm):
+        try:
+            return _recognize_with_retry(segment, lambda _: recognize_fn(pcm, rate), retries)
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        try:
+            for segment in segments:
+                pcm = segment.pop("pcm")
+                metas.append(segment)
+                slots.acquire()
+                futures.append(executor.submit(recognize, segment, pcm))
+                del pcm
+        except BaseException:
+            # 解码失败时不再识别还没开始的片段
+            for future in futures:
+                future.cancel()
+            raise
+        results = [future.result() for future in futures]
+
+    if len(metas) > 1:
+        print(f"音频流切分为 {len(metas)} 个片段，使用 {min(max_workers, len(metas))} 个线程边解码边识别")
+    return _collect(metas, results, overlap_seconds)
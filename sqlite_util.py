@@ -0,0 +1,67 @@
+"""
+SQLite 连接模块
+
+任务存储、结果缓存、DeepSeek 响应缓存和中间产物索引共用的 SQLite 连接管理：
+- 每个线程一个连接，进程 fork 后重新连接（连接不能跨进程使用）
+- WAL 模式，读写互不阻塞，多个 Web 工作进程可以同时访问；写锁最多等待 SQLITE_BUSY_TIMEOUT 秒
+- immediate() 开始的事务立即获取写锁，读取-修改-写入在多个进程之间是原子的
+- 配置中的相对路径按项目目录解析，不受启动时工作目录的影响
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# 项目目录，配置中的相对路径以这里为基准
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# 等待写锁的最长时间（秒）
+SQLITE_BUSY_TIMEOUT = 30
+
+
+def resolve_path(path):
+    """把配置中的相对路径解析为项目目录下的绝对路径"""
+    return os.path.join(BASE_DIR, os.path.expanduser(path))
+
+
+class SQLiteDatabase:
+    def __init__(self, path, timeout=SQLITE_BUSY_TIMEOUT):
+        """
+        一个 SQLite 数据库文件的连接管理（第一次使用时连接）
+
+        参数:
+            path (str): 数据库路径，相对路径按项目目录解析
+            timeout (float): 等待写锁的最长时间（秒）
+        """
+        self.path = resolve_path(path)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def connect(self):
+        """获取当前线程的数据库连接（进程 fork 后重新连接）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def immediate(self):
+        """
+        写事务：BEGIN IMMEDIATE 立即获取写锁，正常退出时提交，出错时回滚
+
+        返回:
+            sqlite3.Connection: 当前线程的数据库连接
+        """
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
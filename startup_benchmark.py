@@ -0,0 +1,126 @@
+"""
+启动耗时测试脚本
+
+这个脚本在新的 Python 进程中（与工作进程冷启动相同）导入 Web 应用模块，用 -X importtime 记录每个模块的导入耗时，
+并测量导入之后处理第一个请求的耗时（包括数据库初始化），多次运行后报告中位数和按顶层包汇总的导入耗时。
+每次运行的数据库、上传目录和各类存储都放在临时目录中，运行结束后删除，不会在项目目录中留下文件。
+
+用法: python startup_benchmark.py [模块名] [运行次数] [显示的模块数]
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import statistics
+import subprocess
+
+# 子进程中执行的代码：导入应用模块，把用户数据库和上传目录指向临时目录，再用测试客户端请求一次登录页面
+CHILD_CODE = """
+import json, os, sys, time
+start = time.perf_counter()
+module = __import__(sys.argv[1])
+imported = time.perf_counter()
+first_request = None
+app = getattr(module, "app", None)
+if app is not None:
+    if hasattr(module, "DB_PATH"):
+        module.DB_PATH = os.path.join(sys.argv[2], "users.db")
+    if hasattr(module, "UPLOAD_FOLDER"):
+        module.UPLOAD_FOLDER = os.path.join(sys.argv[2], "uploads")
+    with app.test_client() as client:
+        client.get("/login")
+    first_request = time.perf_counter() - imported
+print("STARTUP_BENCHMARK " + json.dumps({"import": imported - start, "first_request": first_request}))
+"""
+
+
+def parse_importtime(stderr):
+    """
+    解析 -X importtime 的输出
+
+    参数:
+        stderr (str): 子进程的标准错误输出
+
+    返回:
+        list: [(模块名, 自身耗时秒, 累计耗时秒, 嵌套层级)]
+    """
+    records = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        records.append((name.strip(), int(parts[0]) / 1e6, int(parts[1]) / 1e6, depth))
+    return records
+
+
+def run_once(module_name):
+    """在新进程中导入模块一次，返回 (进程总耗时, 导入耗时, 第一个请求耗时, 导入记录)"""
+    with tempfile.TemporaryDirectory(prefix="startup-benchmark-") as data_dir:
+        # 环境变量优先于 .env，各类存储都写入临时目录
+        env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1",
+                   TASK_STORE_PATH=os.path.join(data_dir, "tasks.db"),
+                   RESULT_CACHE_PATH=os.path.join(data_dir, "cache.db"),
+                   LLM_CACHE_PATH=os.path.join(data_dir, "cache.db"),
+                   ARTIFACT_STORE_DIR=os.path.join(data_dir, "artifacts"),
+                   SCRATCH_DIR=os.path.join(data_dir, "scratch"))
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, "-X", "importtime", "-c", CHILD_CODE, module_name, data_dir],
+                                   capture_output=True, text=True, env=env,
+                                   cwd=os.path.dirname(os.path.abspath(__file__)))
+        wall = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(f"导入 {module_name} 失败:\n{completed.stderr[-2000:]}")
+
+    timings = None
+    for line in completed.stdout.splitlines():
+        if line.startswith("STARTUP_BENCHMARK "):
+            timings = json.loads(line[len("STARTUP_BENCHMARK "):])
+    return wall, timings["import"], timings["first_request"], parse_importtime(completed.stderr)
+
+
+def summarize(records, top):
+    """返回按顶层包汇总的自身耗时，以及累计耗时最长的直接导入模块"""
+    packages = {}
+    for name, self_time, _, _ in records:
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0.0) + self_time
+    direct = [(name, cumulative) for name, _, cumulative, depth in records if depth == 1]
+    return (sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top],
+            sorted(direct, key=lambda item: item[1], reverse=True)[:top])
+
+
+def main():
+    module_name = sys.argv[1] if len(sys.argv) > 1 else "audio_video_summarizer"
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    top = int(sys.argv[3]) if len(sys.argv) > 3 else 15
+
+    results = [run_once(module_name) for _ in range(runs)]
+    walls = [result[0] for result in results]
+    imports = [result[1] for result in results]
+    first_requests = [result[2] for result in results if result[2] is not None]
+
+    print(f"=== {module_name} 冷启动耗时（{runs} 次运行的中位数）===")
+    print(f"进程启动到退出: {statistics.median(walls) * 1000:.0f} ms")
+    print(f"导入应用模块: {statistics.median(imports) * 1000:.0f} ms")
+    if first_requests:
+        print(f"第一个请求（含数据库初始化）: {statistics.median(first_requests) * 1000:.0f} ms")
+
+    # 导入明细取导入耗时为中位数的一次运行
+    median_run = sorted(results, key=lambda result: result[1])[len(results) // 2]
+    packages, direct = summarize(median_run[3], top)
+    print("\n按顶层包汇总（自身耗时）:")
+    for package, seconds in packages:
+        print(f"  {seconds * 1000:8.1f} ms  {package}")
+    print("\n顶层导入的模块（累计耗时）:")
+    for name, seconds in direct:
+        print(f"  {seconds * 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
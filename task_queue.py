@@ -0,0 +1,147 @@
+"""
+后台任务执行模块
+
+这个模块提供了一个后台任务执行器，用于把耗时的音视频处理流程（解码、语音识别、
+DeepSeek 分析、写数据库）从 HTTP 请求线程中移出，交给固定数量的工作线程或工作进程执行。
+"""
+
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+# 后台任务执行器配置
+# PROCESSING_EXECUTOR 可选值: thread, process
+PROCESSING_EXECUTOR = os.getenv("PROCESSING_EXECUTOR", "thread").lower()
+PROCESSING_WORKERS = int(os.getenv("PROCESSING_WORKERS", "2"))
+
+# 当前工作线程/进程中任务状态更新的发送方式，由执行器在启动工作线程/进程时设置
+_worker = threading.local()
+
+
+class _QueueChannel:
+    def __init__(self, update_queue):
+        """工作进程中的状态更新通道：把更新放入队列，由主进程中的监听线程写入"""
+        self.update_queue = update_queue
+
+    def __call__(self, task_id, fields):
+        self.update_queue.put((task_id, fields))
+
+
+def _init_worker(channel):
+    """工作线程/进程初始化：记录这个执行器的状态更新通道"""
+    _worker.channel = channel
+
+
+def publish_update(task_id, fields):
+    """
+    发布任务状态更新
+
+    工作线程中直接交给执行器的处理函数；工作进程中通过队列转发回主进程。
+    不在执行器的工作线程/进程中调用时忽略。
+
+    参数:
+        task_id (str): 任务ID
+        fields (dict): 需要更新的字段
+    """
+    channel = getattr(_worker, "channel", None)
+    if channel is not None:
+        channel(task_id, fields)
+
+
+class JobExecutor:
+    def __init__(self, max_workers=PROCESSING_WORKERS, mode=PROCESSING_EXECUTOR, on_update=None):
+        """
+        创建后台任务执行器
+
+        参数:
+            max_workers (int): 工作线程/进程数量
+            mode (str): 执行方式，thread 或 process
+            on_update (callable): 任务状态更新处理函数，签名为 on_update(task_id, fields)
+
+        异常:
+            RuntimeError: 在工作进程中创建执行器
+        """
+        # 工作进程（spawn/forkserver 方式会重新导入应用）中不能再创建执行器，否则每个工作进程各有一套进程池
+        if multiprocessing.parent_process() is not None:
+            raise RuntimeError("后台任务执行器只能在主进程中创建")
+
+        self.max_workers = max(1, max_workers)
+        self.mode = mode
+        self._on_update = on_update
+        self._pending = 0
+        self._lock = threading.Lock()
+
+        if mode == "process":
+            # 工作进程的进度更新通过队列转发，由主进程中的监听线程统一写入
+            self._queue = multiprocessing.Queue()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_worker,
+                initargs=(_QueueChannel(self._queue),)
+            )
+            threading.Thread(target=self._drain_updates, daemon=True).start()
+        else:
+            self._queue = None
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="clipmind-job",
+                initializer=_init_worker,
+                initargs=(on_update,)
+            )
+
+    def _drain_updates(self):
+        """监听工作进程转发的进度更新"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            task_id, fields = item
+            if self._on_update is not None:
+                try:
+                    self._on_update(task_id, fields)
+                except Exception as e:
+                    print(f"写入任务状态失败: {e}")
+
+    def submit(self, task_id, fn, *args, on_done=None, **kwargs):
+        """
+        提交任务
+
+        参数:
+            task_id (str): 任务ID
+            fn (callable): 任务函数（进程模式下必须是模块级函数）
+            on_done (callable): 任务结束回调，签名为 on_done(task_id, result, error)
+
+        返回:
+            Future: 任务的 Future 对象
+        """
+        with self._lock:
+            self._pending += 1
+
+        future = self._executor.submit(fn, *args, **kwargs)
+
+        def _callback(f):
+            with self._lock:
+                self._pending -= 1
+            if on_done is None:
+                return
+            error = f.exception()
+            on_done(task_id, None if error else f.result(), error)
+
+        future.add_done_callback(_callback)
+        return future
+
+    def pending_count(self):
+        """返回排队中和执行中的任务数量"""
+        with self._lock:
+            return self._pending
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+        if self._queue is not None:
+            # 通知监听线程退出
+            self._queue.put(None)
@@ -0,0 +1,301 @@
+"""
+任务状态存储模块
+
+这个模块提供了处理任务状态（进度、消息、结果）的存储后端，默认使用 SQLite WAL 模式，
+多个 Web 工作进程可以共享同一份任务状态，服务重启后也不会丢失。
+已完成或出错的任务在超过保留时间后会被自动清理。
+
+可以通过 TASK_STORE_BACKEND 选择后端：
+    sqlite            - SQLite 存储（默认）
+    memory            - 进程内存储，仅适用于单进程部署
+    模块名:类名        - 自定义存储类，需要实现 TaskStore 的接口
+"""
+
+import os
+import json
+import time
+import threading
+import importlib
+from collections import OrderedDict
+from dotenv import load_dotenv
+from sqlite_util import SQLiteDatabase
+
+# 加载环境变量
+load_dotenv()
+
+TASK_STORE_BACKEND = os.getenv("TASK_STORE_BACKEND", "sqlite")
+# 相对路径按项目目录解析
+TASK_STORE_PATH = os.getenv("TASK_STORE_PATH", "tasks.db")
+# 已完成/出错任务的保留时间（秒）
+TASK_TTL_SECONDS = int(os.getenv("TASK_TTL_SECONDS", "86400"))
+# 两次过期清理之间的最小间隔（秒）
+TASK_EVICT_INTERVAL = int(os.getenv("TASK_EVICT_INTERVAL", "60"))
+
+# 任务的结束状态，结束后不再接受中间进度更新
+FINISHED_STATUSES = ('completed', 'error')
+
+# 单独存列的字段，其余字段以 JSON 形式保存
+TASK_COLUMNS = ('status', 'progress', 'message', 'user_id')
+
+
+class TaskStore:
+    """
+    任务状态存储接口
+
+    任务状态是一个字典，至少包含 status、progress、message 三个字段。
+    每次更新都会让任务的版本号加一，用于判断任务状态是否发生了变化。
+    """
+
+    def __init__(self, ttl=TASK_TTL_SECONDS, evict_interval=TASK_EVICT_INTERVAL):
+        self.ttl = ttl
+        self.evict_interval = evict_interval
+        self._last_evict = 0
+
+    def create(self, task_id, fields):
+        """创建任务"""
+        raise NotImplementedError
+
+    def update(self, task_id, fields):
+        """
+        原子地合并更新任务状态
+
+        已结束的任务只接受包含 status 的更新。
+
+        返回:
+            bool: 是否更新成功
+        """
+        raise NotImplementedError
+
+    def get(self, task_id):
+        """获取任务状态，不存在时返回 None"""
+        raise NotImplementedError
+
+    def get_versions(self, task_ids):
+        """
+        批量获取任务的版本号
+
+        返回:
+            dict: {task_id: 版本号}，不存在的任务不包含在结果中
+        """
+        raise NotImplementedError
+
+    def set_result(self, task_id, result):
+        """保存任务结果"""
+        raise NotImplementedError
+
+    def get_result(self, task_id):
+        """获取任务结果，不存在时返回 None"""
+        raise NotImplementedError
+
+    def evict_expired(self, now=None):
+        """
+        清理超过保留时间的已结束任务
+
+        返回:
+            int: 清理的任务数量
+        """
+        raise NotImplementedError
+
+    def maybe_evict(self):
+        """按固定间隔触发过期清理，避免每次写入都扫描"""
+        now = time.time()
+        if now - self._last_evict < self.evict_interval:
+            return 0
+        self._last_evict = now
+        return self.evict_expired(now)
+
+
+class MemoryTaskStore(TaskStore):
+    """进程内任务存储，仅适用于单进程部署"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._lock = threading.Lock()
+        self._tasks = {}
+        self._results = {}
+        self._versions = {}
+        # 按结束时间排序的已结束任务，用于按顺序清理
+        self._finished = OrderedDict()
+
+    def create(self, task_id, fields):
+        with self._lock:
+            self._tasks[task_id] = dict(fields)
+            self._versions[task_id] = 0
+        self.maybe_evict()
+
+    def update(self, task_id, fields):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return False
+            if task.get('status') in FINISHED_STATUSES and 'status' not in fields:
+                return False
+            task.update(fields)
+            self._versions[task_id] += 1
+            if task.get('status') in FINISHED_STATUSES:
+                self._finished.pop(task_id, None)
+                self._finished[task_id] = time.time()
+            return True
+
+    def get(self, task_id):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            return dict(task) if task is not None else None
+
+    def get_versions(self, task_ids):
+        with self._lock:
+            return {task_id: self._versions[task_id] for task_id in task_ids if task_id in self._versions}
+
+    def set_result(self, task_id, result):
+        with self._lock:
+            self._results[task_id] = result
+
+    def get_result(self, task_id):
+        with self._lock:
+            return self._results.get(task_id)
+
+    def evict_expired(self, now=None):
+        deadline = (now or time.time()) - self.ttl
+        evicted = 0
+        with self._lock:
+            while self._finished:
+                task_id, finished_at = next(iter(self._finished.items()))
+                if finished_at > deadline:
+                    break
+                self._finished.popitem(last=False)
+                self._tasks.pop(task_id, None)
+                self._results.pop(task_id, None)
+                self._versions.pop(task_id, None)
+                evicted += 1
+        return evicted
+
+
+class SQLiteTaskStore(TaskStore):
+    """SQLite WAL 任务存储，可在多个进程之间共享"""
+
+    def __init__(self, path=TASK_STORE_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self._db = SQLiteDatabase(path)
+        self.path = self._db.path
+        self._init_schema()
+
+    def _init_schema(self):
+        conn = self._db.connect()
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS tasks (
+            task_id TEXT PRIMARY KEY,
+            user_id INTEGER,
+            status TEXT NOT NULL,
+            progress INTEGER NOT NULL DEFAULT 0,
+            message TEXT,
+            extra TEXT,
+            result TEXT,
+            version INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            finished_at REAL
+        )
+        ''')
+        # 兼容没有 version 列的旧数据库
+        columns = [row['name'] for row in conn.execute("PRAGMA table_info(tasks)")]
+        if 'version' not in columns:
+            conn.execute("ALTER TABLE tasks ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        # 只为已结束的任务建立索引，清理时按结束时间范围删除
+        conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tasks_finished_at
+        ON tasks(finished_at) WHERE finished_at IS NOT NULL
+        ''')
+
+    @staticmethod
+    def _row_to_task(row):
+        task = json.loads(row['extra']) if row['extra'] else {}
+        for column in TASK_COLUMNS:
+            task[column] = row[column]
+        return task
+
+    def create(self, task_id, fields):
+        now = time.time()
+        extra = {k: v for k, v in fields.items() if k not in TASK_COLUMNS}
+        self._db.connect().execute('''
+        INSERT OR REPLACE INTO tasks
+        (task_id, user_id, status, progress, message, extra, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (task_id, fields.get('user_id'), fields.get('status', 'queued'), fields.get('progress', 0),
+              fields.get('message', ''), json.dumps(extra, ensure_ascii=False), now, now))
+        self.maybe_evict()
+
+    def update(self, task_id, fields):
+        # 立即获取写锁，保证读取-合并-写入在多个进程之间是原子的
+        with self._db.immediate() as conn:
+            row = conn.execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+            if row is None or (row['status'] in FINISHED_STATUSES and 'status' not in fields):
+                return False
+
+            task = self._row_to_task(row)
+            task.update(fields)
+            extra = {k: v for k, v in task.items() if k not in TASK_COLUMNS}
+            now = time.time()
+            finished_at = now if task['status'] in FINISHED_STATUSES else None
+
+            conn.execute('''
+            UPDATE tasks
+            SET user_id = ?, status = ?, progress = ?, message = ?, extra = ?, updated_at = ?, finished_at = ?,
+                version = version + 1
+            WHERE task_id = ?
+            ''', (task['user_id'], task['status'], task['progress'], task['message'],
+                  json.dumps(extra, ensure_ascii=False), now, finished_at, task_id))
+            return True
+
+    def get(self, task_id):
+        row = self._db.connect().execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return self._row_to_task(row) if row is not None else None
+
+    def get_versions(self, task_ids):
+        task_ids = list(task_ids)
+        versions = {}
+        # 分批查询，避免超过 SQLite 的参数数量限制
+        for i in range(0, len(task_ids), 500):
+            batch = task_ids[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._db.connect().execute(
+                f"SELECT task_id, version FROM tasks WHERE task_id IN ({placeholders})", batch)
+            versions.update((row['task_id'], row['version']) for row in rows)
+        return versions
+
+    def set_result(self, task_id, result):
+        self._db.connect().execute("UPDATE tasks SET result = ? WHERE task_id = ?",
+                                (json.dumps(result, ensure_ascii=False), task_id))
+
+    def get_result(self, task_id):
+        row = self._db.connect().execute("SELECT result FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        if row is None or row['result'] is None:
+            return None
+        return json.loads(row['result'])
+
+    def evict_expired(self, now=None):
+        deadline = (now or time.time()) - self.ttl
+        cursor = self._db.connect().execute(
+            "DELETE FROM tasks WHERE finished_at IS NOT NULL AND finished_at < ?", (deadline,))
+        return cursor.rowcount
+
+
+def create_task_store(backend=TASK_STORE_BACKEND):
+    """
+    根据配置创建任务存储
+
+    参数:
+        backend (str): sqlite、memory 或 "模块名:类名"
+
+    返回:
+        TaskStore: 任务存储实例
+    """
+    if backend == "sqlite":
+        return SQLiteTaskStore()
+    if backend == "memory":
+        return MemoryTaskStore()
+
+    module_name, _, class_name = backend.partition(":")
+    if not class_name:
+        raise ValueError(f"无法识别的任务存储后端: {backend}")
+    store_class = getattr(importlib.import_module(module_name), class_name)
+    return store_class()
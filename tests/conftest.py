@@ -0,0 +1,88 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import deepseek_client
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    """使用临时目录中的数据库和上传目录、进程内任务存储的 Web 应用"""
+    import audio_video_summarizer as m
+    from task_store import MemoryTaskStore
+
+    monkeypatch.setattr(m, "DB_PATH", str(tmp_path / "users.db"))
+    monkeypatch.setattr(m, "UPLOAD_FOLDER", str(tmp_path / "uploads"))
+    monkeypatch.setattr(m, "create_task_store", MemoryTaskStore)
+    monkeypatch.setattr(m, "_runtime", {})
+    monkeypatch.setattr(m, "_db_initialized", False)
+    yield m
+    executor = m._runtime.get("job_executor")
+    if executor is not None:
+        executor.shutdown()
+    broadcaster = m._runtime.get("progress_broadcaster")
+    if broadcaster is not None:
+        broadcaster.stop()
+
+
+@pytest.fixture
+def client(app_module):
+    """已登录（用户ID为 1）的测试客户端"""
+    app_module.app.config["TESTING"] = True
+    with app_module.app.test_client() as client:
+        with client.session_transaction() as session:
+            session["user_id"] = 1
+        yield client
+
+
+class _FakeDeepSeek(BaseHTTPRequestHandler):
+    """按 server.responses 中的顺序返回 (状态码, 响应体, 响应头) 的假接口"""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with self.server.lock:
+            self.server.requests.append(body)
+            status, payload, headers = self.server.responses.pop(0) if self.server.responses else (200, None, {})
+        if payload is None:
+            payload = _reply(f"回复{len(self.server.requests)}")
+        if body.get("stream"):
+            self.send_response(status)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for part in payload:
+                self.wfile.write(f"data: {json.dumps(part, ensure_ascii=False)}\n\n".encode())
+            self.wfile.write(b"data: [DONE]\n\n")
+            return
+        data = json.dumps(payload, ensure_ascii=False).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def _reply(text):
+    return {"choices": [{"message": {"role": "assistant", "content": text}}]}
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """本地的假 DeepSeek 接口，重试等待时间缩短为 10 毫秒"""
+    monkeypatch.setattr(deepseek_client, "DEEPSEEK_BACKOFF_BASE", 0.01)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _FakeDeepSeek)
+    httpd.lock = threading.Lock()
+    httpd.requests = []
+    httpd.responses = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}/v1/chat/completions"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
@@ -0,0 +1,130 @@
+import os
+import threading
+
+import pytest
+
+from artifact_store import ArtifactStore, artifact_key, INDEX_NAME, TEMP_DIR
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ArtifactStore(str(tmp_path / "artifacts"), max_bytes=1000)
+
+
+def _files(root):
+    return sorted(os.path.relpath(os.path.join(directory, name), root)
+                  for directory, _, files in os.walk(root) for name in files
+                  if not name.startswith(INDEX_NAME))
+
+
+def test_key_depends_on_params():
+    assert artifact_key("h", "audio", rate=16000) == artifact_key("h", "audio", rate=16000)
+    assert artifact_key("h", "audio", rate=16000) != artifact_key("h", "audio", rate=8000)
+    assert artifact_key("h", "audio") != artifact_key("h", "transcript")
+
+
+def test_put_and_get(store):
+    key = artifact_key("h", "transcript")
+    assert store.get_text(key) is None
+    path = store.put_text(key, "识别结果", source_hash="h", kind="transcript")
+    assert os.path.basename(path) == key + ".txt"
+    assert store.get_text(key) == "识别结果"
+    assert store.get(key)["source_hash"] == "h"
+    stats = store.stats()
+    assert (stats["entries"], stats["bytes"], stats["hits"], stats["misses"]) == (1, len("识别结果".encode()), 2, 1)
+
+
+def test_writer_is_atomic(store):
+    key = artifact_key("h", "audio")
+    with store.writer(key, ".wav") as temp_path:
+        with open(temp_path, 'wb') as f:
+            f.write(b"partial")
+        # 提交前读不到
+        assert store.get(key) is None
+        assert os.path.dirname(temp_path) == os.path.join(store.root, TEMP_DIR)
+    assert open(store.get(key)["path"], 'rb').read() == b"partial"
+
+
+def test_writer_discards_on_error(store):
+    key = artifact_key("h", "audio")
+    with pytest.raises(RuntimeError):
+        with store.writer(key, ".wav") as temp_path:
+            with open(temp_path, 'wb') as f:
+                f.write(b"partial")
+            raise RuntimeError("ffmpeg failed")
+    assert store.get(key) is None
+    assert _files(store.root) == []
+
+
+def test_writer_without_output_does_not_commit(store):
+    key = artifact_key("h", "audio")
+    with store.writer(key, ".wav"):
+        pass
+    assert store.get(key) is None
+    assert store.stats()["entries"] == 0
+
+
+def test_eviction_keeps_recent_and_new(store):
+    keys = [artifact_key(str(i), "transcript") for i in range(4)]
+    for key in keys[:3]:
+        store.put_text(key, "x" * 300)
+    store.get(keys[0])  # 最近使用过，不应被淘汰
+    store.put_text(keys[3], "x" * 300)
+    assert store.get(keys[1]) is None
+    assert store.get_text(keys[0]) and store.get_text(keys[2]) and store.get_text(keys[3])
+    stats = store.stats()
+    assert stats["evictions"] == 1
+    assert stats["bytes"] == 900
+
+
+def test_overwrite_updates_size(store):
+    key = artifact_key("h", "transcript")
+    store.put_text(key, "x" * 100)
+    store.put_text(key, "x" * 10)
+    assert store.stats()["bytes"] == 10
+    assert store.stats()["entries"] == 1
+
+
+def test_index_rebuilt_when_empty(store):
+    keys = [artifact_key(str(i), "transcript") for i in range(2)]
+    for key in keys:
+        store.put_text(key, "abc")
+    # 临时文件目录中的文件不是产物
+    open(os.path.join(store.temp_dir, "pending.txt"), 'w').close()
+    os.remove(os.path.join(store.root, INDEX_NAME))
+
+    reopened = ArtifactStore(store.root, max_bytes=1000)
+    assert reopened.stats()["entries"] == 2
+    assert reopened.stats()["bytes"] == 6
+    assert reopened.get_text(keys[1]) == "abc"
+
+
+def test_startup_sweeps_only_temp_dir(store, monkeypatch):
+    store.put_text(artifact_key("h", "transcript"), "abc")
+    stale = os.path.join(store.temp_dir, "old.wav")
+    fresh = os.path.join(store.temp_dir, "writing.wav")
+    open(stale, 'w').close()
+    open(fresh, 'w').close()
+    os.utime(stale, (0, 0))
+
+    # 索引不为空时不遍历整个存储目录
+    monkeypatch.setattr(ArtifactStore, "_scan", lambda self: pytest.fail("不应遍历存储目录"))
+    reopened = ArtifactStore(store.root, max_bytes=1000)
+    assert not os.path.exists(stale)
+    assert os.path.exists(fresh)
+    assert reopened.stats()["entries"] == 1
+
+
+def test_concurrent_writes_stay_within_budget(store):
+    def write(i):
+        store.put_text(artifact_key(str(i), "transcript"), "x" * 100)
+
+    threads = [threading.Thread(target=write, args=(i,)) for i in range(30)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = store.stats()
+    assert stats["bytes"] <= 1000
+    assert stats["entries"] == 10
+    assert len([name for name in _files(store.root) if name.endswith(".txt")]) == 10
@@ -0,0 +1,89 @@
+import io
+import json
+import base64
+import wave
+import struct
+
+import pytest
+
+from audio_source import AudioSource, AudioSourceError, Base64JSONBody, BASE64_PLACEHOLDER, MemoryMeter
+
+
+def _write_wav(path, n_frames, rate=16000, channels=1, sampwidth=2):
+    with wave.open(str(path), 'wb') as f:
+        f.setnchannels(channels)
+        f.setsampwidth(sampwidth)
+        f.setframerate(rate)
+        f.writeframes(bytes(range(256)) * (n_frames * channels * sampwidth // 256)
+                      + b"\x00" * (n_frames * channels * sampwidth % 256))
+
+
+@pytest.mark.parametrize("size", [0, 1, 2, 3, 4, 5, 100, 3 * 1024 + 1])
+def test_base64_body_length_matches_bytes(size):
+    data = bytes(i % 251 for i in range(size))
+    body = Base64JSONBody({"format": "pcm", "speech": BASE64_PLACEHOLDER, "len": size, "名称": "测试"},
+                          data, chunk_bytes=10)
+    content = body.read()
+    assert len(body) == len(content)
+    decoded = json.loads(content)
+    assert base64.b64decode(decoded["speech"]) == data
+    assert decoded["名称"] == "测试"
+    assert body.read() == b""
+
+
+def test_base64_body_reads_in_small_pieces():
+    data = b"abcdefghij" * 50
+    body = Base64JSONBody({"speech": BASE64_PLACEHOLDER}, memoryview(data), chunk_bytes=7)
+    out = io.BytesIO()
+    while True:
+        piece = body.read(13)
+        if not piece:
+            break
+        assert len(piece) <= 13
+        out.write(piece)
+    assert len(out.getvalue()) == len(body)
+    assert base64.b64decode(json.loads(out.getvalue())["speech"]) == data
+
+
+def test_base64_body_requires_one_placeholder():
+    with pytest.raises(ValueError):
+        Base64JSONBody({"speech": "x"}, b"data")
+
+
+def test_audio_source_frames_and_chunks(tmp_path):
+    path = tmp_path / "a.wav"
+    _write_wav(path, 1600)
+    with AudioSource(str(path)) as source:
+        assert (source.rate, source.channels, source.n_frames) == (16000, 1, 1600)
+        assert source.duration == pytest.approx(0.1)
+        assert len(source.frames(100, 200)) == 200
+        chunks = list(source.chunks(1001))
+        assert all(len(chunk) % source.frame_bytes == 0 for chunk in chunks)
+        assert sum(len(chunk) for chunk in chunks) == 3200
+
+
+def test_audio_source_rejects_non_16bit(tmp_path):
+    path = tmp_path / "a.wav"
+    _write_wav(path, 1600, sampwidth=1)
+    with pytest.raises(AudioSourceError):
+        AudioSource(str(path))
+
+
+def test_audio_source_rejects_other_files(tmp_path):
+    empty = tmp_path / "empty.wav"
+    empty.write_bytes(b"")
+    with pytest.raises(AudioSourceError):
+        AudioSource(str(empty))
+    text = tmp_path / "a.txt"
+    text.write_bytes(b"not a wav file at all")
+    with pytest.raises(AudioSourceError):
+        AudioSource(str(text))
+
+
+def test_memory_meter_marks_overlapping_jobs():
+    with MemoryMeter() as first:
+        with MemoryMeter() as second:
+            pass
+    assert first.result()["shared"] and second.result()["shared"]
+    assert second.result()["method"] == "peak_growth"
+    assert set(first.result()) == {"peak_mb", "start_mb", "delta_mb", "method", "shared"}
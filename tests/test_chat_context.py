@@ -0,0 +1,99 @@
+from chat_context import build_chat_prompt, build_history_summary_messages, CHAT_TRUNCATED_MESSAGE_CHARS
+
+
+def test_null_content_in_history():
+    history = [{"role": "user", "content": None}, {"role": "assistant"}] * 20
+    prompt, stats = build_chat_prompt("原文", "摘要", "问题", history, "这段内容讲了什么？")
+    assert prompt.endswith("用户: 这段内容讲了什么？\n助手: ")
+    assert stats["recent_messages"] + stats["truncated_messages"] + stats["dropped_messages"] == len(history)
+
+
+def test_current_message_not_repeated():
+    history = [{"role": "user", "content": "你好"}]
+    prompt, stats = build_chat_prompt("原文", "", "", history, "你好")
+    assert prompt.count("你好") == 1
+    assert stats["recent_messages"] == 0
+
+
+def test_older_messages_are_truncated():
+    long_message = "很长的回答" * 100
+    history = [{"role": "assistant", "content": long_message}] + [
+        {"role": "user", "content": f"问题{i}"} for i in range(30)]
+    prompt, stats = build_chat_prompt("原文", "", "", history, "新问题")
+    assert stats["truncated_messages"] > 0
+    assert long_message not in prompt
+    assert long_message[:CHAT_TRUNCATED_MESSAGE_CHARS] + "……" in prompt
+
+
+def test_transcript_respects_budget():
+    transcript = "。".join(f"第{i}句讲的是和主题无关的内容" for i in range(3000))
+    prompt, stats = build_chat_prompt(transcript, "摘要", "问题", [], "问题", budget=2000)
+    assert stats["transcript_chunks"] < stats["transcript_total_chunks"]
+    assert stats["prompt_tokens"] <= 2000
+
+
+def _history(n):
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": f"第{i}条消息"} for i in range(n)]
+
+
+class _Summarizer:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, previous, messages):
+        self.calls.append((previous, [m["content"] for m in messages]))
+        return f"摘要{len(self.calls)}"
+
+
+def test_older_messages_fold_into_rolling_summary():
+    summarize = _Summarizer()
+    # 20 条历史：最近 6 条原样保留，更早的 14 条中前 12 条分两组合并进摘要，剩下 2 条截断保留
+    prompt, stats = build_chat_prompt("原文", "", "", _history(20), "新问题", summarize=summarize)
+    assert summarize.calls == [("", [f"第{i}条消息" for i in range(6)]),
+                               ("摘要1", [f"第{i}条消息" for i in range(6, 12)])]
+    assert "更早的聊天记录摘要：\n摘要2\n" in prompt
+    assert "第12条消息" in prompt and "第11条消息" not in prompt
+    assert (stats["summarized_messages"], stats["truncated_messages"], stats["recent_messages"]) == (12, 2, 6)
+    assert stats["dropped_messages"] == 0
+
+
+def test_summary_groups_are_stable_as_history_grows():
+    first, second = _Summarizer(), _Summarizer()
+    build_chat_prompt("原文", "", "", _history(20), "问题", summarize=first)
+    build_chat_prompt("原文", "", "", _history(22), "问题", summarize=second)
+    # 前两组的请求内容不变（由响应缓存直接返回），只多出新的一组
+    assert second.calls[:2] == first.calls
+    assert len(second.calls) == 2
+
+
+def test_summary_failure_falls_back_to_truncation():
+    def summarize(previous, messages):
+        raise RuntimeError("接口不可用")
+
+    prompt, stats = build_chat_prompt("原文", "", "", _history(20), "新问题", summarize=summarize)
+    assert stats["summarized_messages"] == 0
+    assert stats["truncated_messages"] == 14
+    assert "更早的聊天记录摘要" not in prompt
+
+
+def test_history_summary_messages():
+    messages = build_history_summary_messages("旧摘要", [{"role": "user", "content": "问题"},
+                                                      {"role": "assistant", "content": None}])
+    assert messages[0]["role"] == "system"
+    assert messages[1]["content"] == "已有的对话摘要：\n旧摘要\n\n新的对话：\n用户: 问题\n助手: \n"
+
+
+def test_chat_endpoint_summarizes_older_turns(server, client, app_module, tmp_path, monkeypatch):
+    from deepseek_client import DeepSeekClient
+    from llm_cache import LLMCache
+
+    deepseek = DeepSeekClient(api_url=server.url, api_key="k", cache=LLMCache(str(tmp_path / "cache.db")))
+    monkeypatch.setattr(app_module, "get_client", lambda: deepseek)
+    body = {"message": "新问题", "context": {"original_text": "原文"}, "chat_history": _history(12),
+            "no_cache": True}
+    assert client.post("/chat", json=body).status_code == 200
+    assert client.post("/chat", json=dict(body, message="另一个问题")).status_code == 200
+    # 第一次：一次摘要 + 一次回复；第二次摘要命中缓存，只请求回复
+    assert len(server.requests) == 3
+    assert server.requests[0]["temperature"] == 0
+    assert "更早的聊天记录摘要：\n回复1" in server.requests[1]["messages"][1]["content"]
@@ -0,0 +1,150 @@
+import io
+import os
+import time
+import hashlib
+import threading
+
+import pytest
+
+from chunked_upload import ChunkedUploads, UploadError
+
+
+@pytest.fixture
+def uploads(tmp_path):
+    manager = ChunkedUploads(str(tmp_path / "partial"), max_bytes=1024, ttl=3600, sweep_interval=0)
+    yield manager
+    manager.stop()
+
+
+def _write(uploads, upload_id, offset, data, user_id=1):
+    return uploads.write(upload_id, user_id, offset, io.BytesIO(data), len(data))
+
+
+def test_upload_in_chunks(uploads, tmp_path):
+    data = b"0123456789" * 10
+    state = uploads.create(1, "a.wav", len(data), hashlib.sha256(data).hexdigest())
+    upload_id = state["upload_id"]
+    assert _write(uploads, upload_id, 0, data[:40])["offset"] == 40
+    assert uploads.status(upload_id, 1)["offset"] == 40
+    assert _write(uploads, upload_id, 40, data[40:])["offset"] == 100
+
+    destination = str(tmp_path / "done.wav")
+    meta, path, media_hash = uploads.complete(upload_id, 1, "task-1", lambda meta: destination)
+    assert path == destination
+    assert open(path, 'rb').read() == data
+    assert media_hash == hashlib.sha256(data).hexdigest()
+    assert uploads.status(upload_id, 1)["task_id"] == "task-1"
+    assert upload_id not in uploads._locks and upload_id not in uploads._hashers
+
+    with pytest.raises(UploadError) as error:
+        uploads.complete(upload_id, 1, "task-2", lambda meta: destination)
+    assert error.value.status == 409
+    assert error.value.details == {"task_id": "task-1"}
+
+
+def test_offset_conflict_returns_received_bytes(uploads):
+    upload_id = uploads.create(1, "a.wav", 100)["upload_id"]
+    _write(uploads, upload_id, 0, b"x" * 30)
+    with pytest.raises(UploadError) as error:
+        _write(uploads, upload_id, 10, b"y" * 10)
+    assert error.value.status == 409
+    assert error.value.details == {"offset": 30}
+
+
+def test_hash_resumes_after_restart(uploads, tmp_path):
+    data = bytes(range(200))
+    upload_id = uploads.create(1, "a.wav", len(data), hashlib.sha256(data).hexdigest())["upload_id"]
+    _write(uploads, upload_id, 0, data[:120])
+
+    # 其他工作进程继续上传：内存中没有增量哈希状态
+    other = ChunkedUploads(uploads.directory, max_bytes=1024, sweep_interval=0)
+    _write(other, upload_id, 120, data[120:])
+    _, _, media_hash = other.complete(upload_id, 1, "task-1", lambda meta: str(tmp_path / "done.wav"))
+    assert media_hash == hashlib.sha256(data).hexdigest()
+
+
+class _SlowStream(io.BytesIO):
+    """每次读取都等待一会儿，让并发的写入请求重叠"""
+
+    def read(self, size=-1):
+        time.sleep(0.05)
+        return super().read(min(size, 10))
+
+
+def test_concurrent_writes_from_two_processes(uploads, tmp_path):
+    # 两个工作进程同时收到同一偏移量的同一块：只有一个能写入，另一个按新的偏移量返回冲突
+    data = bytes(range(100))
+    upload_id = uploads.create(1, "a.wav", len(data), hashlib.sha256(data).hexdigest())["upload_id"]
+    other = ChunkedUploads(uploads.directory, max_bytes=1024, sweep_interval=0)
+    results = []
+
+    def put(manager):
+        try:
+            results.append(manager.write(upload_id, 1, 0, _SlowStream(data[:50]), 50)["offset"])
+        except UploadError as e:
+            results.append((e.status, e.details))
+
+    threads = [threading.Thread(target=put, args=(manager,)) for manager in (uploads, other)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(results, key=str) == sorted([50, (409, {"offset": 50})], key=str)
+
+    # 另一个进程写入后，本进程的增量哈希状态不再可用，需要从文件重新计算
+    _write(other, upload_id, 50, data[50:])
+    _, _, media_hash = uploads.complete(upload_id, 1, "task-1", lambda meta: str(tmp_path / "done.wav"))
+    assert media_hash == hashlib.sha256(data).hexdigest()
+
+
+def test_write_after_complete_in_other_process(uploads, tmp_path):
+    upload_id = uploads.create(1, "a.wav", 4)["upload_id"]
+    _write(uploads, upload_id, 0, b"data")
+    other = ChunkedUploads(uploads.directory, max_bytes=1024, sweep_interval=0)
+    other.complete(upload_id, 1, "task-1", lambda meta: str(tmp_path / "done.wav"))
+    with pytest.raises(UploadError) as error:
+        _write(uploads, upload_id, 4, b"more")
+    assert error.value.status == 409
+    assert open(tmp_path / "done.wav", 'rb').read() == b"data"
+
+
+def test_hash_mismatch_discards_upload(uploads, tmp_path):
+    upload_id = uploads.create(1, "a.wav", 4, "0" * 64)["upload_id"]
+    _write(uploads, upload_id, 0, b"data")
+    with pytest.raises(UploadError) as error:
+        uploads.complete(upload_id, 1, "task-1", lambda meta: str(tmp_path / "done.wav"))
+    assert error.value.status == 422
+    assert os.listdir(uploads.directory) == []
+
+
+def test_incomplete_and_oversized(uploads, tmp_path):
+    with pytest.raises(UploadError) as error:
+        uploads.create(1, "big.wav", 2048)
+    assert error.value.status == 413
+
+    upload_id = uploads.create(1, "a.wav", 10)["upload_id"]
+    with pytest.raises(UploadError) as error:
+        _write(uploads, upload_id, 0, b"x" * 11)
+    assert error.value.status == 400
+    _write(uploads, upload_id, 0, b"x" * 5)
+    with pytest.raises(UploadError) as error:
+        uploads.complete(upload_id, 1, "task-1", lambda meta: str(tmp_path / "done.wav"))
+    assert error.value.status == 409
+    assert error.value.details == {"offset": 5}
+
+
+def test_other_user_and_bad_id(uploads):
+    upload_id = uploads.create(1, "a.wav", 10)["upload_id"]
+    for args in ((upload_id, 2), ("../etc/passwd", 1), ("", 1)):
+        with pytest.raises(UploadError) as error:
+            uploads.status(*args)
+        assert error.value.status == 404
+
+
+def test_sweep_removes_expired_sessions(uploads):
+    old = uploads.create(1, "old.wav", 10)["upload_id"]
+    new = uploads.create(1, "new.wav", 10)["upload_id"]
+    expired = time.time() - uploads.ttl - 10
+    os.utime(os.path.join(uploads.directory, old + ".json"), (expired, expired))
+    assert uploads.sweep() == 1
+    assert sorted(os.listdir(uploads.directory)) == sorted([new + ".json", new + ".part"])
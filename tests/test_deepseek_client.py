@@ -0,0 +1,92 @@
+import threading
+
+import pytest
+import requests
+
+import deepseek_client
+from deepseek_client import DeepSeekClient
+
+
+def _client(server, **kwargs):
+    return DeepSeekClient(api_url=server.url, api_key="test-key", **kwargs)
+
+
+def test_complete(server):
+    text = _client(server).complete([{"role": "user", "content": "你好"}], temperature=0.3, max_tokens=50)
+    assert text == "回复1"
+    assert server.requests[0]["temperature"] == 0.3
+    assert server.requests[0]["max_tokens"] == 50
+    assert server.requests[0]["messages"] == [{"role": "user", "content": "你好"}]
+
+
+def test_retries_on_server_errors(server):
+    server.responses = [(503, {"error": "busy"}, {}), (429, {"error": "slow down"}, {"Retry-After": "0"})]
+    assert _client(server, max_retries=3).complete([{"role": "user", "content": "你好"}]) == "回复3"
+    assert len(server.requests) == 3
+
+
+def test_gives_up_after_max_retries(server):
+    server.responses = [(500, {"error": "down"}, {})] * 3
+    with pytest.raises(requests.HTTPError):
+        _client(server, max_retries=1).complete([{"role": "user", "content": "你好"}])
+    assert len(server.requests) == 2
+
+
+def test_client_errors_are_not_retried(server):
+    server.responses = [(400, {"error": "bad request"}, {})]
+    with pytest.raises(requests.HTTPError):
+        _client(server).complete([{"role": "user", "content": "你好"}])
+    assert len(server.requests) == 1
+
+
+def test_connection_error_is_retried(server):
+    client = DeepSeekClient(api_url="http://127.0.0.1:9/v1/chat/completions", api_key="k", max_retries=1,
+                            connect_timeout=0.5)
+    with pytest.raises(requests.ConnectionError):
+        client.complete([{"role": "user", "content": "你好"}])
+
+
+def test_stream_completion(server):
+    chunks = [{"choices": [{"delta": {"role": "assistant"}}]},
+              {"choices": [{"delta": {"content": "你"}}]},
+              {"choices": []},
+              {"choices": [{"delta": {"content": "好"}}]}]
+    server.responses = [(200, chunks, {})]
+    parts = list(_client(server).stream_completion([{"role": "user", "content": "你好"}]))
+    assert parts == ["你", "好"]
+    assert server.requests[0]["stream"] is True
+
+
+def test_inflight_limit(server):
+    client = _client(server, max_inflight=2)
+    active = []
+    peak = []
+    original_post = client._post
+
+    def counting_post(payload, stream=False):
+        active.append(1)
+        peak.append(len(active))
+        try:
+            return original_post(payload, stream)
+        finally:
+            active.pop()
+
+    client._post = counting_post
+    threads = [threading.Thread(target=client.complete, args=([{"role": "user", "content": str(i)}],))
+               for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(server.requests) == 8
+    assert max(peak) <= 2
+
+
+def test_backoff_uses_retry_after():
+    client = DeepSeekClient(api_url="http://127.0.0.1:9", api_key="k")
+
+    class Response:
+        headers = {"Retry-After": "7"}
+
+    assert client._backoff(0, Response()) == 7
+    assert 0 <= client._backoff(2) <= deepseek_client.DEEPSEEK_BACKOFF_BASE * 4
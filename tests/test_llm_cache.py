@@ -0,0 +1,111 @@
+import time
+import threading
+
+import pytest
+
+import audio_video_summarizer
+from deepseek_client import DeepSeekClient
+from llm_cache import LLMCache, make_prompt_key
+
+MESSAGES = [{"role": "system", "content": "助手"}, {"role": "user", "content": "总结这段内容"}]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return LLMCache(str(tmp_path / "cache.db"), ttl=60, max_bytes=10 ** 6, memory_entries=2)
+
+
+def test_prompt_key_normalization():
+    key = make_prompt_key("m", MESSAGES, 0.7, 100)
+    padded = [{"role": "system", "content": " 助手\n"}, {"role": "user", "content": "总结这段内容 "}]
+    assert make_prompt_key("m", padded, 0.7, 100) == key
+    assert make_prompt_key("m", MESSAGES, 0.3, 100) != key
+    assert make_prompt_key("m", MESSAGES, 0.7, 200) != key
+    assert make_prompt_key("m", MESSAGES, 0.7, 100, response_format={"type": "json_object"}) != key
+    assert make_prompt_key("m", [{"role": "user", "content": None}], 0, 1)
+
+
+def test_memory_and_disk_hits(cache, tmp_path):
+    cache.put("k", {"choices": []})
+    assert cache.get("k") == {"choices": []}
+    # 其他进程（新的实例）从 SQLite 读到
+    other = LLMCache(cache.path, ttl=60)
+    assert other.get("k") == {"choices": []}
+    assert other.get("missing") is None
+    assert cache.stats()["memory_hits"] == 1
+    assert (other.stats()["disk_hits"], other.stats()["misses"]) == (1, 1)
+
+
+def test_expired_entries_are_misses(cache):
+    cache.ttl = 0.05
+    cache.put("k", {"v": 1})
+    time.sleep(0.1)
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_evicts_to_size_limit(tmp_path):
+    cache = LLMCache(str(tmp_path / "cache.db"), ttl=60, max_bytes=300, memory_entries=0)
+    for i in range(5):
+        cache.put(f"k{i}", {"text": "x" * 100})
+    assert cache.stats()["bytes"] <= 300
+    assert cache.get("k4") is not None
+    assert cache.get("k0") is None
+
+
+def test_counters_are_thread_safe(cache):
+    cache.put("k", {"v": 1})
+
+    def lookup():
+        for _ in range(200):
+            cache.get("k")
+
+    threads = [threading.Thread(target=lookup) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.stats()["memory_hits"] == 1600
+
+
+def test_client_caches_only_cacheable_calls(server, cache):
+    client = DeepSeekClient(api_url=server.url, api_key="k", cache=cache)
+    assert client.complete(MESSAGES, temperature=0.7, cacheable=True) == "回复1"
+    assert client.complete(MESSAGES, temperature=0.7, cacheable=True) == "回复1"
+    assert client.complete(MESSAGES, temperature=0.7) == "回复2"
+    assert client.complete(MESSAGES, temperature=0) == "回复3"
+    assert client.complete(MESSAGES, temperature=0) == "回复3"
+    assert client.complete(MESSAGES, temperature=0, cacheable=False) == "回复4"
+    assert len(server.requests) == 4
+
+
+def test_stream_completion_uses_cache(server, cache):
+    client = DeepSeekClient(api_url=server.url, api_key="k", cache=cache)
+    server.responses = [(200, [{"choices": [{"delta": {"content": "你"}}]},
+                               {"choices": [{"delta": {"content": "好"}}]}], {})]
+    assert list(client.stream_completion(MESSAGES, cacheable=True)) == ["你", "好"]
+    assert list(client.stream_completion(MESSAGES, cacheable=True)) == ["你好"]
+    assert len(server.requests) == 1
+
+
+def test_analysis_calls_are_cached(server, cache, monkeypatch):
+    client = DeepSeekClient(api_url=server.url, api_key="k", cache=cache)
+    monkeypatch.setattr(audio_video_summarizer, "get_client", lambda: client)
+    m = audio_video_summarizer
+    for _ in range(2):
+        summary = m.summarize_with_deepseek("转录文本")
+        keywords = m.generate_keywords_and_framework("转录文本", summary)
+        questions = m.generate_test_questions("转录文本", summary, keywords)
+    assert (summary, keywords, questions) == ("回复1", "回复2", "回复3")
+    assert len(server.requests) == 3
+
+
+def test_chat_reply_cached_unless_no_cache(server, cache, client, app_module, monkeypatch):
+    deepseek = DeepSeekClient(api_url=server.url, api_key="k", cache=cache)
+    monkeypatch.setattr(app_module, "get_client", lambda: deepseek)
+    body = {"message": "这段内容讲了什么？", "context": {"original_text": "原文", "summary": "摘要"}}
+
+    assert client.post("/chat", json=body).get_json()["response"] == "回复1"
+    assert client.post("/chat", json=body).get_json()["response"] == "回复1"
+    assert client.post("/chat", json=dict(body, no_cache=True)).get_json()["response"] == "回复2"
+    assert len(server.requests) == 2
@@ -0,0 +1,81 @@
+import os
+import io
+import time
+
+
+def _wait_finished(client, task_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        progress = client.get(f"/progress/{task_id}").get_json()
+        if progress["status"] in ("completed", "error"):
+            return progress
+        time.sleep(0.02)
+    raise AssertionError(f"任务没有结束: {progress}")
+
+
+def _fake_job(app_module, seen):
+    def run_processing_job(task_id, user_id, filename, file_path, media_hash):
+        seen.append((user_id, filename, open(file_path, 'rb').read(), media_hash))
+        app_module.update_task(task_id, status='processing', stage='asr', progress=40, message='正在识别...')
+        return {"original_text": "识别结果", "summary": "摘要"}
+    return run_processing_job
+
+
+def test_upload_progress_result(app_module, client, monkeypatch):
+    seen = []
+    monkeypatch.setattr(app_module, "run_processing_job", _fake_job(app_module, seen))
+
+    response = client.post("/upload", data={"file": (io.BytesIO(b"media"), "lecture.mp3")},
+                           content_type="multipart/form-data")
+    assert response.status_code == 200
+    task_id = response.get_json()["task_id"]
+
+    progress = _wait_finished(client, task_id)
+    assert progress["status"] == "completed"
+    assert progress["progress"] == 100
+    assert client.get(f"/result/{task_id}").get_json() == {"original_text": "识别结果", "summary": "摘要"}
+
+    user_id, filename, content, media_hash = seen[0]
+    assert (user_id, filename, content) == (1, "lecture.mp3", b"media")
+    assert len(media_hash) == 64
+    # 任务结束后删除上传的文件
+    assert not any(name.startswith(task_id) for name in os.listdir(app_module.UPLOAD_FOLDER))
+
+
+def test_failed_job_marks_task_as_error(app_module, client, monkeypatch):
+    def run_processing_job(*args):
+        raise RuntimeError("识别服务不可用")
+    monkeypatch.setattr(app_module, "run_processing_job", run_processing_job)
+
+    task_id = client.post("/upload", data={"file": (io.BytesIO(b"media"), "a.wav")},
+                          content_type="multipart/form-data").get_json()["task_id"]
+    progress = _wait_finished(client, task_id)
+    assert progress["status"] == "error"
+    assert "识别服务不可用" in progress["message"]
+    response = client.get(f"/result/{task_id}")
+    assert response.status_code == 500
+
+
+def test_other_users_cannot_see_task(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, "run_processing_job", _fake_job(app_module, []))
+    task_id = client.post("/upload", data={"file": (io.BytesIO(b"media"), "a.wav")},
+                          content_type="multipart/form-data").get_json()["task_id"]
+    _wait_finished(client, task_id)
+    with client.session_transaction() as session:
+        session["user_id"] = 2
+    assert client.get(f"/progress/{task_id}").status_code == 404
+    assert client.get(f"/result/{task_id}").status_code == 404
+
+
+def test_upload_rejects_unsupported_type(client):
+    response = client.post("/upload", data={"file": (io.BytesIO(b"x"), "a.exe")},
+                           content_type="multipart/form-data")
+    assert response.status_code == 400
+
+
+def test_asr_backend_choice_logged_once(app_module, monkeypatch, caplog):
+    monkeypatch.setattr(app_module, "_selected_asr_backend", None)
+    with caplog.at_level("INFO", logger=app_module.app.logger.name):
+        first = app_module.select_asr_backend()
+        assert app_module.select_asr_backend() is first
+    assert [record.getMessage() for record in caplog.records] == [f"使用{first.label}语音识别服务"]
@@ -0,0 +1,206 @@
+import json
+import socket
+import time
+from functools import partial
+from urllib.parse import urlsplit
+
+import pytest
+
+from progress_stream import ProgressBroadcaster, task_snapshot
+from task_store import MemoryTaskStore
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def store():
+    return MemoryTaskStore()
+
+
+@pytest.fixture
+def broadcaster(store):
+    b = ProgressBroadcaster(store, "secret", interval=0.02, heartbeat=0.3, max_streams=2,
+                            host="127.0.0.1", port=_free_port())
+    assert b.start()
+    yield b
+    b.stop()
+
+
+class _Client:
+    """读取推送连接的原始 HTTP 响应"""
+
+    def __init__(self, port, path):
+        self.sock = socket.create_connection(("127.0.0.1", port), timeout=5)
+        self.sock.sendall(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+        self.buffer = b""
+
+    def _read_until(self, marker):
+        while marker not in self.buffer:
+            data = self.sock.recv(4096)
+            if not data:
+                raise EOFError(self.buffer)
+            self.buffer += data
+        head, self.buffer = self.buffer.split(marker, 1)
+        return head.decode()
+
+    def status(self):
+        return int(self._read_until(b"\r\n\r\n").split(" ", 2)[1])
+
+    def next_block(self):
+        return self._read_until(b"\n\n")
+
+    def next_event(self):
+        block = self.next_block()
+        assert block.startswith("data: "), block
+        return json.loads(block[len("data: "):])
+
+    def closed(self):
+        return self.sock.recv(4096) == b""
+
+    def close(self):
+        self.sock.close()
+
+
+def _open(broadcaster, task_id, token=None):
+    token = token if token is not None else broadcaster.stream_token(task_id)
+    return _Client(broadcaster.listening_port, f"/progress/{task_id}/stream?token={token}")
+
+
+def test_snapshot_includes_eta():
+    snapshot = task_snapshot({"status": "processing", "progress": 50, "started_at": time.time() - 10})
+    assert 9 <= snapshot["eta"] <= 11
+
+
+def test_pushes_initial_state_and_changes(broadcaster, store):
+    store.create("t1", {"status": "processing", "progress": 10, "message": "开始"})
+    client = _open(broadcaster, "t1")
+    try:
+        assert client.status() == 200
+        assert client.next_event()["progress"] == 10
+
+        store.update("t1", {"progress": 40, "message": "识别中", "partial": {"transcript": "第一段"}})
+        event = client.next_event()
+        assert (event["progress"], event["partial"]) == (40, {"transcript": "第一段"})
+
+        # 已经推送过的阶段性结果不再重复推送
+        store.update("t1", {"progress": 80})
+        assert "partial" not in client.next_event()
+
+        store.update("t1", {"status": "completed", "progress": 100})
+        assert client.next_event()["status"] == "completed"
+        assert client.closed()
+    finally:
+        client.close()
+
+
+def test_heartbeat_does_not_resend_eta_only_changes(broadcaster, store):
+    # 只有预计剩余时间随时钟变化、任务本身没有变化时只发送心跳注释
+    store.create("t1", {"status": "processing", "progress": 50, "message": "", "started_at": time.time() - 5})
+    client = _open(broadcaster, "t1")
+    try:
+        client.status()
+        client.next_event()
+        store.update("t1", {"message": ""})  # 版本号变化但内容不变
+        assert client.next_block() == ": keepalive"
+        assert client.next_block() == ": keepalive"
+    finally:
+        client.close()
+
+
+def test_missing_task_is_reported_and_closed(broadcaster):
+    client = _open(broadcaster, "missing")
+    try:
+        assert client.status() == 200
+        assert client.next_event()["status"] == "unknown"
+        assert client.closed()
+    finally:
+        client.close()
+
+
+@pytest.mark.parametrize("path", ["/progress/t1/stream?token=bad", "/progress/t1/stream", "/progress/t2/stream?token={}"])
+def test_rejects_invalid_token(broadcaster, store, path):
+    store.create("t1", {"status": "processing", "progress": 0, "message": ""})
+    # 其他任务的签名不能用于这个任务
+    client = _Client(broadcaster.listening_port, path.format(broadcaster.stream_token("t1")))
+    try:
+        assert client.status() == 403
+    finally:
+        client.close()
+
+
+def test_expired_token_is_rejected(store):
+    b = ProgressBroadcaster(store, "secret", host="127.0.0.1", port=1, token_max_age=-1)
+    assert not b.verify_token("t1", b.stream_token("t1"))
+    assert ProgressBroadcaster(store, "secret", port=1).verify_token("t1", b.stream_token("t1"))
+    assert not ProgressBroadcaster(store, "other", port=1).verify_token("t1", b.stream_token("t1"))
+
+
+def test_limits_open_streams(broadcaster, store):
+    store.create("t1", {"status": "processing", "progress": 0, "message": ""})
+    clients = [_open(broadcaster, "t1") for _ in range(2)]
+    try:
+        for client in clients:
+            assert client.status() == 200
+            client.next_event()
+        extra = _open(broadcaster, "t1")
+        assert extra.status() == 503
+        extra.close()
+
+        # 连接关闭后名额释放
+        clients.pop().close()
+        deadline = time.monotonic() + 5
+        while True:
+            extra = _open(broadcaster, "t1")
+            status = extra.status()
+            extra.close()
+            if status == 200 or time.monotonic() > deadline:
+                break
+            time.sleep(0.02)
+        assert status == 200
+    finally:
+        for client in clients:
+            client.close()
+
+
+def test_stream_url(store):
+    b = ProgressBroadcaster(store, "secret", port=5003)
+    url = urlsplit(b.stream_url("t1", "example.com:5002", "http"))
+    assert (url.scheme, url.netloc, url.path) == ("http", "example.com:5003", "/progress/t1/stream")
+    assert b.verify_token("t1", url.query.split("token=", 1)[1])
+
+    b = ProgressBroadcaster(store, "secret", port=5003, public_url="https://example.com/sse/")
+    assert b.stream_url("t1", "ignored", "http").startswith("https://example.com/sse/progress/t1/stream?token=")
+
+
+def test_disabled_when_port_is_zero(store):
+    assert not ProgressBroadcaster(store, "secret", port=0).start()
+
+
+def test_subscribe_checks_owner(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, "ProgressBroadcaster",
+                        partial(ProgressBroadcaster, interval=0.02, host="127.0.0.1", port=_free_port()))
+    store = app_module.get_task_store()
+    store.create("mine", {"status": "processing", "progress": 30, "message": "", "user_id": 1})
+    store.create("other", {"status": "processing", "progress": 30, "message": "", "user_id": 2})
+
+    assert client.get("/progress/other/subscribe").status_code == 404
+    response = client.get("/progress/mine/subscribe")
+    assert response.status_code == 200
+
+    url = urlsplit(response.get_json()["url"])
+    stream = _Client(url.port, f"{url.path}?{url.query}")
+    try:
+        assert stream.status() == 200
+        assert stream.next_event()["progress"] == 30
+    finally:
+        stream.close()
+
+
+def test_subscribe_unavailable(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, "ProgressBroadcaster", partial(ProgressBroadcaster, port=0))
+    app_module.get_task_store().create("mine", {"status": "processing", "progress": 0, "message": "", "user_id": 1})
+    assert client.get("/progress/mine/subscribe").status_code == 503
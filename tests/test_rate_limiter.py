@@ -0,0 +1,27 @@
+import time
+
+from rate_limiter import RateLimiter, get_limiter
+
+
+def test_burst_does_not_wait():
+    limiter = RateLimiter(qps=10, burst=3)
+    assert [limiter.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+
+
+def test_waits_when_bucket_is_empty():
+    limiter = RateLimiter(qps=20, burst=1)
+    limiter.acquire()
+    start = time.monotonic()
+    waited = limiter.acquire()
+    assert waited > 0
+    assert time.monotonic() - start >= 0.04
+
+
+def test_unlimited():
+    limiter = RateLimiter(qps=0)
+    assert all(limiter.acquire() == 0.0 for _ in range(100))
+
+
+def test_shared_per_provider():
+    assert get_limiter("test-provider", 5) is get_limiter("test-provider", 50)
+    assert get_limiter("test-provider", 5).qps == 5
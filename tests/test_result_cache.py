@@ -0,0 +1,59 @@
+import io
+import hashlib
+
+import pytest
+
+from result_cache import ResultCache, hash_file, save_stream_with_hash, make_cache_key
+
+
+def _result(text):
+    return {"original_text": text, "summary": "摘要", "keywords_and_framework": "关键词", "test_questions": "问题"}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(str(tmp_path / "cache.db"), max_bytes=10 ** 6)
+
+
+def test_save_stream_with_hash(tmp_path):
+    data = bytes(range(256)) * 5000
+    path = tmp_path / "upload.bin"
+    media_hash, size = save_stream_with_hash(io.BytesIO(data), str(path), chunk_size=4096)
+    assert size == len(data)
+    assert path.read_bytes() == data
+    assert media_hash == hashlib.sha256(data).hexdigest() == hash_file(str(path))
+
+
+def test_cache_key_depends_on_every_part():
+    base = make_cache_key("h", "baidu", "deepseek-chat", "2")
+    assert base == make_cache_key("h", "baidu", "deepseek-chat", "2")
+    assert len({base, make_cache_key("h2", "baidu", "deepseek-chat", "2"),
+                make_cache_key("h", "whisper", "deepseek-chat", "2"),
+                make_cache_key("h", "baidu", "other", "2"),
+                make_cache_key("h", "baidu", "deepseek-chat", "3")}) == 5
+
+
+def test_put_and_get(cache):
+    assert cache.get("k") is None
+    cache.put("k", "h", "baidu", "deepseek-chat", "2", dict(_result("原文"), extra="不保存"))
+    assert cache.get("k") == _result("原文")
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    assert stats["hit_rate"] == 0.5
+
+
+def test_overwrite_updates_size(cache):
+    cache.put("k", "h", "baidu", "m", "2", _result("x" * 100))
+    cache.put("k", "h", "baidu", "m", "2", _result("x"))
+    assert cache.stats()["bytes"] == len("x摘要关键词问题".encode())
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.db"), max_bytes=250)
+    for key in ("a", "b"):
+        cache.put(key, "h", "baidu", "m", "2", _result("x" * 100))
+    cache.get("a")
+    cache.put("c", "h", "baidu", "m", "2", _result("x" * 100))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,81 @@
+import os
+import threading
+
+import pytest
+
+import scratch_space
+from scratch_space import ScratchPool, ScratchQuotaError, job_scratch
+
+
+def test_reserve_within_quota(tmp_path):
+    pool = ScratchPool(str(tmp_path), quota_bytes=100)
+    assert pool.reserve(60, timeout=0)
+    assert pool.reserve(40, timeout=0)
+    assert not pool.reserve(1, timeout=0)
+    pool.release(60)
+    assert pool.reserve(50, timeout=0)
+    assert pool.stats()["reserved_bytes"] == 90
+    assert pool.stats()["active"] == 2
+
+
+def test_oversized_reservation_admitted_when_idle(tmp_path):
+    pool = ScratchPool(str(tmp_path), quota_bytes=100)
+    assert pool.reserve(500, timeout=0)
+    assert not pool.reserve(10, timeout=0)
+
+
+def test_reserve_times_out(tmp_path):
+    pool = ScratchPool(str(tmp_path), quota_bytes=100)
+    pool.reserve(100)
+    assert not pool.reserve(10, timeout=0.05)
+
+
+def test_reserve_waits_for_release(tmp_path):
+    pool = ScratchPool(str(tmp_path), quota_bytes=100)
+    pool.reserve(100)
+    timer = threading.Timer(0.05, pool.release, args=(100,))
+    timer.start()
+    assert pool.reserve(10, timeout=5)
+    timer.join()
+
+
+def test_min_free_space(tmp_path):
+    pool = ScratchPool(str(tmp_path), quota_bytes=10 ** 18, min_free_bytes=10 ** 18)
+    assert not pool.reserve(1, timeout=0)
+    assert pool.reserve(0, timeout=0)
+
+
+def test_job_scratch_cleans_up(tmp_path, monkeypatch):
+    pool = ScratchPool(str(tmp_path), quota_bytes=100)
+    monkeypatch.setattr(scratch_space, "disk_pool", pool)
+    monkeypatch.setattr(scratch_space, "memory_pool", None)
+    with pytest.raises(RuntimeError):
+        with job_scratch("job", reserve_bytes=50) as scratch:
+            with open(scratch.file("a.wav"), 'wb') as f:
+                f.write(b"x" * 10)
+            assert scratch.usage() == 10
+            assert pool.reserved == 50
+            raise RuntimeError("interrupted")
+    assert os.listdir(str(tmp_path)) == []
+    assert pool.reserved == 0
+
+
+def test_job_scratch_quota_error(tmp_path, monkeypatch):
+    pool = ScratchPool(str(tmp_path), quota_bytes=100)
+    monkeypatch.setattr(scratch_space, "disk_pool", pool)
+    monkeypatch.setattr(scratch_space, "memory_pool", None)
+    pool.reserve(100)
+    with pytest.raises(ScratchQuotaError):
+        with job_scratch("job", reserve_bytes=10, timeout=0.05):
+            pass
+
+
+def test_job_scratch_prefers_memory_pool(tmp_path, monkeypatch):
+    disk = ScratchPool(str(tmp_path / "disk"), quota_bytes=1000)
+    memory = ScratchPool(str(tmp_path / "memory"), quota_bytes=100)
+    monkeypatch.setattr(scratch_space, "disk_pool", disk)
+    monkeypatch.setattr(scratch_space, "memory_pool", memory)
+    with job_scratch("small", reserve_bytes=50) as scratch:
+        assert scratch.pool is memory
+        with job_scratch("second", reserve_bytes=60) as other:
+            assert other.pool is disk
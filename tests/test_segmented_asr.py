@@ -0,0 +1,66 @@
+from segmented_asr import (merge_overlap, stitch_segments, join_texts, classify_result,
+                           failed_segment_marker, has_failed_segments)
+
+
+def _segments(*bounds):
+    return [{"index": i, "start": start, "end": end} for i, (start, end) in enumerate(bounds)]
+
+
+def test_merge_overlap_removes_repeated_head():
+    assert merge_overlap("今天我们来讲一下机器学习", "机器学习的基本概念", 10) == "的基本概念"
+
+
+def test_merge_overlap_ignores_punctuation_and_case():
+    assert merge_overlap("We talk about Machine Learning.", "machine learning, and more", 20) == "and more"
+
+
+def test_merge_overlap_keeps_text_without_overlap():
+    assert merge_overlap("第一段内容", "完全不同的开头", 10) == "完全不同的开头"
+
+
+def test_join_texts_spacing():
+    assert join_texts(["你好", "世界"]) == "你好世界"
+    assert join_texts(["hello", " world ", ""]) == "hello world"
+
+
+def test_classify_result():
+    assert classify_result("") == "empty"
+    assert classify_result("百度语音识别无法识别音频内容") == "empty"
+    assert classify_result("百度语音识别出错: timeout") == "error"
+    assert classify_result("正常的识别文本") == "ok"
+
+
+def test_stitch_segments_dedupes_overlap():
+    result = stitch_segments(_segments((0, 30), (29, 60)), ["今天我们来讲机器学习", "机器学习的基本概念"], 1.0)
+    assert result["text"] == "今天我们来讲机器学习的基本概念"
+    assert result["error"] is None
+    assert [item["text"] for item in result["segments"]] == ["今天我们来讲机器学习", "的基本概念"]
+
+
+def test_stitch_segments_marks_failed_segment():
+    result = stitch_segments(_segments((0, 30), (30, 60), (60, 95)), ["第一段", "", "第三段"], 0,
+                             errors=[None, "识别出错: timeout", None])
+    assert result["text"] == "第一段" + failed_segment_marker(30, 60) + "第三段"
+    assert failed_segment_marker(30, 60) == "[00:30-01:00 识别失败]"
+    assert has_failed_segments(result["text"])
+    assert result["error"] == "识别出错: timeout"
+    assert result["segments"][1] == {"start": 30, "end": 60, "text": "", "error": "识别出错: timeout"}
+    assert "error" not in result["segments"][0]
+
+
+def test_stitch_segments_does_not_merge_across_failure():
+    result = stitch_segments(_segments((0, 30), (29, 60), (59, 90)), ["机器学习", "", "机器学习"], 1.0,
+                             errors=[None, "出错", None])
+    assert result["segments"][2]["text"] == "机器学习"
+
+
+def test_stitch_segments_all_failed():
+    result = stitch_segments(_segments((0, 30), (30, 60)), ["", ""], 0, errors=["出错 1", "出错 2"])
+    assert result["text"] == ""
+    assert result["error"] == "出错 1"
+    assert not has_failed_segments(result["text"])
+
+
+def test_has_failed_segments_on_plain_text():
+    assert not has_failed_segments("普通文本 [注释]")
+    assert not has_failed_segments(None)
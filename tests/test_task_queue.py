@@ -0,0 +1,95 @@
+import os
+import time
+import threading
+
+import pytest
+
+from task_queue import JobExecutor, publish_update
+
+
+def _job(task_id, steps):
+    """模块级函数，进程模式下可以传给工作进程"""
+    for step in range(1, steps + 1):
+        publish_update(task_id, {"progress": step * 100 // steps, "pid": os.getpid()})
+    return {"task_id": task_id, "steps": steps}
+
+
+def _failing_job(task_id):
+    publish_update(task_id, {"progress": 10})
+    raise ValueError("解码失败")
+
+
+class _Recorder:
+    def __init__(self):
+        self.updates = []
+        self.done = {}
+        self.finished = threading.Event()
+        self._lock = threading.Lock()
+
+    def on_update(self, task_id, fields):
+        with self._lock:
+            self.updates.append((task_id, fields))
+
+    def on_done(self, task_id, result, error):
+        with self._lock:
+            self.done[task_id] = (result, error)
+            self.finished.set()
+
+
+def test_thread_mode_reports_progress_and_completes():
+    recorder = _Recorder()
+    executor = JobExecutor(max_workers=2, mode="thread", on_update=recorder.on_update)
+    try:
+        future = executor.submit("t1", _job, "t1", 4, on_done=recorder.on_done)
+        assert future.result(timeout=10) == {"task_id": "t1", "steps": 4}
+        assert recorder.finished.wait(10)
+    finally:
+        executor.shutdown()
+    assert [fields["progress"] for _, fields in recorder.updates] == [25, 50, 75, 100]
+    assert recorder.done["t1"] == ({"task_id": "t1", "steps": 4}, None)
+    assert executor.pending_count() == 0
+
+
+def test_failing_job_reports_error():
+    recorder = _Recorder()
+    executor = JobExecutor(max_workers=1, mode="thread", on_update=recorder.on_update)
+    try:
+        executor.submit("t1", _failing_job, "t1", on_done=recorder.on_done)
+        assert recorder.finished.wait(10)
+    finally:
+        executor.shutdown()
+    result, error = recorder.done["t1"]
+    assert result is None
+    assert isinstance(error, ValueError) and str(error) == "解码失败"
+    assert recorder.updates == [("t1", {"progress": 10})]
+
+
+def test_process_mode_delivers_updates():
+    recorder = _Recorder()
+    executor = JobExecutor(max_workers=2, mode="process", on_update=recorder.on_update)
+    try:
+        futures = [executor.submit(f"t{i}", _job, f"t{i}", 3, on_done=recorder.on_done) for i in range(3)]
+        for future in futures:
+            future.result(timeout=60)
+        # 更新由主进程中的监听线程转发，等待队列中的更新全部写入
+        deadline = time.monotonic() + 10
+        while len(recorder.updates) < 9 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        executor.shutdown()
+    assert len(recorder.updates) == 9
+    for i in range(3):
+        progress = [fields["progress"] for task_id, fields in recorder.updates if task_id == f"t{i}"]
+        assert progress == [33, 66, 100]
+    assert all(fields["pid"] != os.getpid() for _, fields in recorder.updates)
+    assert set(recorder.done) == {"t0", "t1", "t2"}
+
+
+def test_publish_update_outside_executor_is_ignored():
+    publish_update("t1", {"progress": 50})
+
+
+def test_executor_refuses_worker_process(monkeypatch):
+    monkeypatch.setattr("multiprocessing.parent_process", lambda: object())
+    with pytest.raises(RuntimeError):
+        JobExecutor(mode="thread")
@@ -0,0 +1,96 @@
+import time
+import threading
+
+import pytest
+
+from task_store import MemoryTaskStore, SQLiteTaskStore, create_task_store
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryTaskStore(ttl=60, evict_interval=0)
+    return SQLiteTaskStore(str(tmp_path / "tasks.db"), ttl=60, evict_interval=0)
+
+
+def _create(store, task_id="t1", user_id=1):
+    store.create(task_id, {"status": "queued", "progress": 0, "message": "排队中", "user_id": user_id})
+
+
+def test_create_update_get(store):
+    _create(store)
+    assert store.update("t1", {"status": "processing", "progress": 40, "stage": "asr", "partial": {"a": "文本"}})
+    task = store.get("t1")
+    assert task["status"] == "processing"
+    assert task["progress"] == 40
+    assert task["stage"] == "asr"
+    assert task["partial"] == {"a": "文本"}
+    assert task["user_id"] == 1
+    assert store.get("missing") is None
+    assert not store.update("missing", {"progress": 1})
+
+
+def test_versions_change_on_update(store):
+    _create(store, "t1")
+    _create(store, "t2")
+    before = store.get_versions(["t1", "t2", "missing"])
+    assert set(before) == {"t1", "t2"}
+    store.update("t1", {"progress": 10})
+    after = store.get_versions(["t1", "t2"])
+    assert after["t1"] != before["t1"]
+    assert after["t2"] == before["t2"]
+
+
+def test_finished_task_ignores_progress(store):
+    _create(store)
+    store.update("t1", {"status": "completed", "progress": 100})
+    assert not store.update("t1", {"progress": 50})
+    assert store.get("t1")["progress"] == 100
+    assert store.update("t1", {"status": "error", "message": "重新标记"})
+
+
+def test_result_roundtrip(store):
+    _create(store)
+    assert store.get_result("t1") is None
+    store.set_result("t1", {"summary": "摘要", "metrics": {"asr_seconds": 1.5}})
+    assert store.get_result("t1") == {"summary": "摘要", "metrics": {"asr_seconds": 1.5}}
+
+
+def test_evict_expired(store):
+    _create(store, "done")
+    _create(store, "running")
+    store.update("done", {"status": "completed"})
+    assert store.evict_expired() == 0
+    assert store.evict_expired(now=time.time() + 120) == 1
+    assert store.get("done") is None
+    assert store.get("running") is not None
+
+
+def test_concurrent_updates_are_merged(store):
+    _create(store)
+
+    def update(i):
+        store.update("t1", {f"field_{i}": i})
+
+    threads = [threading.Thread(target=update, args=(i,)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    task = store.get("t1")
+    assert all(task[f"field_{i}"] == i for i in range(20))
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    first = SQLiteTaskStore(str(tmp_path / "tasks.db"))
+    second = SQLiteTaskStore(str(tmp_path / "tasks.db"))
+    _create(first)
+    second.update("t1", {"progress": 70})
+    assert first.get("t1")["progress"] == 70
+
+
+def test_create_task_store_backends():
+    assert isinstance(create_task_store("memory"), MemoryTaskStore)
+    assert isinstance(create_task_store("task_store:MemoryTaskStore"), MemoryTaskStore)
+    with pytest.raises(ValueError):
+        create_task_store("unknown")
@@ -0,0 +1,79 @@
+import threading
+
+from xunfei_common import WpgsAssembler, AdaptivePacer, audio_position, FRAME_SIZE, BYTES_PER_SECOND
+
+
+def _result(sn, text, pgs=None, rg=None):
+    result = {"sn": sn, "ws": [{"bg": sn * 100, "cw": [{"w": text}, {"w": "备选"}]}]}
+    if pgs:
+        result["pgs"] = pgs
+    if rg:
+        result["rg"] = rg
+    return result
+
+
+def test_wpgs_assembler_appends():
+    assembler = WpgsAssembler()
+    assembler.apply(_result(1, "今天"))
+    assembler.apply(_result(2, "天气"))
+    assert assembler.text() == "今天天气"
+
+
+def test_wpgs_assembler_replaces_range():
+    assembler = WpgsAssembler()
+    assembler.apply(_result(1, "今天"))
+    assembler.apply(_result(2, "天起"))
+    assembler.apply(_result(3, "不错", pgs="apd"))
+    assembler.apply(_result(4, "天气不错", pgs="rpl", rg=[2, 3]))
+    assert assembler.text() == "今天天气不错"
+
+
+def test_audio_position():
+    assert audio_position(_result(3, "x")) == 3.0
+    assert audio_position({"ws": []}) is None
+
+
+def test_pacer_ack_grows_window():
+    pacer = AdaptivePacer(initial_window=1.0, min_window=0.5, max_window=2.0, stall_timeout=0.05)
+    pacer.ack(0.5)
+    assert pacer.acked == 0.5
+    assert pacer.window == 1.0 + FRAME_SIZE / BYTES_PER_SECOND
+    pacer.ack(0.4)  # 旧的确认不改变状态
+    assert pacer.acked == 0.5
+    for position in range(1, 100):
+        pacer.ack(position)
+    assert pacer.window == 2.0
+
+
+def test_pacer_does_not_wait_inside_window():
+    pacer = AdaptivePacer(initial_window=2.0, min_window=0.5, max_window=4.0, stall_timeout=5)
+    pacer.wait(1.0)
+    assert pacer.stalls == 0
+
+
+def test_pacer_stall_halves_window():
+    pacer = AdaptivePacer(initial_window=2.0, min_window=0.5, max_window=4.0, stall_timeout=0.01)
+    pacer.wait(3.0)
+    assert pacer.stalls == 1
+    assert pacer.window == 1.0
+    assert pacer.acked == 2.0
+    pacer.wait(10.0)
+    pacer.wait(20.0)
+    assert pacer.window == 0.5
+
+
+def test_pacer_wakes_on_ack():
+    pacer = AdaptivePacer(initial_window=1.0, min_window=0.5, max_window=4.0, stall_timeout=5)
+    timer = threading.Timer(0.05, pacer.ack, args=(2.0,))
+    timer.start()
+    pacer.wait(2.5)
+    timer.join()
+    assert pacer.stalls == 0
+
+
+def test_pacer_returns_when_stopped():
+    pacer = AdaptivePacer(initial_window=1.0, min_window=0.5, max_window=4.0, stall_timeout=0.01)
+    stopped = threading.Event()
+    stopped.set()
+    pacer.wait(5.0, stopped)
+    assert pacer.stalls == 0
@@ -0,0 +1,119 @@
+"""
+Token 估算模块
+
+这个模块提供了在本地估算文本 token 数量的功能，用于统计和控制发送给 DeepSeek 的提示词大小，
+不需要调用远程接口，也不依赖分词器。
+"""
+
+import re
+
+# 中日韩字符，DeepSeek 分词器中平均每个汉字约 0.6 个 token
+_CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]')
+CJK_TOKENS_PER_CHAR = 0.6
+# 其他非空白字符（英文、数字、标点），平均每个字符约 0.3 个 token
+OTHER_TOKENS_PER_CHAR = 0.3
+
+
+def estimate_tokens(text):
+    """
+    估算文本的 token 数量
+
+    参数:
+        text (str): 文本
+
+    返回:
+        int: 估算的 token 数量
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    other = len(text) - cjk - text.count(' ') - text.count('\n')
+    return int(cjk * CJK_TOKENS_PER_CHAR + max(other, 0) * OTHER_TOKENS_PER_CHAR) + 1
+
+
+def estimate_messages_tokens(messages):
+    """
+    估算聊天消息列表的 token 数量（每条消息额外计入少量格式开销）
+
+    参数:
+        messages (list): [{"role": ..., "content": ...}, ...]
+
+    返回:
+        int: 估算的 token 数量
+    """
+    return sum(estimate_tokens(message.get('content', '')) + 4 for message in messages)
+
+
+# 句子结束符（包括转录分段产生的换行）
+_SENTENCE_PATTERN = re.compile(r'[^。！？!?；;\n]*(?:[。！？!?；;]+|\n+|$)')
+
+
+def split_sentences(text):
+    """按句子和换行切分文本，保留句末标点和换行（拼接后与原文一致）"""
+    sentences = []
+    for sentence in _SENTENCE_PATTERN.findall(text):
+        if not sentence:
+            continue
+        if not sentence.strip() and sentences:
+            # 单独的换行或空白并入上一句
+            sentences[-1] += sentence
+        else:
+            sentences.append(sentence)
+    return sentences
+
+
+def split_text(text, max_tokens):
+    """
+    在句子和分段边界上把文本切分成不超过 token 预算的若干块
+
+    单个句子超过预算时按字符硬切分。
+
+    参数:
+        text (str): 文本
+        max_tokens (int): 每块的 token 预算
+
+    返回:
+        list: 文本块列表
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+    for sentence in split_sentences(text):
+        tokens = estimate_tokens(sentence)
+        if tokens > max_tokens:
+            # 超长句子：先结束当前块，再按字符切分
+            if current:
+                chunks.append("".join(current))
+                current, current_tokens = [], 0
+            step = max(1, int(len(sentence) * max_tokens / tokens))
+            chunks.extend(sentence[i:i + step] for i in range(0, len(sentence), step))
+            continue
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append("".join(current))
+            current, current_tokens = [], 0
+        current.append(sentence)
+        current_tokens += tokens
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+def sample_text(text, max_tokens, pieces=8):
+    """
+    从长文本中均匀选取若干片段，使结果不超过 token 预算，用于只需要概览原文的提示词
+
+    参数:
+        text (str): 文本
+        max_tokens (int): token 预算
+        pieces (int): 选取的片段数量
+
+    返回:
+        str: 原文（未超出预算时）或以省略号连接的片段
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    chunks = split_text(text, max(1, max_tokens // pieces))
+    if len(chunks) <= pieces:
+        return "……".join(chunks)
+    step = len(chunks) / pieces
+    return "……".join(chunks[int(i * step)] for i in range(pieces))
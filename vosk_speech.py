@@ -2,74 +2,195 @@
 Vosk 语音识别模块
 
 这个模块提供了使用 Vosk 进行离线语音识别的功能。
+模型在每个进程内只加载一次。音视频由 ffmpeg 解码为 PCM 流，边解码边在静音处切分，片段的 PCM 数据交给工作进程池并行识别，
+每个工作进程在启动时加载一次模型；识别结果按时间顺序合并，词级时间戳换算为整个文件中的时间。
 """
 
 import os
 import json
-import wave
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from vosk import Model, KaldiRecognizer
 from dotenv import load_dotenv
+from audio_stream import stream_segments, SAMPLE_RATE
 
 # 加载环境变量
 load_dotenv()
 
 # Vosk 模型路径
 VOSK_MODEL_PATH = os.getenv("VOSK_MODEL_PATH", "vosk-model-cn")
+# 并行识别的工作进程数
+VOSK_WORKERS = int(os.getenv("VOSK_WORKERS") or os.cpu_count() or 1)
+# 长音频切分的片段最大长度（秒），只有一个片段的音频直接在当前进程识别
+VOSK_SEGMENT_SECONDS = float(os.getenv("VOSK_SEGMENT_SECONDS", "60"))
+
+# 每次送入识别器的字节数（4000 个采样帧）
+READ_BYTES = 8000
+
+_model = None
+_model_lock = threading.Lock()
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_model(model_path=VOSK_MODEL_PATH):
+    """获取当前进程内共享的 Vosk 模型，第一次调用时加载"""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = Model(model_path)
+    return _model
+
+
+def _init_worker(model_path):
+    """工作进程初始化：加载一次模型"""
+    get_model(model_path)
+
+
+def recognize_pcm(pcm, rate=SAMPLE_RATE, offset=0.0):
+    """
+    识别一段 16 位单声道 PCM 音频
+
+    参数:
+        pcm (bytes): PCM 数据
+        rate (int): 采样率
+        offset (float): 这段音频在整个文件中的起始时间（秒）
+
+    返回:
+        dict: {"texts": [...], "words": [...]}，词的 start/end 是在整个文件中的时间（秒）
+    """
+    rec = KaldiRecognizer(get_model(), rate)
+    rec.SetWords(True)
+
+    texts = []
+    words = []
+
+    def collect(part_result):
+        if part_result.get("text"):
+            texts.append(part_result["text"])
+        for word in part_result.get("result", []):
+            word["start"] = round(word["start"] + offset, 3)
+            word["end"] = round(word["end"] + offset, 3)
+            words.append(word)
+
+    data = memoryview(pcm)
+    for start in range(0, len(data), READ_BYTES):
+        if rec.AcceptWaveform(bytes(data[start:start + READ_BYTES])):
+            collect(json.loads(rec.Result()))
+
+    # 获取最后的结果
+    collect(json.loads(rec.FinalResult()))
+    return {"texts": texts, "words": words}
+
+
+def _get_pool():
+    """获取识别进程池（在当前进程中第一次使用时创建）"""
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ProcessPoolExecutor(max_workers=VOSK_WORKERS, initializer=_init_worker,
+                                            initargs=(VOSK_MODEL_PATH,))
+                _pool_pid = os.getpid()
+    return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def recognize_with_vosk(audio_path):
+    """
+    识别整个音视频文件，边解码边切分，多个片段时并行识别
+
+    参数:
+        audio_path (str): 音视频文件路径（ffmpeg 支持的任意格式）
+
+    返回:
+        dict: {"text": 合并后的文本, "words": 词级结果, "segments": 片段数}
+    """
+    segments = stream_segments(audio_path, VOSK_SEGMENT_SECONDS)
+    # 先取两个片段，判断是否需要使用进程池
+    first = next(segments, None)
+    second = next(segments, None)
+    if first is None:
+        return {"text": "", "words": [], "segments": 0}
+
+    results = []
+    count = 0
+    remaining = itertools.chain([first], [second] if second is not None else [], segments)
+    if second is None or VOSK_WORKERS <= 1:
+        # 只有一个片段或不使用进程池时，在当前进程中依次识别
+        for segment in remaining:
+            results.append(recognize_pcm(segment["pcm"], SAMPLE_RATE, segment["start"]))
+            count += 1
+    else:
+        # 按提交顺序取回结果；等待中的片段最多 VOSK_WORKERS * 2 个，取回结果后释放 PCM 数据
+        pending = deque()
+        pool = _get_pool()
+
+        def take():
+            segment, future = pending.popleft()
+            try:
+                results.append(future.result())
+            except BrokenProcessPool as e:
+                print(f"Vosk 识别进程异常退出（{e}），片段 {segment['index']} 改为在当前进程中识别")
+                _reset_pool()
+                results.append(recognize_pcm(segment["pcm"], SAMPLE_RATE, segment["start"]))
+
+        for segment in remaining:
+            count += 1
+            try:
+                future = pool.submit(recognize_pcm, segment["pcm"], SAMPLE_RATE, segment["start"])
+            except BrokenProcessPool:
+                _reset_pool()
+                pool = _get_pool()
+                future = pool.submit(recognize_pcm, segment["pcm"], SAMPLE_RATE, segment["start"])
+            pending.append((segment, future))
+            while len(pending) > VOSK_WORKERS * 2 or (pending and pending[0][1].done()):
+                take()
+        while pending:
+            take()
+        print(f"Vosk: 切分为 {count} 个片段，使用 {VOSK_WORKERS} 个进程并行识别")
+
+    texts = [text for result in results for text in result["texts"]]
+    words = [word for result in results for word in result["words"]]
+    return {"text": " ".join(texts), "words": words, "segments": count}
+
 
 def transcribe_with_vosk(audio_path, language='zh'):
     """
     使用 Vosk 进行离线语音识别
-    
+
     参数:
-        audio_path (str): 音频文件路径
+        audio_path (str): 音视频文件路径（ffmpeg 支持的任意格式）
         language (str): 语言代码，默认为中文
-        
+
     返回:
         str: 识别的文本
     """
     # 检查模型是否存在
     if not os.path.exists(VOSK_MODEL_PATH):
         return f"Vosk 模型不存在。请下载模型并将其放在 {VOSK_MODEL_PATH} 目录中。"
-    
+
     try:
-        # 加载模型
-        model = Model(VOSK_MODEL_PATH)
-        
-        # 打开音频文件
-        wf = wave.open(audio_path, "rb")
-        
-        # 检查音频格式
-        if wf.getnchannels() != 1 or wf.getsampwidth() != 2 or wf.getcomptype() != "NONE":
-            return "音频格式不支持。请使用单声道、16位PCM格式的WAV文件。"
-        
-        # 创建识别器
-        rec = KaldiRecognizer(model, wf.getframerate())
-        rec.SetWords(True)
-        
-        # 读取音频数据并进行识别
-        results = []
-        while True:
-            data = wf.readframes(4000)
-            if len(data) == 0:
-                break
-            if rec.AcceptWaveform(data):
-                part_result = json.loads(rec.Result())
-                if "text" in part_result:
-                    results.append(part_result["text"])
-        
-        # 获取最后的结果
-        part_result = json.loads(rec.FinalResult())
-        if "text" in part_result:
-            results.append(part_result["text"])
-        
-        # 合并结果
-        text = " ".join(results)
-        
+        # ffmpeg 负责把各种格式解码为单声道 16 位 PCM
+        text = recognize_with_vosk(audio_path)["text"]
+
         if not text.strip():
             return "无法识别音频内容。请确保音频清晰并包含语音。"
-        
+
         return text
-        
+
     except Exception as e:
         print(f"Vosk 语音识别出错: {e}")
         return f"Vosk 语音识别出错: {e}"
@@ -2,11 +2,11 @@
 Whisper CLI语音识别模块
 
 这个模块提供了使用Whisper CLI工具进行语音转文字的功能。
+识别由 whisper_worker 中的常驻工作进程完成，不再为每个文件启动一次 whisper 命令。
 """
 
-import os
-import subprocess
 import time
+from whisper_worker import get_worker, WhisperWorkerError
 
 # 导入繁体转简体的库
 try:
@@ -18,7 +18,7 @@ except ImportError:
 
 def transcribe_with_whisper_cli(audio_path, model_size="tiny", language="zh", to_simplified=True):
     """
-    使用Whisper CLI工具进行语音识别
+    使用常驻的Whisper工作进程进行语音识别
 
     参数:
         audio_path (str): 音频文件路径
@@ -34,51 +34,24 @@ def transcribe_with_whisper_cli(audio_path, model_size="tiny", language="zh", to
     print(f"模型大小: {model_size}, 语言: {language}")
 
     try:
-        # 创建输出目录
-        output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'transcriptions')
-        os.makedirs(output_dir, exist_ok=True)
-
-        # 生成输出文件名
-        base_name = os.path.splitext(os.path.basename(audio_path))[0]
-        output_path = os.path.join(output_dir, f"{base_name}_whisper_cli.txt")
-
-        # 构建Whisper CLI命令
-        cmd = f"whisper {audio_path} --model {model_size} --language {language} --output_dir {output_dir}"
-        print(f"执行命令: {cmd}")
-
-        # 执行命令
+        # 任务发送到常驻的工作进程，模型只在工作进程启动时加载一次
         start_time = time.time()
-        subprocess.run(cmd, shell=True, check=True)
+        result = get_worker(model_size).transcribe(audio_path, language=language)
         end_time = time.time()
-        print(f"转录完成，耗时: {end_time - start_time:.2f} 秒")
-
-        # Whisper CLI输出的文本文件与输入文件同名，但扩展名为.txt
-        whisper_output = os.path.join(output_dir, f"{base_name}.txt")
-
-        # 如果输出文件存在，读取内容并保存到我们的输出文件
-        if os.path.exists(whisper_output):
-            with open(whisper_output, 'r', encoding='utf-8') as f:
-                text = f.read()
+        print(f"转录完成，耗时: {end_time - start_time:.2f} 秒（其中推理 {result['seconds']:.2f} 秒）")
 
-            # 如果需要，将繁体中文转换为简体中文
-            if to_simplified and language.lower() in ["zh", "chinese", "zh-cn", "zh-tw"] and OPENCC_AVAILABLE:
-                print("将繁体中文转换为简体中文...")
-                cc = OpenCC('t2s')  # 繁体到简体
-                text = cc.convert(text)
-                print("转换完成")
+        text = result["text"]
 
-            # 保存到我们的输出文件
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(text)
+        # 如果需要，将繁体中文转换为简体中文
+        if to_simplified and language.lower() in ["zh", "chinese", "zh-cn", "zh-tw"] and OPENCC_AVAILABLE:
+            print("将繁体中文转换为简体中文...")
+            cc = OpenCC('t2s')  # 繁体到简体
+            text = cc.convert(text)
+            print("转换完成")
 
-            print(f"转录结果已保存到: {output_path}")
-            return text
-        else:
-            error_msg = f"无法找到Whisper输出文件: {whisper_output}"
-            print(error_msg)
-            return error_msg
-    except subprocess.CalledProcessError as e:
-        error_msg = f"执行Whisper CLI时出错: {e}"
+        return text
+    except WhisperWorkerError as e:
+        error_msg = f"执行Whisper时出错: {e}"
         print(error_msg)
         return error_msg
     except Exception as e:
@@ -0,0 +1,203 @@
+"""
+Whisper 模型注册表模块
+
+这个模块在进程内按 (模型, 设备) 缓存已加载的 Whisper 模型，每个模型只加载一次并在所有任务之间共享。
+同一个模型的推理通过锁串行执行；已加载模型占用的内存超过上限时，淘汰最久未使用且空闲的模型。
+启动时可以通过 WHISPER_PRELOAD_MODELS 预加载常用模型。
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+# 启动时预加载的模型，逗号分隔，如 "tiny,small"
+WHISPER_PRELOAD_MODELS = os.getenv("WHISPER_PRELOAD_MODELS", "")
+# 推理设备，留空时由 Whisper 自动选择（有 GPU 时使用 cuda）
+WHISPER_DEVICE = os.getenv("WHISPER_DEVICE", "") or None
+# 已加载模型的内存上限（MB）
+WHISPER_MEMORY_BUDGET_MB = int(os.getenv("WHISPER_MEMORY_BUDGET_MB", "4096"))
+
+
+def _model_memory_bytes(model):
+    """估算模型参数和缓冲区占用的内存（字节）"""
+    try:
+        total = sum(p.numel() * p.element_size() for p in model.parameters())
+        total += sum(b.numel() * b.element_size() for b in model.buffers())
+        return total
+    except Exception:
+        return 0
+
+
+class _ModelEntry:
+    def __init__(self, name, device):
+        self.name = name
+        self.device = device
+        self.model = None
+        self.load_seconds = None
+        self.memory_bytes = 0
+        self.uses = 0
+        self.last_used = 0
+        self.busy = 0
+        self.loaded = threading.Event()
+        self.infer_lock = threading.Lock()
+
+
+class WhisperModelRegistry:
+    def __init__(self, memory_budget_bytes=WHISPER_MEMORY_BUDGET_MB * 1024 * 1024):
+        """
+        创建 Whisper 模型注册表
+
+        参数:
+            memory_budget_bytes (int): 已加载模型的内存上限（字节）
+        """
+        self.memory_budget_bytes = memory_budget_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # {(name, device): _ModelEntry}，按最近使用排序
+
+    def _acquire(self, name, device):
+        """获取模型条目并标记为使用中，模型未加载时由当前线程负责加载"""
+        key = (name, device)
+        with self._lock:
+            entry = self._entries.get(key)
+            should_load = entry is None
+            if should_load:
+                entry = _ModelEntry(name, device)
+                self._entries[key] = entry
+            self._entries.move_to_end(key)
+            entry.busy += 1
+
+        if should_load:
+            try:
+                self._load(entry)
+            except Exception:
+                with self._lock:
+                    self._entries.pop(key, None)
+                    entry.busy -= 1
+                entry.loaded.set()
+                raise
+        else:
+            entry.loaded.wait()
+            if entry.model is None:
+                with self._lock:
+                    entry.busy -= 1
+                raise RuntimeError(f"Whisper模型加载失败: {name}")
+        return entry
+
+    def _release(self, entry):
+        with self._lock:
+            entry.busy -= 1
+            entry.uses += 1
+            entry.last_used = time.time()
+
+    def _load(self, entry):
+        import whisper
+
+        print(f"加载Whisper模型: {entry.name} ({entry.device or '自动选择设备'})")
+        start_time = time.time()
+        entry.model = whisper.load_model(entry.name, device=entry.device)
+        entry.load_seconds = time.time() - start_time
+        entry.memory_bytes = _model_memory_bytes(entry.model)
+        entry.loaded.set()
+        print(f"模型加载完成，耗时: {entry.load_seconds:.2f} 秒，占用内存约 {entry.memory_bytes / 1024 / 1024:.0f} MB")
+        self._evict()
+
+    def _evict(self):
+        """内存超出上限时，淘汰最久未使用且空闲的模型"""
+        with self._lock:
+            total = sum(entry.memory_bytes for entry in self._entries.values())
+            for key in list(self._entries):
+                if total <= self.memory_budget_bytes:
+                    break
+                entry = self._entries[key]
+                if entry.busy or entry.model is None:
+                    continue
+                print(f"Whisper模型内存超出上限，卸载模型: {entry.name}")
+                del self._entries[key]
+                total -= entry.memory_bytes
+                entry.model = None
+
+    def transcribe(self, name, audio, device=WHISPER_DEVICE, **kwargs):
+        """
+        使用共享的模型进行转录，同一个模型的推理串行执行
+
+        参数:
+            name (str): 模型大小，如 tiny、small
+            audio: 音频文件路径或 16kHz float32 波形
+            device (str): 推理设备
+            **kwargs: 传给 model.transcribe 的参数
+
+        返回:
+            dict: Whisper 的转录结果
+        """
+        entry = self._acquire(name, device)
+        try:
+            with entry.infer_lock:
+                return entry.model.transcribe(audio, **kwargs)
+        finally:
+            self._release(entry)
+
+    def preload(self, names, device=WHISPER_DEVICE):
+        """预加载模型"""
+        for name in names:
+            try:
+                self._release(self._acquire(name, device))
+            except Exception as e:
+                print(f"预加载Whisper模型 {name} 失败: {e}")
+
+    def _after_fork(self):
+        """工作进程 fork 后重建锁，已加载的模型权重以写时复制的方式继续使用"""
+        self._lock = threading.Lock()
+        for key, entry in list(self._entries.items()):
+            if entry.model is None:
+                del self._entries[key]
+                continue
+            entry.busy = 0
+            entry.infer_lock = threading.Lock()
+
+    def stats(self):
+        """返回每个已加载模型的加载耗时、内存占用和使用次数"""
+        with self._lock:
+            return [{
+                "model": entry.name,
+                "device": entry.device or "auto",
+                "load_seconds": round(entry.load_seconds, 2) if entry.load_seconds is not None else None,
+                "memory_mb": round(entry.memory_bytes / 1024 / 1024, 1),
+                "uses": entry.uses,
+                "busy": entry.busy
+            } for entry in self._entries.values()]
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """获取进程内共享的模型注册表"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = WhisperModelRegistry()
+    return _registry
+
+
+def _reset_after_fork():
+    global _registry_lock
+    _registry_lock = threading.Lock()
+    if _registry is not None:
+        _registry._after_fork()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def preload_configured_models():
+    """在后台线程中预加载 WHISPER_PRELOAD_MODELS 中配置的模型"""
+    names = [name.strip() for name in WHISPER_PRELOAD_MODELS.split(",") if name.strip()]
+    if names:
+        threading.Thread(target=get_registry().preload, args=(names,), daemon=True).start()
@@ -1,56 +1,59 @@
 import os
 import sys
-import tempfile
 import time
-from moviepy.editor import VideoFileClip
 from opencc import OpenCC
+from whisper_registry import get_registry
+from media_probe import extract_audio_cached, MediaProbeError
+from artifact_store import get_store, artifact_key
+from result_cache import hash_file
 
 def extract_audio_from_video(video_path):
     """从视频中提取音频"""
     print(f"从视频中提取音频: {video_path}")
 
-    # 创建输出目录
-    output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'extracted_audio')
-    os.makedirs(output_dir, exist_ok=True)
-
-    # 生成输出文件名
-    base_name = os.path.splitext(os.path.basename(video_path))[0]
-    output_path = os.path.join(output_dir, f"{base_name}.wav")
-
-    # 如果音频文件已存在，直接返回路径
-    if os.path.exists(output_path):
-        print(f"音频文件已存在: {output_path}")
-        return output_path
-
-    # 使用moviepy提取音频
+    # 用 ffmpeg 一次解码为 16kHz 单声道 WAV；按文件内容保存，同一个文件已经提取过时直接返回
     try:
-        video = VideoFileClip(video_path)
-        video.audio.write_audiofile(output_path, codec='pcm_s16le', fps=16000)
-        print(f"音频已保存到: {output_path}")
-        return output_path
-    except Exception as e:
+        audio_path = extract_audio_cached(video_path)["path"]
+        print(f"音频已保存到: {audio_path}")
+        return audio_path
+    except MediaProbeError as e:
         print(f"提取音频时出错: {e}")
         return None
 
-def transcribe_with_whisper(audio_path, model_size="small", language="Chinese", to_simplified=True):
-    """使用Whisper进行语音识别"""
+def transcribe_with_whisper(audio_path, model_size="small", language="Chinese", to_simplified=True,
+                            source_hash=None):
+    """
+    使用Whisper进行语音识别
+
+    参数:
+        audio_path (str): 音频文件路径
+        model_size (str): 模型大小
+        language (str): 语言
+        to_simplified (bool): 是否将繁体中文转换为简体中文
+        source_hash (str): 音频文件的 SHA-256；提供时按内容保存和复用转录结果，
+                           不提供时不读取整个文件计算哈希（处理流程由调用方缓存结果）
+
+    返回:
+        str: 识别出的文本或错误信息
+    """
     print(f"使用Whisper进行语音识别: {audio_path}")
     print(f"模型大小: {model_size}, 语言: {language}, 转换为简体: {to_simplified}")
 
     try:
-        import whisper
-
-        # 加载模型
-        print("加载Whisper模型...")
-        start_time = time.time()
-        model = whisper.load_model(model_size)
-        load_time = time.time() - start_time
-        print(f"模型加载完成，耗时: {load_time:.2f} 秒")
-
-        # 进行转录
+        # 同一内容的音频用同样的参数识别过时直接返回保存的结果
+        params = {"model": model_size, "language": language, "to_simplified": to_simplified}
+        key = None
+        if source_hash:
+            key = artifact_key(source_hash, "transcript", backend="whisper", **params)
+            cached = get_store().get_text(key)
+            if cached is not None:
+                print("使用已保存的转录结果")
+                return cached
+
+        # 模型由注册表在进程内只加载一次，之后的调用直接复用
         print("开始转录...")
         start_time = time.time()
-        result = model.transcribe(audio_path, language=language, verbose=True)
+        result = get_registry().transcribe(model_size, audio_path, language=language, verbose=True)
         transcribe_time = time.time() - start_time
         print(f"转录完成，耗时: {transcribe_time:.2f} 秒")
 
@@ -65,16 +68,10 @@ def transcribe_with_whisper(audio_path, model_size="small", language="Chinese",
             print("转换完成")
 
         # 保存结果
-        output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'transcriptions')
-        os.makedirs(output_dir, exist_ok=True)
-
-        base_name = os.path.splitext(os.path.basename(audio_path))[0]
-        output_path = os.path.join(output_dir, f"{base_name}_whisper.txt")
-
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(text)
-
-        print(f"转录结果已保存到: {output_path}")
+        if key is not None:
+            output_path = get_store().put_text(key, text, source_hash=source_hash, kind="transcript",
+                                               backend="whisper", params=params)
+            print(f"转录结果已保存到: {output_path}")
         return text
     except Exception as e:
         print(f"转录时出错: {e}")
@@ -106,7 +103,8 @@ def main():
         return
 
     # 使用Whisper进行语音识别
-    text = transcribe_with_whisper(audio_path, model_size, language, to_simplified)
+    text = transcribe_with_whisper(audio_path, model_size, language, to_simplified,
+                                   source_hash=hash_file(audio_path))
     if text:
         print("\n=== 识别结果 ===")
         print(text)
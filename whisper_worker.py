@@ -0,0 +1,319 @@
+"""
+Whisper 常驻工作进程模块
+
+这个模块启动一个长期运行的本地工作进程，模型加载后常驻内存。
+主进程通过本地 Unix 套接字（multiprocessing.connection，带认证密钥）发送转录任务，工作进程直接返回分段结果，
+不经过 shell 命令和临时文本文件。主进程定期发送健康检查，工作进程退出、无响应或任务超时时自动重启。
+任务进行中工作进程退出或连接断开时重启后重试一次；任务超时不重试，避免一个卡住的任务等待两倍的超时时间。
+"""
+
+import os
+import sys
+import time
+import secrets
+import threading
+import subprocess
+from multiprocessing.connection import Listener, Client
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+# 等待工作进程启动并加载模型的超时时间（秒）
+WHISPER_WORKER_START_TIMEOUT = float(os.getenv("WHISPER_WORKER_START_TIMEOUT", "600"))
+# 单个转录任务的超时时间（秒）
+WHISPER_WORKER_JOB_TIMEOUT = float(os.getenv("WHISPER_WORKER_JOB_TIMEOUT", "3600"))
+# 空闲时健康检查的间隔和超时时间（秒）
+WHISPER_WORKER_HEALTH_INTERVAL = float(os.getenv("WHISPER_WORKER_HEALTH_INTERVAL", "30"))
+WHISPER_WORKER_HEALTH_TIMEOUT = float(os.getenv("WHISPER_WORKER_HEALTH_TIMEOUT", "10"))
+
+AUTHKEY_ENV = "WHISPER_WORKER_AUTHKEY"
+
+
+class WhisperWorkerError(Exception):
+    """工作进程不可用或任务失败"""
+
+
+class WhisperWorkerDied(WhisperWorkerError):
+    """工作进程退出或连接断开"""
+
+
+class WhisperWorkerTimeout(WhisperWorkerError):
+    """工作进程在超时时间内没有响应"""
+
+
+class WhisperWorker:
+    def __init__(self, model_size="tiny", device=None, start_timeout=WHISPER_WORKER_START_TIMEOUT,
+                 job_timeout=WHISPER_WORKER_JOB_TIMEOUT, health_interval=WHISPER_WORKER_HEALTH_INTERVAL):
+        """
+        创建 Whisper 工作进程的管理对象（工作进程在第一次使用时启动）
+
+        参数:
+            model_size (str): 模型大小
+            device (str): 推理设备，为 None 时自动选择
+            start_timeout (float): 启动超时（秒）
+            job_timeout (float): 单个任务超时（秒）
+            health_interval (float): 健康检查间隔（秒），为 0 时不做后台检查
+        """
+        self.model_size = model_size
+        self.device = device
+        self.start_timeout = start_timeout
+        self.job_timeout = job_timeout
+        self.health_interval = health_interval
+        self.process = None
+        self.conn = None
+        self.load_seconds = None
+        self.restarts = 0
+        self.jobs = 0
+        self._lock = threading.Lock()  # 同一时间只有一个任务通过连接收发
+        self._stopped = threading.Event()
+        self._monitor = None
+
+    def _start(self):
+        """启动工作进程，等待它连接并加载完模型"""
+        if self.load_seconds is not None:
+            self.restarts += 1
+        authkey = secrets.token_bytes(32)
+        listener = Listener(family='AF_UNIX', authkey=authkey)
+        env = dict(os.environ)
+        env[AUTHKEY_ENV] = authkey.hex()
+        print(f"启动Whisper工作进程: 模型 {self.model_size}")
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), listener.address, self.model_size, self.device or ""],
+            env=env,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+
+        # accept 没有超时参数，在线程中等待，超时后关闭监听套接字
+        accepted = {}
+
+        def accept():
+            try:
+                accepted['conn'] = listener.accept()
+            except Exception as e:
+                accepted['error'] = e
+
+        accept_thread = threading.Thread(target=accept, daemon=True)
+        accept_thread.start()
+        accept_thread.join(self.start_timeout)
+        listener.close()
+        conn = accepted.get('conn')
+        if conn is None:
+            self._kill()
+            raise WhisperWorkerError(f"Whisper工作进程启动失败: {accepted.get('error', '连接超时')}")
+
+        self.conn = conn
+        try:
+            message = self._receive(self.start_timeout)
+        except WhisperWorkerDied as e:
+            # 加载模型时退出，重试多半也会失败
+            raise WhisperWorkerError(f"Whisper工作进程加载模型失败: {e}")
+        if message[0] != "ready":
+            self._kill()
+            raise WhisperWorkerError(f"Whisper工作进程加载模型失败: {message[1]}")
+        self.load_seconds = message[1]
+        print(f"Whisper工作进程已就绪 (pid {self.process.pid})，模型加载耗时: {self.load_seconds:.2f} 秒")
+
+        if self.health_interval > 0 and (self._monitor is None or not self._monitor.is_alive()):
+            self._monitor = threading.Thread(target=self._health_loop, daemon=True)
+            self._monitor.start()
+
+    def _kill(self):
+        """结束工作进程并关闭连接"""
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except OSError:
+                pass
+            self.conn = None
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+    def _receive(self, timeout):
+        """在超时时间内接收一条消息，超时或连接断开时结束工作进程"""
+        try:
+            if not self.conn.poll(timeout):
+                raise WhisperWorkerTimeout(f"Whisper工作进程在 {timeout:.0f} 秒内没有响应")
+            return self.conn.recv()
+        except (EOFError, OSError):
+            returncode = None
+            if self.process is not None:
+                try:
+                    returncode = self.process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    pass
+            self._kill()
+            raise WhisperWorkerDied(f"Whisper工作进程已退出（返回码 {returncode}）")
+        except WhisperWorkerError:
+            self._kill()
+            raise
+
+    def _ensure_running(self):
+        if self.process is None or self.process.poll() is not None:
+            if self.process is not None:
+                print(f"Whisper工作进程已退出（返回码 {self.process.returncode}），正在重启")
+                self._kill()
+            self._start()
+
+    def _request(self, message, timeout):
+        with self._lock:
+            self._ensure_running()
+            try:
+                self.conn.send(message)
+            except (OSError, ValueError) as e:
+                self._kill()
+                raise WhisperWorkerDied(f"无法发送任务到Whisper工作进程: {e}")
+            return self._receive(timeout)
+
+    def transcribe(self, audio_path, **options):
+        """
+        转录音频文件；任务进行中工作进程退出或连接断开时自动重启并重试一次，超时不重试
+
+        参数:
+            audio_path (str): 音频文件路径
+            **options: 传给 model.transcribe 的参数（如 language）
+
+        返回:
+            dict: {"text": 文本, "segments": [{"start", "end", "text"}, ...], "language": 语言, "seconds": 转录耗时}
+
+        异常:
+            WhisperWorkerTimeout: 任务超时（工作进程已结束，下一个任务重新启动）
+            WhisperWorkerError: 工作进程无法启动或任务失败
+        """
+        message = ("transcribe", os.path.abspath(audio_path), options)
+        try:
+            reply = self._request(message, self.job_timeout)
+        except WhisperWorkerDied as e:
+            print(f"{e}，重启工作进程后重试")
+            reply = self._request(message, self.job_timeout)
+
+        if reply[0] == "error":
+            raise WhisperWorkerError(reply[1])
+        self.jobs += 1
+        return reply[1]
+
+    def ping(self, timeout=WHISPER_WORKER_HEALTH_TIMEOUT):
+        """健康检查，返回工作进程的状态"""
+        reply = self._request(("ping",), timeout)
+        return reply[1]
+
+    def _health_loop(self):
+        """空闲时定期检查工作进程，无响应时结束它，下一个任务会重新启动"""
+        while not self._stopped.wait(self.health_interval):
+            if not self._lock.acquire(blocking=False):
+                continue  # 正在处理任务
+            try:
+                if self.process is None:
+                    continue
+                if self.process.poll() is not None:
+                    print("健康检查: Whisper工作进程已退出，正在重启")
+                    self._kill()
+                    self._start()
+                    continue
+                try:
+                    self.conn.send(("ping",))
+                    self._receive(WHISPER_WORKER_HEALTH_TIMEOUT)
+                except (WhisperWorkerError, OSError, ValueError) as e:
+                    print(f"健康检查失败: {e}")
+                    self._kill()
+            except Exception as e:
+                print(f"重启Whisper工作进程失败: {e}")
+            finally:
+                self._lock.release()
+
+    def stats(self):
+        """返回工作进程的状态"""
+        return {
+            "model": self.model_size,
+            "pid": self.process.pid if self.process is not None else None,
+            "alive": self.process is not None and self.process.poll() is None,
+            "load_seconds": round(self.load_seconds, 2) if self.load_seconds is not None else None,
+            "jobs": self.jobs,
+            "restarts": self.restarts
+        }
+
+    def stop(self):
+        """停止工作进程"""
+        self._stopped.set()
+        with self._lock:
+            if self.conn is not None:
+                try:
+                    self.conn.send(("stop",))
+                except (OSError, ValueError):
+                    pass
+            if self.process is not None:
+                try:
+                    self.process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    pass
+            self._kill()
+
+
+_workers = {}
+_workers_pid = None
+_workers_lock = threading.Lock()
+
+
+def get_worker(model_size="tiny", device=None):
+    """获取指定模型的共享工作进程（每个进程内每个模型一个）"""
+    global _workers, _workers_pid
+    with _workers_lock:
+        if _workers_pid != os.getpid():
+            # fork 出的子进程不能复用父进程的连接
+            _workers = {}
+            _workers_pid = os.getpid()
+        key = (model_size, device)
+        if key not in _workers:
+            _workers[key] = WhisperWorker(model_size, device)
+        return _workers[key]
+
+
+def _serve(address, model_size, device):
+    """工作进程主循环：加载模型，然后逐个处理任务"""
+    conn = Client(address, family='AF_UNIX', authkey=bytes.fromhex(os.environ[AUTHKEY_ENV]))
+    try:
+        from whisper_registry import get_registry
+
+        registry = get_registry()
+        start_time = time.time()
+        registry.preload([model_size], device=device)
+        if not registry.stats():
+            conn.send(("error", f"无法加载模型 {model_size}"))
+            return
+        conn.send(("ready", time.time() - start_time))
+    except Exception as e:
+        conn.send(("error", str(e)))
+        return
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+
+        if message[0] == "stop":
+            break
+        if message[0] == "ping":
+            conn.send(("pong", {"pid": os.getpid(), "models": registry.stats()}))
+            continue
+        if message[0] == "transcribe":
+            _, audio_path, options = message
+            try:
+                start_time = time.time()
+                options.setdefault("verbose", False)
+                result = registry.transcribe(model_size, audio_path, device=device, **options)
+                conn.send(("ok", {
+                    "text": result["text"],
+                    "segments": [{"start": s["start"], "end": s["end"], "text": s["text"]}
+                                 for s in result.get("segments", [])],
+                    "language": result.get("language"),
+                    "seconds": time.time() - start_time
+                }))
+            except Exception as e:
+                conn.send(("error", f"Whisper转录出错: {e}"))
+
+
+if __name__ == "__main__":
+    _serve(sys.argv[1], sys.argv[2], sys.argv[3] or None)
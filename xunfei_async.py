@@ -0,0 +1,293 @@
+"""
+科大讯飞 WebSocket 语音听写异步客户端模块
+
+这个模块基于 asyncio 和 websockets 库实现讯飞 WebSocket 听写协议（xunfei_websocket 和 xunfei_official 使用的同一协议），
+所有识别会话都运行在一个后台事件循环中：每个会话只是一个协程，不再占用两个系统线程，一个事件循环可以同时驱动数百个会话。
+- 全局信号量限制同时进行的会话数，单个文件的会话数另有上限
+- 每个会话有超时，调用方超时或取消时对应的协程被取消并关闭连接
+- 发送端按服务端确认的节奏发送（与 xunfei_common 相同的加性增、乘性减窗口），并等待 websockets 的写缓冲排空（背压）
+- 音视频由 ffmpeg 解码为 PCM 流（audio_stream），边解码边切分、边识别，不写中间文件
+同步调用方通过 transcribe_file 使用，接口与原来的识别函数相同。
+"""
+
+import os
+import json
+import time
+import base64
+import asyncio
+import threading
+from dotenv import load_dotenv
+from xunfei_common import (create_url, WpgsAssembler, audio_position, DEFAULT_BUSINESS,
+                           FRAME_SIZE, BYTES_PER_SECOND, XUNFEI_MAX_SESSIONS, XUNFEI_SESSION_SECONDS,
+                           XUNFEI_SESSION_OVERLAP, XUNFEI_SESSION_TIMEOUT, XUNFEI_PACER_INITIAL_WINDOW,
+                           XUNFEI_PACER_MIN_WINDOW, XUNFEI_PACER_MAX_WINDOW, XUNFEI_PACER_STALL_TIMEOUT)
+from audio_stream import stream_segments, AudioStreamError
+from segmented_asr import stitch_segments
+
+try:
+    import websockets
+    WEBSOCKETS_AVAILABLE = True
+except ImportError:
+    WEBSOCKETS_AVAILABLE = False
+    print("websockets未安装，讯飞识别将使用基于线程的客户端")
+
+# 加载环境变量
+load_dotenv()
+
+# 整个进程同时进行的识别会话数上限
+XUNFEI_ASYNC_MAX_SESSIONS = int(os.getenv("XUNFEI_ASYNC_MAX_SESSIONS", "200"))
+# websockets 写缓冲的上限（字节），超过时发送端等待
+XUNFEI_ASYNC_WRITE_LIMIT = int(os.getenv("XUNFEI_ASYNC_WRITE_LIMIT", str(64 * 1024)))
+
+
+class XunfeiAsyncError(Exception):
+    """识别会话失败"""
+
+
+class AsyncPacer:
+    """AdaptivePacer 的 asyncio 版本"""
+
+    def __init__(self, initial_window=XUNFEI_PACER_INITIAL_WINDOW, min_window=XUNFEI_PACER_MIN_WINDOW,
+                 max_window=XUNFEI_PACER_MAX_WINDOW, stall_timeout=XUNFEI_PACER_STALL_TIMEOUT):
+        self.window = initial_window
+        self.min_window = min_window
+        self.max_window = max_window
+        self.stall_timeout = stall_timeout
+        self.acked = 0.0
+        self.stalls = 0
+        self._acked_event = asyncio.Event()
+
+    def ack(self, position):
+        """服务端确认已处理到 position 秒；确认推进时窗口增加一帧"""
+        if position is not None and position > self.acked:
+            self.acked = position
+            self.window = min(self.max_window, self.window + FRAME_SIZE / BYTES_PER_SECOND)
+            self._acked_event.set()
+
+    async def wait(self, sent_seconds):
+        """等待直到可以发送 sent_seconds 之后的音频，等待确认超时时窗口减半"""
+        while sent_seconds - self.acked >= self.window:
+            self._acked_event.clear()
+            try:
+                await asyncio.wait_for(self._acked_event.wait(), self.stall_timeout)
+            except asyncio.TimeoutError:
+                self.stalls += 1
+                self.window = max(self.min_window, self.window / 2)
+                self.acked = max(self.acked, sent_seconds - self.window)
+                return
+
+
+async def _send_audio(ws, pcm, app_id, business, pacer):
+    offset = 0
+    first = True
+    while True:
+        frame = pcm[offset:offset + FRAME_SIZE]
+        offset += len(frame)
+        # 音频的状态: 0-第一帧, 1-中间帧, 2-最后一帧
+        status = 2 if offset >= len(pcm) else (0 if first else 1)
+        data = {
+            "data": {
+                "status": status,
+                "format": "audio/L16;rate=16000",
+                "encoding": "raw",
+                "audio": base64.b64encode(frame).decode('utf-8')
+            }
+        }
+        if first:
+            data["common"] = {"app_id": app_id}
+            data["business"] = business
+            first = False
+        # send 在写缓冲超过上限时等待排空
+        await ws.send(json.dumps(data))
+        if status == 2:
+            return
+        await pacer.wait(offset / BYTES_PER_SECOND)
+
+
+async def _run_session(pcm, app_id, api_key, api_secret, business):
+    pacer = AsyncPacer()
+    assembler = WpgsAssembler()
+    async with websockets.connect(create_url(api_key, api_secret), write_limit=XUNFEI_ASYNC_WRITE_LIMIT,
+                                  max_size=None, ping_interval=None) as ws:
+        sender = asyncio.ensure_future(_send_audio(ws, pcm, app_id, business, pacer))
+        try:
+            async for message in ws:
+                message = json.loads(message)
+                if message["code"] != 0:
+                    raise XunfeiAsyncError(f"识别失败: {message['code']} - {message.get('message', '未知错误')}")
+                data = message.get("data", {})
+                if data.get("result"):
+                    assembler.apply(data["result"])
+                    pacer.ack(audio_position(data["result"]))
+                if data.get("status") == 2:
+                    return assembler.text()
+                if sender.done() and sender.exception() is not None:
+                    raise XunfeiAsyncError(f"发送数据时出错: {sender.exception()}")
+            raise XunfeiAsyncError(f"WebSocket连接关闭: {ws.close_code}, {ws.close_reason}")
+        finally:
+            sender.cancel()
+
+
+_semaphore = None
+
+
+async def recognize_pcm(pcm, app_id, api_key, api_secret, business=None, timeout=XUNFEI_SESSION_TIMEOUT):
+    """
+    用一个会话识别一段 PCM 音频（不超过 60 秒）
+
+    参数:
+        pcm (bytes): 16kHz 16 位单声道 PCM 数据
+        app_id (str): APPID
+        api_key (str): API Key
+        api_secret (str): API Secret
+        business (dict): 业务参数
+        timeout (float): 会话超时（秒）
+
+    返回:
+        str: 识别的文本
+
+    异常:
+        XunfeiAsyncError: 识别失败或超时
+    """
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(XUNFEI_ASYNC_MAX_SESSIONS)
+    async with _semaphore:
+        try:
+            return await asyncio.wait_for(
+                _run_session(pcm, app_id, api_key, api_secret, business or DEFAULT_BUSINESS), timeout)
+        except asyncio.TimeoutError:
+            raise XunfeiAsyncError(f"识别会话超时（{timeout:.0f} 秒）")
+        except websockets.exceptions.WebSocketException as e:
+            raise XunfeiAsyncError(f"WebSocket错误: {e}")
+        except OSError as e:
+            raise XunfeiAsyncError(f"无法连接到讯飞服务: {e}")
+
+
+async def recognize_file_async(audio_path, app_id, api_key, api_secret, max_sessions=XUNFEI_MAX_SESSIONS,
+                               retries=1):
+    """
+    识别音视频文件：边解码边在静音处切分，每个片段由一个会话识别，再按时间顺序拼接
+
+    解码和切分在线程中进行，不阻塞事件循环；这个文件进行中的会话达到 max_sessions 时暂停读取下一个片段，
+    内存中最多保留 max_sessions 个片段的 PCM 数据。
+
+    参数:
+        audio_path (str): 音视频文件路径（ffmpeg 支持的任意格式）
+        max_sessions (int): 这个文件同时进行的会话数
+        retries (int): 片段识别失败时的重试次数
+
+    返回:
+        str: 识别的文本；个别片段重试后仍然失败时，失败的时间段为失败标记
+
+    异常:
+        XunfeiAsyncError: 所有片段都识别失败
+        AudioStreamError: 解码失败
+    """
+    segments = stream_segments(audio_path, XUNFEI_SESSION_SECONDS - 2 * XUNFEI_SESSION_OVERLAP,
+                               XUNFEI_SESSION_OVERLAP)
+    file_limit = asyncio.Semaphore(max(1, max_sessions))
+
+    async def run(segment, pcm):
+        try:
+            for attempt in range(retries + 1):
+                try:
+                    return await recognize_pcm(pcm, app_id, api_key, api_secret), None
+                except XunfeiAsyncError as e:
+                    if attempt >= retries:
+                        return "", str(e)
+                    print(f"片段 {segment['index']} 识别失败（第 {attempt + 1} 次）: {e}")
+        finally:
+            file_limit.release()
+
+    metas = []
+    tasks = []
+    try:
+        while True:
+            await file_limit.acquire()
+            segment = await asyncio.to_thread(next, segments, None)
+            if segment is None:
+                file_limit.release()
+                break
+            pcm = segment.pop("pcm")
+            metas.append(segment)
+            tasks.append(asyncio.ensure_future(run(segment, pcm)))
+        results = await asyncio.gather(*tasks)
+    except BaseException:
+        # 解码失败或调用方取消时，取消其余片段并结束解码
+        for task in tasks:
+            task.cancel()
+        try:
+            segments.close()
+        except ValueError:
+            # 解码线程还在读取下一个片段，线程结束后生成器随之释放
+            pass
+        raise
+    # 个别片段失败时保留其他片段的文本，全部失败时报错
+    result = stitch_segments(metas, [text for text, _ in results], XUNFEI_SESSION_OVERLAP,
+                             [error for _, error in results])
+    if result["error"] and not result["text"]:
+        raise XunfeiAsyncError(result["error"])
+    return result["text"]
+
+
+_loop = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+
+
+def get_loop():
+    """获取后台事件循环（在当前进程中第一次使用时启动）"""
+    global _loop, _loop_pid, _semaphore
+    if _loop is None or _loop_pid != os.getpid():
+        with _loop_lock:
+            if _loop is None or _loop_pid != os.getpid():
+                _loop = asyncio.new_event_loop()
+                _loop_pid = os.getpid()
+                _semaphore = None
+                threading.Thread(target=_loop.run_forever, name="xunfei-async-loop", daemon=True).start()
+    return _loop
+
+
+def run_sync(coro, timeout=None):
+    """
+    在后台事件循环中运行协程并等待结果；超时时取消协程
+
+    参数:
+        coro: 协程
+        timeout (float): 超时时间（秒），为 None 时一直等待
+
+    返回:
+        协程的返回值
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, get_loop())
+    try:
+        return future.result(timeout)
+    except BaseException:
+        future.cancel()
+        raise
+
+
+def transcribe_file(audio_path, app_id, api_key, api_secret, error_prefix, max_sessions=XUNFEI_MAX_SESSIONS):
+    """
+    同步接口：识别音频文件，失败时返回错误提示
+
+    参数:
+        audio_path (str): 音视频文件路径（ffmpeg 支持的任意格式）
+        app_id (str): APPID
+        api_key (str): API Key
+        api_secret (str): API Secret
+        error_prefix (str): 错误提示的前缀
+        max_sessions (int): 这个文件同时进行的会话数
+
+    返回:
+        str: 识别的文本，失败时返回错误提示
+    """
+    try:
+        start_time = time.time()
+        text = run_sync(recognize_file_async(audio_path, app_id, api_key, api_secret, max_sessions))
+        print(f"讯飞识别完成（异步客户端），耗时 {time.time() - start_time:.2f} 秒")
+        return text
+    except (XunfeiAsyncError, AudioStreamError) as e:
+        print(f"{error_prefix}: {e}")
+        return f"{error_prefix}: {e}"
@@ -0,0 +1,346 @@
+"""
+科大讯飞 WebSocket 语音听写公共模块
+
+这个模块提供了两个 WebSocket 识别模块（xunfei_websocket、xunfei_official）共用的功能：
+- 鉴权 URL 的生成
+- 动态修正（dwa=wpgs）结果的拼接：按 sn 保存每条结果，pgs=rpl 时替换 rg 范围内的旧结果
+- 自适应发送节奏：不再固定每帧 sleep，而是根据服务端返回结果中的音频位置（确认）控制已发送但未确认的音频长度，
+  服务端跟得上时逐步增大窗口，长时间没有确认时减半（加性增、乘性减）
+- 音视频由 ffmpeg 解码为 PCM 流，边解码边按单次会话的时长上限在静音处切分，由多个会话并发识别，再按时间顺序拼接
+"""
+
+import os
+import json
+import time
+import base64
+import hashlib
+import hmac
+import threading
+import websocket
+from urllib.parse import urlencode
+from datetime import datetime
+from time import mktime
+from wsgiref.handlers import format_date_time
+from dotenv import load_dotenv
+from segmented_asr import transcribe_pcm_stream
+from audio_stream import stream_segments, AudioStreamError
+
+# 加载环境变量
+load_dotenv()
+
+# 科大讯飞WebSocket API地址
+API_HOST = "iat-api.xfyun.cn"
+API_PATH = "/v2/iat"
+API_URL = f"wss://{API_HOST}{API_PATH}"
+
+# 同时进行的识别会话数
+XUNFEI_MAX_SESSIONS = int(os.getenv("XUNFEI_MAX_SESSIONS", "4"))
+# 单个会话的音频时长上限（秒），接口限制为 60 秒
+XUNFEI_SESSION_SECONDS = float(os.getenv("XUNFEI_SESSION_SECONDS", "55"))
+# 相邻会话音频的重叠长度（秒）
+XUNFEI_SESSION_OVERLAP = float(os.getenv("XUNFEI_SESSION_OVERLAP", "1"))
+# 单个会话的超时时间（秒）
+XUNFEI_SESSION_TIMEOUT = float(os.getenv("XUNFEI_SESSION_TIMEOUT", "120"))
+# 发送窗口（已发送但服务端未确认的音频秒数）的初始值和上下限
+XUNFEI_PACER_INITIAL_WINDOW = float(os.getenv("XUNFEI_PACER_INITIAL_WINDOW", "4"))
+XUNFEI_PACER_MIN_WINDOW = float(os.getenv("XUNFEI_PACER_MIN_WINDOW", "1"))
+XUNFEI_PACER_MAX_WINDOW = float(os.getenv("XUNFEI_PACER_MAX_WINDOW", "30"))
+# 窗口已满时等待确认的时间（秒），超时后窗口减半
+XUNFEI_PACER_STALL_TIMEOUT = float(os.getenv("XUNFEI_PACER_STALL_TIMEOUT", "1"))
+
+# 每帧音频的字节数（16kHz 16 位单声道，8000 字节为 0.25 秒）
+FRAME_SIZE = 8000
+BYTES_PER_SECOND = 16000 * 2
+
+DEFAULT_BUSINESS = {
+    "language": "zh_cn",  # 语种, 中文=zh_cn, 英文=en_us
+    "domain": "iat",      # 领域, iat=日常用语
+    "accent": "mandarin", # 方言, mandarin=普通话
+    "vad_eos": 10000,     # 静默检测（end of speech），静默时长超过该值停止音频流识别
+    "dwa": "wpgs",        # 动态修正功能
+    "pd": "game"          # 领域个性化参数：game表示游戏
+}
+
+
+def create_url(api_key, api_secret, host=API_HOST, path=API_PATH):
+    """
+    生成带鉴权参数的 WebSocket URL
+
+    参数:
+        api_key (str): API Key
+        api_secret (str): API Secret
+
+    返回:
+        str: WebSocket URL
+    """
+    # 生成RFC1123格式的时间戳
+    date = format_date_time(mktime(datetime.now().timetuple()))
+    signature_origin = f"host: {host}\ndate: {date}\nGET {path} HTTP/1.1"
+
+    # 进行hmac-sha256加密
+    signature_sha = hmac.new(api_secret.encode('utf-8'), signature_origin.encode('utf-8'),
+                             digestmod=hashlib.sha256).digest()
+    signature_sha_base64 = base64.b64encode(signature_sha).decode(encoding='utf-8')
+
+    authorization_origin = f'api_key="{api_key}", algorithm="hmac-sha256", headers="host date request-line", signature="{signature_sha_base64}"'
+    authorization = base64.b64encode(authorization_origin.encode('utf-8')).decode(encoding='utf-8')
+
+    v = {
+        "authorization": authorization,
+        "date": date,
+        "host": host
+    }
+    return f"wss://{host}{path}?" + urlencode(v)
+
+
+class WpgsAssembler:
+    """按 sn 拼接动态修正结果"""
+
+    def __init__(self):
+        self.results = {}  # {sn: 文本}
+
+    def apply(self, result):
+        """
+        合并一条识别结果
+
+        参数:
+            result (dict): 消息中的 data.result
+        """
+        text = "".join(cw["w"] for item in result.get("ws", []) for cw in item.get("cw", [])[:1])
+        sn = result.get("sn", len(self.results) + 1)
+        if result.get("pgs") == "rpl" and result.get("rg"):
+            # 替换 rg 范围内之前的中间结果
+            first, last = result["rg"]
+            for old_sn in range(first, last + 1):
+                self.results.pop(old_sn, None)
+        self.results[sn] = text
+
+    def text(self):
+        return "".join(self.results[sn] for sn in sorted(self.results))
+
+
+def audio_position(result):
+    """返回识别结果覆盖到的音频位置（秒），ws 中的 bg 以 10 毫秒为单位"""
+    positions = [item.get("bg", 0) for item in result.get("ws", [])]
+    return max(positions) / 100 if positions else None
+
+
+class AdaptivePacer:
+    """根据服务端确认控制发送节奏（加性增、乘性减的发送窗口）"""
+
+    def __init__(self, initial_window=XUNFEI_PACER_INITIAL_WINDOW, min_window=XUNFEI_PACER_MIN_WINDOW,
+                 max_window=XUNFEI_PACER_MAX_WINDOW, stall_timeout=XUNFEI_PACER_STALL_TIMEOUT):
+        """
+        参数:
+            initial_window (float): 初始窗口（秒）
+            min_window (float): 最小窗口（秒）
+            max_window (float): 最大窗口（秒）
+            stall_timeout (float): 窗口已满时等待确认的时间（秒）
+        """
+        self.window = initial_window
+        self.min_window = min_window
+        self.max_window = max_window
+        self.stall_timeout = stall_timeout
+        self.acked = 0.0
+        self.stalls = 0
+        self._cond = threading.Condition()
+
+    def ack(self, position):
+        """服务端确认已处理到 position 秒；确认推进时窗口增加一帧"""
+        with self._cond:
+            if position is not None and position > self.acked:
+                self.acked = position
+                self.window = min(self.max_window, self.window + FRAME_SIZE / BYTES_PER_SECOND)
+                self._cond.notify_all()
+
+    def wait(self, sent_seconds, stopped=None):
+        """
+        等待直到可以发送 sent_seconds 之后的音频
+
+        窗口已满且在 stall_timeout 内没有新的确认时（如一段静音没有识别结果），窗口减半，
+        并假定服务端已处理完窗口外的音频，继续发送。
+        """
+        with self._cond:
+            while sent_seconds - self.acked >= self.window:
+                if stopped is not None and stopped.is_set():
+                    return
+                if not self._cond.wait(self.stall_timeout):
+                    self.stalls += 1
+                    self.window = max(self.min_window, self.window / 2)
+                    self.acked = max(self.acked, sent_seconds - self.window)
+                    return
+
+
+class XunfeiError(Exception):
+    """识别会话失败"""
+
+
+class XunfeiSession:
+    def __init__(self, app_id, api_key, api_secret, business=None, timeout=XUNFEI_SESSION_TIMEOUT):
+        """
+        一次 WebSocket 识别会话（音频不超过 60 秒）
+
+        参数:
+            app_id (str): APPID
+            api_key (str): API Key
+            api_secret (str): API Secret
+            business (dict): 业务参数
+            timeout (float): 会话超时（秒）
+        """
+        self.app_id = app_id
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.business = business or DEFAULT_BUSINESS
+        self.timeout = timeout
+        self.pacer = AdaptivePacer()
+        self.assembler = WpgsAssembler()
+        self.audio_data = b""
+        self.status = 0  # 0: 初始化, 1: 连接成功, 2: 识别完成, -1: 错误
+        self.error_msg = ""
+        self._finished = threading.Event()
+
+    def _fail(self, ws, error_msg):
+        if self.status != 2:
+            self.status = -1
+            self.error_msg = error_msg
+            print(error_msg)
+        self._finished.set()
+        ws.close()
+
+    def on_message(self, ws, message):
+        """接收消息回调"""
+        try:
+            message = json.loads(message)
+            if message["code"] != 0:
+                self._fail(ws, f"识别失败: {message['code']} - {message.get('message', '未知错误')}")
+                return
+
+            data = message.get("data", {})
+            result = data.get("result")
+            if result:
+                self.assembler.apply(result)
+                self.pacer.ack(audio_position(result))
+
+            # 检查是否是最后一帧
+            if data.get("status") == 2:
+                self.status = 2
+                self._finished.set()
+                ws.close()
+        except Exception as e:
+            self._fail(ws, f"处理消息时出错: {str(e)}")
+
+    def on_error(self, ws, error):
+        """错误回调"""
+        self._fail(ws, f"WebSocket错误: {str(error)}")
+
+    def on_close(self, ws, close_status_code, close_msg):
+        """关闭回调"""
+        if self.status not in (2, -1):
+            self.status = -1
+            self.error_msg = f"WebSocket连接关闭: {close_status_code}, {close_msg}"
+        self._finished.set()
+
+    def on_open(self, ws):
+        """连接建立回调：在单独的线程中按服务端确认的节奏发送音频"""
+        self.status = 1
+        threading.Thread(target=self._send_audio, args=(ws,), daemon=True).start()
+
+    def _send_audio(self, ws):
+        try:
+            audio_len = len(self.audio_data)
+            offset = 0
+            first = True
+            while not self._finished.is_set():
+                frame = self.audio_data[offset:offset + FRAME_SIZE]
+                offset += len(frame)
+                # 音频的状态: 0-第一帧, 1-中间帧, 2-最后一帧
+                status = 2 if offset >= audio_len else (0 if first else 1)
+                data = {
+                    "data": {
+                        "status": status,
+                        "format": "audio/L16;rate=16000",
+                        "encoding": "raw",
+                        "audio": base64.b64encode(frame).decode('utf-8')
+                    }
+                }
+                if first:
+                    data["common"] = {"app_id": self.app_id}
+                    data["business"] = self.business
+                    first = False
+                ws.send(json.dumps(data))
+                if status == 2:
+                    break
+                self.pacer.wait(offset / BYTES_PER_SECOND, self._finished)
+        except Exception as e:
+            self._fail(ws, f"发送数据时出错: {str(e)}")
+
+    def recognize(self, audio_data):
+        """
+        识别一段音频
+
+        参数:
+            audio_data (bytes): 16kHz 16 位单声道 PCM 数据（不超过 60 秒）
+
+        返回:
+            str: 识别的文本
+
+        异常:
+            XunfeiError: 识别失败
+        """
+        self.audio_data = audio_data
+        start_time = time.time()
+        ws = websocket.WebSocketApp(
+            create_url(self.api_key, self.api_secret),
+            on_message=self.on_message,
+            on_error=self.on_error,
+            on_close=self.on_close,
+            on_open=self.on_open
+        )
+        timer = threading.Timer(self.timeout, lambda: self._fail(ws, f"识别会话超时（{self.timeout:.0f} 秒）"))
+        timer.daemon = True
+        timer.start()
+        try:
+            ws.run_forever()
+        finally:
+            timer.cancel()
+            self._finished.set()
+
+        if self.status != 2:
+            raise XunfeiError(self.error_msg or "识别会话异常结束")
+        duration = len(audio_data) / BYTES_PER_SECOND
+        print(f"讯飞会话完成: 音频 {duration:.1f} 秒，耗时 {time.time() - start_time:.2f} 秒，"
+              f"结束时窗口 {self.pacer.window:.1f} 秒，等待超时 {self.pacer.stalls} 次")
+        return self.assembler.text()
+
+
+def recognize_file(audio_path, session_factory, error_prefix, max_sessions=XUNFEI_MAX_SESSIONS):
+    """
+    识别音视频文件：边解码边在静音处切分，每个片段不超过单次会话的时长上限，由多个会话并发识别
+
+    参数:
+        audio_path (str): 音视频文件路径（ffmpeg 支持的任意格式）
+        session_factory (callable): 创建 XunfeiSession 的函数
+        error_prefix (str): 错误提示的前缀
+        max_sessions (int): 同时进行的会话数
+
+    返回:
+        str: 识别的文本，失败时返回错误提示
+    """
+    def recognize_pcm(pcm, rate):
+        try:
+            return session_factory().recognize(pcm)
+        except XunfeiError as e:
+            return f"{error_prefix}: {e}"
+
+    try:
+        # 片段两端各有重叠，主体长度要扣掉重叠部分，保证每个会话不超过时长上限
+        segments = stream_segments(audio_path, XUNFEI_SESSION_SECONDS - 2 * XUNFEI_SESSION_OVERLAP,
+                                   XUNFEI_SESSION_OVERLAP)
+        result = transcribe_pcm_stream(segments, recognize_pcm, overlap_seconds=XUNFEI_SESSION_OVERLAP,
+                                       max_workers=max_sessions)
+    except AudioStreamError as e:
+        return f"{error_prefix}: {e}"
+    # 部分片段失败时返回其他片段的文本（失败的时间段带有标记），全部失败时返回错误提示
+    if result["error"] and not result["text"]:
+        return result["error"]
+    return result["text"]
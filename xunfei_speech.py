@@ -17,6 +17,7 @@ from wsgiref.handlers import format_date_time
 from datetime import datetime
 from time import mktime
 from dotenv import load_dotenv
+from audio_source import AudioSource, Base64JSONBody, BASE64_PLACEHOLDER
 
 # 加载环境变量
 load_dotenv()
@@ -86,13 +87,6 @@ def transcribe_with_xunfei(audio_path, language='cn'):
         print(f"API_KEY: {XUNFEI_API_KEY}")
         print(f"API_SECRET: {XUNFEI_API_SECRET}")
 
-        # 读取音频文件
-        with open(audio_path, 'rb') as f:
-            audio_data = f.read()
-
-        # 将音频数据进行base64编码
-        audio_base64 = base64.b64encode(audio_data).decode('utf-8')
-
         # 构建请求参数
         url = API_URL
         host = "iat-api.xfyun.cn"
@@ -132,14 +126,17 @@ def transcribe_with_xunfei(audio_path, language='cn'):
                 "status": 2,           # 2: 最后一帧音频
                 "format": "audio/wav", # 音频格式
                 "encoding": "raw",     # 音频编码, raw=原生音频数据
-                "audio": audio_base64  # base64编码后的音频数据
+                "audio": BASE64_PLACEHOLDER  # base64编码后的音频数据（发送时边读边编码）
             }
         }
 
-        # 发送请求
+        # 发送请求：音频文件映射到内存，请求体按块编码为 base64，不生成整个文件的副本
         print(f"发送请求到: {url}")
-        print(f"请求数据: {json.dumps(data, indent=2)}")
-        response = requests.post(url, json=data, headers=headers)
+        print(f"请求参数: {json.dumps(data['business'], ensure_ascii=False)}")
+        with AudioSource(audio_path) as source:
+            body = Base64JSONBody(data, source.data)
+            print(f"音频 {len(source.data)} 字节，请求体 {len(body)} 字节")
+            response = requests.post(url, data=body, headers=headers)
         print(f"响应状态码: {response.status_code}")
         print(f"响应内容: {response.text}")
         response.raise_for_status()